@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Offline batch jobs: run a JSONL file of requests through the same code as the API, without HTTP.
+
+Each input line is one request:
+    {"id": "u-1", "role": "Product Manager", "industry": "SaaS", "pains": "status meetings"}
+        onboard a new thread, then generate its recommendations
+    {"id": "u-2", "thread_id": 42}
+        re-generate recommendations for an existing thread (bypasses the cache)
+"id" is optional (the line number is used) and must be unique within the file.
+
+Results are appended to the output JSONL, one line per request:
+    {"id": "u-1", "ok": true, "attempts": 1, "result": {"thread_id": 7, "batch_id": 7, "items": [...]}}
+    {"id": "u-3", "ok": false, "attempts": 3, "error": "Model failed to produce JSON: ..."}
+The output file is also the checkpoint: a re-run with the same output skips
+every id already in it, so a crashed or interrupted job resumes where it stopped
+(--retry-failed re-runs the failed ones too). Model/database errors are retried
+with exponential backoff; bad input (missing fields, unknown thread) is not.
+
+Usage:
+    python batch_runner.py cohort.jsonl results.jsonl
+    python batch_runner.py cohort.jsonl results.jsonl --concurrency 16 --retries 5
+    python batch_runner.py cohort.jsonl results.jsonl --no-save      # score only, write nothing to the database
+    python batch_runner.py cohort.jsonl results.jsonl --parquet results.parquet   # needs pyarrow
+"""
+
+from settings import settings
+from shared.batch_jobs import InvalidRequest, job_parser, run_app_jobs, run_cli
+
+
+# ---------- Recommendation jobs ----------
+def recommendation_handler(save: bool):
+    """Onboard + recommend (or re-score an existing thread) with main.py's own route code."""
+    from fastapi import HTTPException
+
+    import main
+    from db import new_async_session
+    from models import SessionThread
+
+    def check(e: HTTPException):
+        if e.status_code < 500:
+            raise InvalidRequest(e.detail)
+        raise RuntimeError(e.detail)
+
+    async def handle(record: dict) -> dict:
+        thread_id = record.get("thread_id")
+        profile = None
+        if thread_id is None:
+            try:
+                profile = main.OnboardIn(role=record["role"], industry=record["industry"], pains=record["pains"])
+            except Exception as e:
+                raise InvalidRequest(f"Expected role/industry/pains or thread_id: {e}")
+
+        if not save:
+            if profile is None:
+                raise InvalidRequest("--no-save scores new profiles only (no thread_id)")
+            role_n, onet = main._normalize_role(profile.role, profile.industry)
+            thread = SessionThread(role_raw=profile.role, industry_raw=profile.industry, pains_raw=profile.pains,
+                                   role_normalized=role_n, onet_code=onet)
+            _, data = await main._generate_recs(main._thread_prompt_blob(thread), False, main._get_callbacks())
+            _, items = main._recommendation_rows(0, data)
+            return {"role_normalized": role_n, "items": [item.model_dump() for item in items]}
+
+        async with new_async_session() as session:
+            try:
+                if thread_id is None:
+                    thread_id = (await main.onboard(profile, session)).thread_id
+                    record["thread_id"] = thread_id  # a retry reuses the thread instead of onboarding again
+                    out = await main.recommendations(main.RecsIn(thread_id=thread_id), session)
+                else:
+                    out = await main.recommendations(main.RecsIn(thread_id=thread_id, bypass_cache=True), session)
+            except HTTPException as e:
+                check(e)
+        return out.model_dump()
+
+    return handle
+
+
+async def run(args) -> dict:
+    return await run_app_jobs(args, recommendation_handler)
+
+
+def cli():
+    parser = job_parser(__doc__, "requests, one JSON object per line",
+                        "don't write threads/recommendations to the database",
+                        concurrency=settings.recs_batch_max_concurrency)
+    run_cli(parser, run)
+
+
+if __name__ == "__main__":
+    cli()
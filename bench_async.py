@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for the async request path against a fake LLM.
+
+Compares the previous sync /chat handler (threadpool + chain.invoke) with the
+current async route (chain.ainvoke + async session), in-process over ASGI,
+at several concurrency levels. The fake model sleeps for a fixed latency so
+the numbers reflect how many calls a single worker can keep in flight.
+
+Usage:
+    python bench_async.py                       # 10/100/500 concurrent, 200ms model latency
+    python bench_async.py --latency 0.5 --concurrency 50 500
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Any, List, Optional
+
+# Isolated database + dummy key: this must run before settings/db are imported
+_tmpdir = tempfile.mkdtemp(prefix="a2d_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+os.environ["ADMISSION_ENABLED"] = "false"  # one in-process client; admission control would shed the burst
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from sqlmodel import select
+
+import main
+from db import get_session, init_db
+from models import ChatMessage, SessionThread
+
+
+class SleepyChatModel(BaseChatModel):
+    """Returns a fixed reply after `latency` seconds (blocking or awaited)."""
+    latency: float = 0.2
+    reply: str = "Batch your status updates into one async weekly note."
+
+    @property
+    def _llm_type(self) -> str:
+        return "sleepy-fake"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.reply))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.reply))])
+
+
+def build_legacy_app(model: BaseChatModel) -> FastAPI:
+    """The pre-async /chat handler: sync def, sync session, chain.invoke."""
+    legacy = FastAPI()
+
+    @legacy.post("/chat")
+    def chat(payload: main.ChatIn, session=Depends(get_session)):
+        thread = session.get(SessionThread, payload.thread_id)
+        if not thread:
+            raise HTTPException(404, "Thread not found")
+        q = select(ChatMessage).where(ChatMessage.thread_id == thread.id)\
+                               .order_by(ChatMessage.created_at.desc()).limit(12)
+        history = list(reversed(session.exec(q).all()))
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", "You are the Anti-To-Do assistant."),
+            MessagesPlaceholder(variable_name="history"),
+            ("user", "{user_msg}"),
+        ])
+        lc_history = [(m.sender, m.content) for m in history if m.sender in ("user", "assistant")]
+        resp = (prompt | model).invoke({"history": lc_history, "user_msg": payload.message})
+        session.add(ChatMessage(thread_id=thread.id, sender="user", content=payload.message))
+        session.add(ChatMessage(thread_id=thread.id, sender="assistant", content=resp.content))
+        session.commit()
+        return {"thread_id": thread.id, "reply": resp.content}
+
+    return legacy
+
+
+async def drive(app: FastAPI, thread_ids: List[int], concurrency: int, total: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    latencies, errors = [], 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def one(i: int):
+            nonlocal errors
+            async with sem:
+                t0 = time.perf_counter()
+                r = await client.post("/chat", json={"thread_id": thread_ids[i % len(thread_ids)],
+                                                     "message": f"question {i}"})
+                latencies.append(time.perf_counter() - t0)
+                if r.status_code != 200:
+                    errors += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50": latencies[len(latencies) // 2],
+        "p99": latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)],
+        "errors": errors,
+    }
+
+
+async def run(levels: List[int], latency: float, rounds: int):
+    init_db()
+    model = SleepyChatModel(latency=latency)
+    main._get_lc_model = lambda callbacks=None: model
+
+    # One thread per request slot keeps SQLite write contention realistic but bounded
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        thread_ids = []
+        for i in range(50):
+            r = await client.post("/onboard", json={"role": "pm", "industry": "SaaS", "pains": f"meetings {i}"})
+            thread_ids.append(r.json()["thread_id"])
+
+    legacy = build_legacy_app(model)
+    print(f"fake model latency={latency * 1000:.0f}ms, {rounds} requests per concurrency level x level")
+    print(f"{'concurrency':>11} | {'mode':<6} | {'req/s':>8} | {'p50':>8} | {'p99':>8} | errors")
+    for level in levels:
+        total = level * rounds
+        for mode, app in (("sync", legacy), ("async", main.app)):
+            res = await drive(app, thread_ids, level, total)
+            print(f"{level:>11} | {mode:<6} | {res['rps']:8.1f} | {res['p50'] * 1000:6.0f}ms | "
+                  f"{res['p99'] * 1000:6.0f}ms | {res['errors']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake model latency in seconds")
+    parser.add_argument("--rounds", type=int, default=3, help="requests per client at each level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 100, 500])
+    args = parser.parse_args()
+    asyncio.run(run(args.concurrency, args.latency, args.rounds))
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-request CPU time for recommendation chain assembly + payload serialization.
+
+"before" rebuilds the ChatPromptTemplate, JsonOutputParser and runnable pipeline
+on every call and lets the prompt stringify the payload dict (few-shot included);
+"after" reuses the compiled chain from main.py and renders the payload with the
+pre-serialized few-shot block. Both format the final prompt messages, which is
+where the payload actually gets serialized. No model call is made.
+
+Usage:
+    python bench_chain_build.py          # 2000 iterations
+    python bench_chain_build.py 10000
+"""
+
+import os
+import sys
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnablePassthrough
+
+import main
+from cache import make_cache_key
+from prompts import FEW_SHOT_EXAMPLE_PM, build_recommendations_prompt
+
+MODEL = FakeListChatModel(responses=["{}"])
+main._get_lc_model = lambda: MODEL
+
+
+def legacy_build(prompt_blob: dict):
+    """The previous _build_recommendations_chain, verbatim apart from the model."""
+    user_payload = {
+        "instructions": prompt_blob["instructions"],
+        "context": prompt_blob["context"],
+        "few_shot": FEW_SHOT_EXAMPLE_PM,  # the dict, as before
+    }
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", prompt_blob["system"]),
+        ("user", "{payload}")
+    ])
+    parser = JsonOutputParser()
+    chain = {"payload": RunnablePassthrough()} | prompt | MODEL | parser
+    return chain, user_payload, prompt
+
+
+def profile_blob(i: int) -> dict:
+    return build_recommendations_prompt(
+        role_raw="pm", industry_raw="SaaS", pains_raw=f"too many meetings #{i}",
+        role_normalized="Product Manager",
+    )
+
+
+def measure(label: str, n: int, step):
+    blobs = [profile_blob(i) for i in range(n)]
+    step(blobs[0])  # warm-up (compiles the chain once for "after")
+    t0 = time.process_time()
+    for blob in blobs:
+        step(blob)
+    per_call = (time.process_time() - t0) / n
+    print(f"{label:<28} {per_call * 1e6:8.1f} us CPU / request")
+    return per_call
+
+
+def before(blob: dict):
+    chain, payload, prompt = legacy_build(blob)
+    prompt.invoke({"payload": payload})
+    make_cache_key(dict(blob, few_shot=FEW_SHOT_EXAMPLE_PM), "gpt-4o-mini")  # key over the dict, as before
+
+
+def after(blob: dict):
+    chain, payload = main._build_recommendations_chain(blob)
+    chain.steps[1].invoke({"payload": payload})  # prompt formatting
+    make_cache_key(blob, "gpt-4o-mini")
+
+
+def build_only_before(blob: dict):
+    legacy_build(blob)
+
+
+def build_only_after(blob: dict):
+    main._build_recommendations_chain(blob)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(f"{n} iterations")
+    b = measure("assembly only (before)", n, build_only_before)
+    a = measure("assembly only (after)", n, build_only_after)
+    print(f"{'':<28} {b / a:8.1f}x faster")
+    b = measure("assembly+format+key (before)", n, before)
+    a = measure("assembly+format+key (after)", n, after)
+    print(f"{'':<28} {b / a:8.1f}x faster")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+History tokens per /chat turn: the old fixed window (12 newest messages, verbatim)
+vs the token-budgeted window with digests and a rolling summary (history.py).
+
+Simulates one thread in memory: onboarding, a /recommendations log message (the
+full JSON blob), then N chat turns with replies of varying length, plus a second
+/recommendations call halfway through. For each turn it builds both windows from
+the messages so far and reports history tokens (mean / max / last) and the time
+to build the window. Tokens come from tiktoken if its encoding loads, else chars/4.
+
+Usage:
+    python bench_chat_history.py          # 200 turns
+    python bench_chat_history.py 1000
+"""
+
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from history import build_history, count_tokens, fold_messages, load_tokenizer
+from settings import settings
+
+RECS = {"categories": [{"category_name": f"Category {i}", "emoji": "📝", "items": [
+    {"item": f"Automate the weekly status report for squad {i}.{j}",
+     "rationale": "Status reports are assembled by hand from three tools every Friday. " * 3,
+     "estimated_gain_minutes": 45, "difficulty": "medium"}
+    for j in range(5)]} for i in range(6)]}
+
+
+def simulate(turns: int):
+    rng = random.Random(7)
+    clock = datetime(2025, 1, 1)
+    messages = []
+
+    def add(sender, content):
+        nonlocal clock
+        clock += timedelta(seconds=1)
+        messages.append(SimpleNamespace(id=len(messages) + 1, sender=sender, content=content, created_at=clock))
+
+    add("user", "Role=Product Manager; Industry=SaaS; Pains=status meetings, ticket triage")
+    add("assistant", json.dumps(RECS))
+    for i in range(turns):
+        if i == turns // 2:
+            add("assistant", json.dumps(RECS))
+        add("user", f"Question {i}: " + "how would I roll this out to the team? " * rng.randint(1, 6))
+        yield messages
+        add("assistant", "Start with one squad, measure the hours saved, then expand. " * rng.randint(2, 40))
+
+
+def run(turns: int):
+    budget = settings.chat_history_token_budget
+    print(f"{turns} turns, budget {budget} tokens, tokenizer: {'tiktoken' if load_tokenizer(wait=10) else 'chars/4'}")
+    old, new, build = [], [], 0.0
+    summary, summary_until = None, None
+    for messages in simulate(turns):
+        history = messages[:-1]  # everything before the new user message
+        old.append(sum(count_tokens(m.content) + 4 for m in history[-12:]))
+
+        t0 = time.perf_counter()
+        window_msgs = [m for m in history if summary_until is None or (m.created_at, m.id) > summary_until]
+        if len(window_msgs) > settings.chat_history_max_messages:  # backlog, as _load_chat_history folds it
+            backlog = window_msgs[:-settings.chat_history_max_messages]
+            summary = fold_messages(summary, backlog, settings.chat_history_summary_max_tokens)
+            summary_until = (backlog[-1].created_at, backlog[-1].id)
+            window_msgs = window_msgs[-settings.chat_history_max_messages:]
+        window = build_history(window_msgs, summary, summary_until, budget,
+                               settings.chat_history_message_max_tokens, settings.chat_history_summary_max_tokens)
+        build += time.perf_counter() - t0
+        summary, summary_until = window.summary, window.summary_until
+        new.append(window.tokens)
+
+    print(f"{'window':<18} | {'mean':>7} | {'max':>7} | {'last':>7}")
+    for label, series in (("fixed 12 messages", old), ("token-budgeted", new)):
+        print(f"{label:<18} | {sum(series) / len(series):7.0f} | {max(series):7d} | {series[-1]:7d}")
+    print(f"window build: {build / turns * 1e3:.2f} ms/turn")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+ChatMessage storage: raw JSON/text (default) vs compact storage (CHAT_STORAGE_COMPACT).
+
+Seeds two throwaway SQLite databases with the same realistic dataset, one per
+mode: every thread has the onboarding messages, two /recommendations responses
+(30 items each, logged as an assistant message) and a run of chat exchanges with
+replies of varying length. Then reports:
+  - on-disk size of the chatmessage table (+ its indexes) and of the whole file
+  - /chat history read latency: main._load_chat_history() for random threads,
+    which in compact mode also decompresses and resolves recommendation references
+
+Usage:
+    python bench_chat_storage.py               # 2000 threads, 10 exchanges each
+    python bench_chat_storage.py 10000 20
+"""
+
+import asyncio
+import atexit
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+tmp = tempfile.mkdtemp()
+atexit.register(shutil.rmtree, tmp, ignore_errors=True)
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'unused.db')}"
+os.environ["ADMISSION_ENABLED"] = "false"  # one in-process client; admission control would shed the burst
+
+from sqlalchemy import text
+from sqlmodel import Session, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import db
+import main
+from models import ChatMessage, SessionThread
+from settings import settings
+from storage import recommendation_ref
+
+WORDS = ("meeting agenda status report ticket triage backlog sprint review standup inbox email calendar "
+         "template automation workflow dashboard metric owner stakeholder handoff checklist async update "
+         "weekly daily monthly vendor contract invoice approval onboarding hiring interview feedback").split()
+
+
+def sentence(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def recommendations(rng) -> dict:
+    return {"categories": [{
+        "category_name": name, "emoji": emoji,
+        "items": [{"item": sentence(rng, 8), "rationale": " ".join(sentence(rng, 12) for _ in range(2)),
+                   "estimated_gain_minutes": rng.choice((15, 30, 45, 60, 90)),
+                   "difficulty": rng.choice(("low", "medium", "high"))} for _ in range(5)],
+    } for name, emoji in (("Automate", "🤖"), ("Delegate", "🤝"), ("Batch", "📦"),
+                          ("Eliminate", "🗑️"), ("Outsource", "🌍"), ("Meetings", "📅"))]}
+
+
+def seed(url: str, threads: int, exchanges: int):
+    engine = db.build_engine(url)
+    SQLModel.metadata.create_all(engine)
+    rng = random.Random(42)  # same dataset for both modes
+    with Session(engine) as session:
+        for _ in range(threads):
+            thread = SessionThread(role_raw="Product Manager", industry_raw="SaaS", pains_raw=sentence(rng, 10))
+            session.add(thread)
+            session.flush()
+            session.add(ChatMessage(thread_id=thread.id, sender="system", content="Anti-To-Do assistant initialized."))
+            session.add(ChatMessage(thread_id=thread.id, sender="user",
+                                    content=f"Role=pm; Industry=SaaS; Pains={thread.pains_raw}"))
+            for turn in range(exchanges + 2):
+                if turn in (0, exchanges // 2 + 1):
+                    data = recommendations(rng)
+                    recs, _ = main._recommendation_rows(thread.id, data)
+                    session.add_all(recs)
+                    if settings.chat_storage_compact:
+                        session.flush()
+                        content = recommendation_ref(recs, data)
+                    else:
+                        content = json.dumps(data)
+                    session.add(ChatMessage(thread_id=thread.id, sender="assistant", content=content))
+                    continue
+                session.add(ChatMessage(thread_id=thread.id, sender="user", content=sentence(rng, rng.randint(6, 30))))
+                reply = " ".join(sentence(rng, 14) for _ in range(rng.randint(2, 25)))
+                session.add(ChatMessage(thread_id=thread.id, sender="assistant", content=reply))
+            session.commit()
+    with engine.connect() as conn:
+        table = conn.execute(text("SELECT SUM(pgsize) FROM dbstat WHERE name = 'chatmessage' "
+                                  "OR name LIKE 'ix_chatmessage%'")).scalar()
+        conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    engine.dispose()
+    return table, os.path.getsize(url[len("sqlite:///"):])
+
+
+async def read_latency(url: str, threads: int, reads: int):
+    async_engine = db.build_async_engine(url)
+    rng = random.Random(7)
+    latencies = []
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        for _ in range(reads):
+            thread = await session.get(SessionThread, rng.randint(1, threads))
+            t0 = time.perf_counter()
+            await main._load_chat_history(session, thread)
+            latencies.append(time.perf_counter() - t0)
+            await session.rollback()  # don't persist summaries: every read starts from the same state
+    await async_engine.dispose()
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def run(threads: int, exchanges: int, reads: int = 500):
+    print(f"{threads} threads, 2 recommendation responses + {exchanges} chat exchanges each")
+    print(f"{'storage':<8} | {'chatmessage':>12} | {'db file':>10} | {'history p50':>11} | {'p99':>8}")
+    for mode in ("raw", "compact"):
+        settings.chat_storage_compact = mode == "compact"
+        url = f"sqlite:///{os.path.join(tmp, mode + '.db')}"
+        table, size = seed(url, threads, exchanges)
+        p50, p99 = asyncio.run(read_latency(url, threads, reads))
+        print(f"{mode:<8} | {table / 2**20:9.1f} MiB | {size / 2**20:6.1f} MiB | {p50 * 1e3:8.2f} ms | {p99 * 1e3:5.2f} ms")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000, int(sys.argv[2]) if len(sys.argv) > 2 else 10)
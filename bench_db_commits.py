@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Per-endpoint database cost of /onboard and /recommendations: the previous
+commit-per-step handlers vs the current single-transaction ones.
+
+Both run in-process over ASGI against the same fake (instant) model, with the
+recommendation cache disabled, so the difference is the persistence path. For each
+endpoint it reports wall-clock time, time spent inside the database driver
+(statements + commits) and write commits per request. Each write commit is at
+least one fsync with the rollback journal, or synchronous=FULL.
+
+The SQLite profile comes from settings, e.g. compare:
+    python bench_db_commits.py
+    DB_SQLITE_WAL=false DB_SQLITE_SYNCHRONOUS=FULL python bench_db_commits.py
+
+Usage:
+    python bench_db_commits.py          # 200 requests per endpoint
+    python bench_db_commits.py 1000
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp(prefix="a2d_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+os.environ["ADMISSION_ENABLED"] = "false"  # one in-process client; admission control would shed the burst
+os.environ["REC_CACHE_ENABLED"] = "false"
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from sqlalchemy import event
+
+import main
+from db import async_engine, get_async_session, init_db
+from models import ChatMessage, SessionThread
+from settings import settings
+
+RECS = {"categories": [{"category_name": f"Category {i}", "emoji": "📝", "items": [
+    {"item": f"Item {i}.{j}", "rationale": "why", "estimated_gain_minutes": 30, "difficulty": "low"}
+    for j in range(5)]} for i in range(6)]}
+MODEL = FakeListChatModel(responses=[json.dumps(RECS)])
+main._get_lc_model = lambda: MODEL
+
+
+class DBMeter:
+    """Time inside the driver (execute + commit) and number of commits that wrote something."""
+
+    def __init__(self, sync_engine):
+        self.db_time = 0.0
+        self.write_commits = 0
+        dialect = sync_engine.dialect
+        do_commit = dialect.do_commit
+
+        def timed_commit(dbapi_connection):
+            t0 = time.perf_counter()
+            do_commit(dbapi_connection)
+            self.db_time += time.perf_counter() - t0
+
+        dialect.do_commit = timed_commit
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def before(conn, cursor, statement, parameters, context, executemany):
+            conn.info["t0"] = time.perf_counter()
+            if not statement.lstrip().upper().startswith("SELECT"):
+                conn.info["dirty"] = True
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def after(conn, cursor, statement, parameters, context, executemany):
+            self.db_time += time.perf_counter() - conn.info.pop("t0")
+
+        @event.listens_for(sync_engine, "commit")
+        def commit(conn):
+            if conn.info.pop("dirty", False):
+                self.write_commits += 1
+
+    def snapshot(self):
+        return self.db_time, self.write_commits
+
+
+def build_legacy_app() -> FastAPI:
+    """The previous /onboard and /recommendations persistence, verbatim apart from the shared helpers."""
+    legacy = FastAPI()
+
+    @legacy.post("/onboard")
+    async def onboard(payload: main.OnboardIn, session=Depends(get_async_session)):
+        role_n, onet = main._normalize_role(payload.role, payload.industry)
+        thread = SessionThread(role_raw=payload.role, industry_raw=payload.industry, pains_raw=payload.pains,
+                               role_normalized=role_n, onet_code=onet)
+        session.add(thread)
+        await session.commit()
+        await session.refresh(thread)
+        session.add(ChatMessage(thread_id=thread.id, sender="system", content="Anti-To-Do assistant initialized."))
+        session.add(ChatMessage(thread_id=thread.id, sender="user",
+                                content=f"Role={payload.role}; Industry={payload.industry}; Pains={payload.pains}"))
+        await session.commit()
+        return {"thread_id": thread.id, "role_normalized": role_n, "onet_code": onet}
+
+    @legacy.post("/recommendations")
+    async def recommendations(payload: main.RecsIn, session=Depends(get_async_session)):
+        thread = await session.get(SessionThread, payload.thread_id)
+        if not thread:
+            raise HTTPException(404, "Thread not found")
+        await session.commit()
+        chain, user_payload = main._build_recommendations_chain(main._thread_prompt_blob(thread))
+        data = await chain.ainvoke(user_payload)
+        recs, items = main._recommendation_rows(thread.id, data)
+        for rec in recs:
+            session.add(rec)
+        await session.commit()
+        session.add(ChatMessage(thread_id=thread.id, sender="assistant", content=json.dumps(data)))
+        await session.commit()
+        return {"thread_id": thread.id, "items": len(items)}
+
+    return legacy
+
+
+async def measure(app: FastAPI, meter: DBMeter, n: int):
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        thread_ids = []
+        for path in ("/onboard", "/recommendations"):
+            db0, commits0 = meter.snapshot()
+            t0 = time.perf_counter()
+            for i in range(n):
+                if path == "/onboard":
+                    r = await client.post(path, json={"role": "pm", "industry": "SaaS", "pains": f"meetings {i}"})
+                    thread_ids.append(r.json()["thread_id"])
+                else:
+                    r = await client.post(path, json={"thread_id": thread_ids[i]})
+                r.raise_for_status()
+            wall = time.perf_counter() - t0
+            db1, commits1 = meter.snapshot()
+            results[path] = (wall / n, (db1 - db0) / n, (commits1 - commits0) / n)
+    return results
+
+
+async def run(n: int):
+    init_db()
+    meter = DBMeter(async_engine.sync_engine)
+    profile = "WAL" if settings.db_sqlite_wal else "rollback journal"
+    print(f"SQLite {profile}, synchronous={settings.db_sqlite_synchronous}, {n} requests per endpoint")
+    print(f"{'endpoint':<17} | {'handler':<7} | {'wall/req':>9} | {'db/req':>9} | write commits/req")
+    for label, app in (("before", build_legacy_app()), ("after", main.app)):
+        for path, (wall, db_time, commits) in (await measure(app, meter, n)).items():
+            print(f"{path:<17} | {label:<7} | {wall * 1e3:7.2f}ms | {db_time * 1e3:7.2f}ms | {commits:.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Multi-process write-contention benchmark: default create_engine() vs the tuned
+engine profile in db.py (WAL, synchronous=NORMAL, busy_timeout, mmap, cache, pool).
+
+Spawns P worker processes, like P uvicorn workers, against one SQLite file. Each
+worker runs M "chat turns": read the last 12 messages of a thread, then insert
+two messages and commit. Each profile gets its own fresh database file, because
+journal_mode=WAL persists in the file. Reports turns/s, p50/p99 turn latency
+and how many turns failed with "database is locked".
+
+Usage:
+    python bench_db_contention.py               # 8 processes x 300 turns
+    python bench_db_contention.py 16 500
+"""
+
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+
+def worker(profile: str, url: str, turns: int, seed: int, ready: mp.Queue, go, out: mp.Queue):
+    from sqlalchemy.exc import OperationalError
+    from sqlmodel import Session, create_engine, select
+
+    import db
+    from models import ChatMessage, SenderType
+
+    engine = db.build_engine(url) if profile == "tuned" else create_engine(url)
+    ready.put(seed)
+    go.wait()  # start together, after the (slow) imports
+    latencies, locked = [], 0
+    for i in range(turns):
+        thread_id = 1 + (seed * turns + i) % 50
+        t0 = time.perf_counter()
+        try:
+            with Session(engine) as session:
+                session.exec(select(ChatMessage).where(ChatMessage.thread_id == thread_id)
+                             .order_by(ChatMessage.created_at.desc()).limit(12)).all()
+                session.add(ChatMessage(thread_id=thread_id, sender=SenderType.USER, content="question " * 20))
+                session.add(ChatMessage(thread_id=thread_id, sender=SenderType.ASSISTANT, content="answer " * 60))
+                session.commit()
+        except OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            locked += 1
+            continue
+        latencies.append(time.perf_counter() - t0)
+    out.put((latencies, locked))
+
+
+def run(profile: str, procs: int, turns: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ["DATABASE_URL"] = url
+        from sqlmodel import SQLModel, Session, create_engine
+
+        import db
+        from models import SessionThread
+
+        setup = db.build_engine(url) if profile == "tuned" else create_engine(url)
+        SQLModel.metadata.create_all(setup)
+        with Session(setup) as session:
+            session.add_all([SessionThread(role_raw="pm", industry_raw="saas", pains_raw="x") for _ in range(50)])
+            session.commit()
+        setup.dispose()
+
+        ctx = mp.get_context("spawn")
+        ready, out, go = ctx.Queue(), ctx.Queue(), ctx.Event()
+        workers = [ctx.Process(target=worker, args=(profile, url, turns, n, ready, go, out)) for n in range(procs)]
+        for w in workers:
+            w.start()
+        for _ in workers:
+            ready.get()
+        t0 = time.perf_counter()
+        go.set()
+        results = [out.get() for _ in workers]
+        elapsed = time.perf_counter() - t0
+        for w in workers:
+            w.join()
+
+    latencies = sorted(lat for lats, _ in results for lat in lats)
+    locked = sum(n for _, n in results)
+    ok = len(latencies)
+    p = lambda q: latencies[min(int(ok * q), ok - 1)] * 1e3 if ok else float("nan")
+    print(f"{profile:<8} {ok / elapsed:8.1f} turns/s  p50={p(0.5):8.2f} ms  p99={p(0.99):8.2f} ms  "
+          f"locked={locked}/{procs * turns}")
+
+
+if __name__ == "__main__":
+    procs = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    turns = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    print(f"{procs} processes x {turns} chat turns (read history + 2 inserts + commit)")
+    for profile in ("default", "tuned"):
+        run(profile, procs, turns)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark the /chat history fetch (and per-thread recommendation lookup) with and
+without the (thread_id, created_at) indexes.
+
+Seeds a throwaway SQLite database with N chat messages (1M by default) spread
+over threads, then times the exact queries main.py runs, first with the indexes
+dropped (the old schema) and then after init_db() has added them back, the same
+way an existing database gets migrated on startup.
+
+Usage:
+    python bench_history_index.py              # 1,000,000 messages, 100 per thread
+    python bench_history_index.py 200000 --per-thread 50
+"""
+
+import argparse
+import atexit
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser()
+parser.add_argument("messages", nargs="?", type=int, default=1_000_000)
+parser.add_argument("--per-thread", type=int, default=100)
+parser.add_argument("--queries", type=int, default=200)
+args = parser.parse_args()
+
+tmp = tempfile.mkdtemp()
+atexit.register(shutil.rmtree, tmp, ignore_errors=True)
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+import db
+from models import ChatMessage, Recommendation
+
+N_THREADS = max(args.messages // args.per_thread, 1)
+N_RECS = N_THREADS * 30  # one 6 x 5 recommendation set per thread
+
+
+def seed():
+    """Bulk-load with raw executemany: the ORM would take far longer than the benchmark itself."""
+    db.init_db()
+    start = datetime(2024, 1, 1)
+    rng = random.Random(0)
+    raw = db.engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.executemany(
+            "INSERT INTO sessionthread (id, created_at, role_raw, industry_raw, pains_raw) VALUES (?, ?, 'pm', 'saas', 'meetings')",
+            ((i, start) for i in range(1, N_THREADS + 1)),
+        )
+        # messages of all threads interleaved in time, like real traffic
+        cur.executemany(
+            "INSERT INTO chatmessage (thread_id, created_at, sender, content) VALUES (?, ?, ?, ?)",
+            ((rng.randint(1, N_THREADS), start + timedelta(seconds=i), "USER" if i % 2 else "ASSISTANT",
+              "message body " * 8) for i in range(args.messages)),
+        )
+        cur.executemany(
+            "INSERT INTO recommendation (thread_id, created_at, item, rationale, estimated_gain_minutes, difficulty, category) "
+            "VALUES (?, ?, 'item', 'why', 30, 'LOW', 'batch')",
+            ((rng.randint(1, N_THREADS), start + timedelta(seconds=i)) for i in range(N_RECS)),
+        )
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def history_query(thread_id: int):
+    # same statement as _load_chat_history in main.py
+    return select(ChatMessage).where(ChatMessage.thread_id == thread_id) \
+                              .order_by(ChatMessage.created_at.desc()).limit(12)
+
+
+def recs_query(thread_id: int):
+    return select(Recommendation).where(Recommendation.thread_id == thread_id) \
+                                 .order_by(Recommendation.created_at.desc())
+
+
+def plan(session, stmt) -> str:
+    compiled = stmt.compile(db.engine, compile_kwargs={"literal_binds": True})
+    rows = session.exec(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+    return "; ".join(row[-1] for row in rows)
+
+
+def measure(label: str):
+    rng = random.Random(1)
+    with Session(db.engine) as session:
+        for name, make in (("history", history_query), ("recs", recs_query)):
+            times = []
+            for _ in range(args.queries):
+                stmt = make(rng.randint(1, N_THREADS))
+                t0 = time.perf_counter()
+                session.exec(stmt).all()
+                times.append(time.perf_counter() - t0)
+                session.expunge_all()
+            times.sort()
+            print(f"  {label:<11} {name:<8} p50={statistics.median(times) * 1e3:9.3f} ms  "
+                  f"p99={times[int(len(times) * 0.99) - 1] * 1e3:9.3f} ms  plan: {plan(session, make(1))}")
+
+
+if __name__ == "__main__":
+    print(f"seeding {args.messages:,} messages / {N_THREADS:,} threads / {N_RECS:,} recommendations ...",
+          file=sys.stderr)
+    seed()
+    with db.engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_chatmessage_thread_created"))
+        conn.execute(text("DROP INDEX ix_recommendation_thread_created"))
+    measure("no index")
+    t0 = time.perf_counter()
+    db.init_db()  # migration path: adds the missing indexes to the existing tables
+    print(f"  init_db() built the indexes in {time.perf_counter() - t0:.1f} s")
+    measure("indexed")
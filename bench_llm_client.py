@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: per-request ChatOpenAI construction vs the shared client in shared/llm.py.
+
+Serves stub_llm_server.py's app (no added latency) on a free local port and
+measures, for N sequential calls, the time spent building the model and the
+end-to-end call time, plus how many TCP connections the stub had to accept.
+
+Usage:
+    python bench_llm_client.py            # 300 calls
+    python bench_llm_client.py 1000
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+import httpx
+import uvicorn
+from langchain_openai import ChatOpenAI
+
+from shared import llm
+from settings import settings
+from stub_llm_server import create_app
+
+
+class ConnectionCounter:
+    """ASGI wrapper: each TCP connection has its own client (host, port), so count those."""
+
+    def __init__(self, app):
+        self.app = app
+        self.clients = set()
+
+    @property
+    def connections(self) -> int:
+        return len(self.clients)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            self.clients.add(tuple(scope.get("client") or ()))
+        await self.app(scope, receive, send)
+
+
+def start_stub():
+    """Run the stub in a background thread; returns (server, counter, base_url)."""
+    counter = ConnectionCounter(create_app(latency="fixed:0", tokens_per_second=0))
+    server = uvicorn.Server(uvicorn.Config(counter, host="127.0.0.1", port=0, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, counter, f"http://127.0.0.1:{port}/v1"
+
+
+def per_request_model(base_url: str) -> ChatOpenAI:
+    """What every request used to do: a brand-new ChatOpenAI (and OpenAI client)."""
+    return ChatOpenAI(model=settings.model, temperature=0.3, api_key=settings.openai_api_key,
+                      base_url=base_url, callbacks=[])
+
+
+def report(label: str, build_s: float, total_s: float, n: int, conns: int):
+    print(f"{label:<22} build={build_s / n * 1e6:8.1f}us/req  "
+          f"call={total_s / n * 1e3:6.2f}ms/req  new TCP connections={conns}")
+
+
+def run_sync(base_url: str, n: int, counter: ConnectionCounter):
+    for label, factory in (
+        ("per-request (sync)", lambda: per_request_model(base_url)),
+        ("shared (sync)", None),
+    ):
+        counter.clients.clear()
+        shared = llm.build_model(
+            http_client=httpx.Client(limits=llm._http_limits(), timeout=llm._http_timeout()),
+            base_url=base_url,
+        ) if factory is None else None
+        build = total = 0.0
+        for _ in range(n):
+            t0 = time.perf_counter()
+            model = factory() if factory else shared
+            t1 = time.perf_counter()
+            model.invoke("ping")
+            build += t1 - t0
+            total += time.perf_counter() - t0
+        report(label, build, total, n, counter.connections)
+
+
+async def run_async(base_url: str, n: int, counter: ConnectionCounter):
+    for label, shared in (("per-request (async)", False), ("shared (async)", True)):
+        counter.clients.clear()
+        model_shared = llm.build_model(
+            http_async_client=httpx.AsyncClient(limits=llm._http_limits(), timeout=llm._http_timeout()),
+            base_url=base_url,
+        ) if shared else None
+        build = total = 0.0
+        for _ in range(n):
+            t0 = time.perf_counter()
+            model = model_shared if shared else per_request_model(base_url)
+            t1 = time.perf_counter()
+            await model.ainvoke("ping")
+            build += t1 - t0
+            total += time.perf_counter() - t0
+        report(label, build, total, n, counter.connections)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    server, counter, base_url = start_stub()
+    print(f"stub server at {base_url}, {n} sequential calls per mode")
+    run_sync(base_url, n, counter)
+    asyncio.run(run_async(base_url, n, counter))
+    server.should_exit = True
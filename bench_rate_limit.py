@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Bursty /recommendations traffic against a provider that throttles: the SDK's own
+retries (rate limiter off, the old behavior) vs the outbound rate limiter.
+
+Starts a local OpenAI-compatible stub (/v1/chat/completions) that answers after a
+fixed latency but returns 429 + Retry-After whenever more than CAP calls are in
+flight, like a provider enforcing a concurrency/TPM limit. A burst of N distinct
+profiles hits POST /recommendations at once (in-process over ASGI, recommendation
+cache off). Reports the HTTP statuses the clients saw, how many 429s the stub
+sent, wall time, and the limiter's final concurrency limit and queue waits.
+
+Usage:
+    python bench_rate_limit.py             # 60 requests, stub cap 4, 0.3 s latency
+    python bench_rate_limit.py 200 8 0.5
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_tmpdir = tempfile.mkdtemp(prefix="a2d_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+os.environ["ADMISSION_ENABLED"] = "false"  # one in-process client; admission control would shed the burst
+os.environ["REC_CACHE_ENABLED"] = "false"
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+import httpx
+
+import main
+from shared import llm, ratelimit
+from db import init_db
+from settings import settings
+
+RECS = {"categories": [{"category_name": f"Category {i}", "emoji": "📝", "items": [
+    {"item": f"Item {i}.{j}", "rationale": "why " * 20, "estimated_gain_minutes": 30, "difficulty": "low"}
+    for j in range(5)]} for i in range(6)]}
+COMPLETION = json.dumps({
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": json.dumps(RECS)}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 600, "completion_tokens": 900, "total_tokens": 1500},
+}).encode()
+THROTTLED = json.dumps({"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}).encode()
+
+
+class ThrottlingStub(BaseHTTPRequestHandler):
+    """Answers after `latency`; 429 + Retry-After when more than `cap` calls are in flight."""
+
+    protocol_version = "HTTP/1.1"
+    cap = 4
+    latency = 0.3
+    retry_after = "1"
+    lock = threading.Lock()
+    in_flight = 0
+    served = 0
+    throttled = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        cls = ThrottlingStub
+        with cls.lock:
+            admitted = cls.in_flight < cls.cap
+            if admitted:
+                cls.in_flight += 1
+            else:
+                cls.throttled += 1
+        if not admitted:
+            self._reply(429, THROTTLED, {"Retry-After": cls.retry_after})
+            return
+        try:
+            time.sleep(cls.latency)
+            self._reply(200, COMPLETION)
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+                cls.served += 1
+
+    def _reply(self, status: int, body: bytes, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+async def burst(n: int, base_url: str, limited: bool):
+    settings.llm_rate_limit_enabled = limited
+    ThrottlingStub.served = ThrottlingStub.throttled = 0
+    model = llm.build_model(base_url=base_url, http_async_client=httpx.AsyncClient(timeout=30))
+    main.get_model = lambda: model
+    main.rate_limiter = ratelimit.build_rate_limiter()
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        ids = [(await client.post("/onboard", json={"role": "pm", "industry": "SaaS",
+                                                    "pains": f"{'limited' if limited else 'sdk'} pain {i}"})).json()["thread_id"]
+               for i in range(n)]
+        t0 = time.perf_counter()
+        responses = await asyncio.gather(*(client.post("/recommendations", json={"thread_id": thread_id})
+                                           for thread_id in ids))
+        wall = time.perf_counter() - t0
+    return Counter(r.status_code for r in responses), wall, main.rate_limiter
+
+
+async def run(n: int, cap: int, latency: float):
+    ThrottlingStub.cap, ThrottlingStub.latency = cap, latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ThrottlingStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    init_db()
+
+    print(f"{n} concurrent /recommendations, stub allows {cap} in flight, {latency:.2f} s per call")
+    print(f"{'outbound calls':<32} | {'statuses':<18} | {'stub 429s':>9} | {'wall':>7} | limiter")
+    for label, limited in ((f"SDK retries (max_retries={settings.llm_max_retries})", False),
+                           ("rate limiter", True)):
+        statuses, wall, limiter = await burst(n, base_url, limited)
+        summary = ", ".join(f"{code}×{count}" for code, count in sorted(statuses.items()))
+        detail = "-"
+        if limiter is not None:
+            stats = limiter.stats()
+            detail = (f"limit {stats['concurrency_limit']}, wait p50 {stats['wait_ms_p50']:.0f} ms "
+                      f"p95 {stats['wait_ms_p95']:.0f} ms, retried {stats['retried']}")
+        print(f"{label:<32} | {summary:<18} | {ThrottlingStub.throttled:>9} | {wall:6.1f}s | {detail}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(run(int(args[0]) if len(args) > 0 else 60, int(args[1]) if len(args) > 1 else 4,
+                    float(args[2]) if len(args) > 2 else 0.3))
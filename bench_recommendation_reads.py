@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Re-displaying a thread's recommendations: POST /recommendations again (what
+clients had to do) vs GET /threads/{id}/recommendations, with and without
+If-None-Match.
+
+Runs in-process over ASGI with a fake instant model. The POST numbers are the
+best case for re-triggering: the recommendation cache hits, so no model call is
+made, but every call still writes a new batch of rows. Reports mean latency
+per request and the recommendation rows in the database afterwards.
+
+Usage:
+    python bench_recommendation_reads.py          # 500 requests per variant
+    python bench_recommendation_reads.py 2000
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp(prefix="a2d_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+os.environ["ADMISSION_ENABLED"] = "false"  # one in-process client; admission control would shed the burst
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+import httpx
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from sqlmodel import Session, func, select
+
+import main
+from db import engine, init_db
+from models import Recommendation
+
+RECS = {"categories": [{"category_name": f"Category {i}", "emoji": "📝", "items": [
+    {"item": f"Item {i}.{j}", "rationale": "why " * 20, "estimated_gain_minutes": 30, "difficulty": "low"}
+    for j in range(5)]} for i in range(6)]}
+MODEL = FakeListChatModel(responses=[json.dumps(RECS)])
+main._get_lc_model = lambda: MODEL
+
+
+def row_count() -> int:
+    with Session(engine) as session:
+        return session.exec(select(func.count()).select_from(Recommendation)).one()
+
+
+async def run(n: int):
+    init_db()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        thread_id = (await client.post("/onboard", json={"role": "pm", "industry": "SaaS",
+                                                         "pains": "meetings"})).json()["thread_id"]
+        etag = None
+
+        async def post():
+            r = await client.post("/recommendations", json={"thread_id": thread_id})
+            assert r.status_code == 200
+
+        async def get():
+            nonlocal etag
+            r = await client.get(f"/threads/{thread_id}/recommendations")
+            assert r.status_code == 200
+            etag = r.headers["etag"]
+
+        async def revalidate():
+            r = await client.get(f"/threads/{thread_id}/recommendations", headers={"If-None-Match": etag})
+            assert r.status_code == 304
+
+        print(f"{n} requests per variant, one thread, fake instant model")
+        print(f"{'request':<44} | {'mean':>8} | rows after")
+        for label, call in (("POST /recommendations (cache hit)", post),
+                            ("GET /threads/{id}/recommendations", get),
+                            ("GET ... If-None-Match (304)", revalidate)):
+            await call()  # warm up
+            t0 = time.perf_counter()
+            for _ in range(n):
+                await call()
+            mean = (time.perf_counter() - t0) / n
+            print(f"{label:<44} | {mean * 1e3:6.2f}ms | {row_count()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
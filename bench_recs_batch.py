@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Throughput of pre-generating recommendations for a cohort: one POST
+/recommendations per thread (the old overnight loop) vs POST /recommendations/batch.
+
+N threads are onboarded with P distinct profiles. The recommendation cache is
+disabled, so the gain comes from de-duplicating by profile hash and from the
+bounded abatch() fan-out, not from cache hits. The fake model sleeps for a
+fixed latency and counts its calls.
+
+Usage:
+    python bench_recs_batch.py                  # 200 threads, 40 profiles, 0.2 s latency, concurrency 8
+    python bench_recs_batch.py 2000 500 1.0 16
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp(prefix="a2d_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+os.environ["ADMISSION_ENABLED"] = "false"  # one in-process client; admission control would shed the burst
+os.environ["REC_CACHE_ENABLED"] = "false"
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+import httpx
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.runnables import Runnable
+
+import main
+from db import init_db
+from settings import settings
+
+RECS = {"categories": [{"category_name": f"Category {i}", "emoji": "📝", "items": [
+    {"item": f"Item {i}.{j}", "rationale": "why " * 20, "estimated_gain_minutes": 30, "difficulty": "low"}
+    for j in range(5)]} for i in range(6)]}
+
+
+class SlowModel(FakeListChatModel):
+    """Fake model with a fixed latency that counts its calls."""
+
+    latency: float = 0.2
+    calls: int = 0
+
+    async def _agenerate(self, *args, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return await super()._agenerate(*args, **kwargs)
+
+    async def abatch(self, *args, **kwargs):
+        # FakeListChatModel runs batches sequentially; a real chat model uses Runnable's concurrent abatch
+        return await Runnable.abatch(self, *args, **kwargs)
+
+
+async def run(threads: int, profiles: int, latency: float, concurrency: int):
+    init_db()
+    settings.recs_batch_max_concurrency = concurrency
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        ids = [(await client.post("/onboard", json={"role": "pm", "industry": "SaaS",
+                                                    "pains": f"pain {i % profiles}"})).json()["thread_id"]
+               for i in range(threads)]
+
+        print(f"{threads} threads, {profiles} distinct profiles, model latency {latency:.2f} s, "
+              f"batch concurrency {concurrency}")
+        print(f"{'path':<34} | {'model calls':>11} | {'wall':>8} | {'threads/h':>10}")
+        for label in ("POST /recommendations per thread", "POST /recommendations/batch"):
+            model = SlowModel(responses=[json.dumps(RECS)], latency=latency)
+            main._get_lc_model = lambda model=model: model
+            t0 = time.perf_counter()
+            if label.endswith("batch"):
+                out = (await client.post("/recommendations/batch", json={"thread_ids": ids})).json()
+                assert out["failed"] == 0, out
+            else:
+                for thread_id in ids:
+                    (await client.post("/recommendations", json={"thread_id": thread_id})).raise_for_status()
+            wall = time.perf_counter() - t0
+            print(f"{label:<34} | {model.calls:>11} | {wall:7.1f}s | {threads / wall * 3600:10,.0f}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(run(int(args[0]) if len(args) > 0 else 200, int(args[1]) if len(args) > 1 else 40,
+                    float(args[2]) if len(args) > 2 else 0.2, int(args[3]) if len(args) > 3 else 8))
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark the near-duplicate recommendation cache: brute-force vs IVF lookup.
+
+Fills a SemanticCache-style index with synthetic onboarding profiles and
+measures lookup latency (p50/p99) plus how often IVF finds the same best
+match as the exhaustive scan.
+
+Usage:
+    python bench_semantic_cache.py            # 1k, 10k, 100k profiles
+    python bench_semantic_cache.py 5000 50000
+"""
+
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")  # settings.py requires it; never used here
+
+import numpy as np
+
+from semantic_cache import HashedNgramEncoder, VectorIndex
+
+ROLES = ["Product Manager", "Software Engineer", "Operations Manager", "Designer", "Data Analyst",
+         "Account Executive", "Recruiter", "Customer Success Manager", "Founder", "Marketing Lead"]
+INDUSTRIES = ["SaaS", "Healthcare", "Fintech", "Retail", "Education", "Logistics", "Media",
+              "Manufacturing", "Government", "Consulting"]
+PAINS = ["meetings", "context switching", "email overload", "status reports", "slack pings",
+         "manual data entry", "documentation", "hiring", "reporting", "scheduling", "approvals",
+         "customer escalations", "vendor management", "code review", "on-call", "budgeting"]
+FILLERS = ["too many", "lots of", "endless", "constant", "", "way too much"]
+
+
+def random_profile(rng: random.Random) -> dict:
+    pains = rng.sample(PAINS, rng.randint(1, 3))
+    return {
+        "role_normalized": rng.choice(ROLES),
+        "industry_input": rng.choice(INDUSTRIES),
+        "pains_input": "; ".join(f"{rng.choice(FILLERS)} {p}".strip() for p in pains),
+    }
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def run(n: int, queries: int = 1000, seed: int = 0):
+    rng = random.Random(seed)
+    encoder = HashedNgramEncoder(dim=256)
+    profiles = [random_profile(rng) for _ in range(n)]
+
+    t0 = time.perf_counter()
+    vectors = np.stack([encoder.encode(p) for p in profiles])
+    encode_s = time.perf_counter() - t0
+
+    index = VectorIndex(encoder.dim, capacity=n, ivf_min_size=4096)
+    t0 = time.perf_counter()
+    for vec in vectors:
+        index.add(vec)
+    if index.centroids is None and n >= 2:
+        index.train()  # force IVF even on small sizes so both paths are measured
+    build_s = time.perf_counter() - t0
+
+    query_vecs = [encoder.encode(random_profile(rng)) for _ in range(queries)]
+    brute, ivf, agree = [], [], 0
+    for q in query_vecs:
+        t0 = time.perf_counter()
+        b_slot, b_score = index.search_brute(q)
+        brute.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        i_slot, i_score = index.search(q)
+        ivf.append(time.perf_counter() - t0)
+        agree += abs(b_score - i_score) < 1e-6
+
+    print(f"n={n:>7}  encode={encode_s / n * 1e6:6.1f}us/profile  build={build_s:6.2f}s  "
+          f"cells={len(index.centroids)}")
+    print(f"   brute  p50={percentile(brute, 50) * 1e3:7.3f}ms  p99={percentile(brute, 99) * 1e3:7.3f}ms")
+    print(f"   ivf    p50={percentile(ivf, 50) * 1e3:7.3f}ms  p99={percentile(ivf, 99) * 1e3:7.3f}ms  "
+          f"recall@1={agree / queries:.3f}")
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    for size in sizes:
+        run(size)
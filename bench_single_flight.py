@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Model calls for a burst of identical /recommendations requests, with and without
+single-flight coalescing.
+
+N threads onboard with the same profile, then all ask for recommendations at once.
+The recommendation cache is disabled, so without coalescing every request pays
+for its own generation. The fake model sleeps to stand in for LLM latency and
+counts how often it is called.
+
+Usage:
+    python bench_single_flight.py            # 50 concurrent requests, 0.5 s model latency
+    python bench_single_flight.py 200 1.0
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp(prefix="a2d_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+os.environ["ADMISSION_ENABLED"] = "false"  # one in-process client; admission control would shed the burst
+os.environ["REC_CACHE_ENABLED"] = "false"
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+import httpx
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import main
+from db import init_db
+from shared.singleflight import SingleFlight
+
+RECS = {"categories": [{"category_name": f"Category {i}", "emoji": "📝", "items": [
+    {"item": f"Item {i}.{j}", "rationale": "why", "estimated_gain_minutes": 30, "difficulty": "low"}
+    for j in range(5)]} for i in range(6)]}
+
+
+class SlowModel(FakeListChatModel):
+    """Fake model with a fixed latency that counts its calls."""
+
+    latency: float = 0.5
+    calls: int = 0
+
+    async def _agenerate(self, *args, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return await super()._agenerate(*args, **kwargs)
+
+
+async def run(concurrency: int, latency: float):
+    init_db()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        profile = {"role": "Product Manager", "industry": "SaaS", "pains": "status meetings, ticket triage"}
+        thread_ids = [(await client.post("/onboard", json=profile)).json()["thread_id"] for _ in range(concurrency)]
+
+        print(f"{concurrency} concurrent /recommendations, same profile, model latency {latency:.2f} s")
+        print(f"{'single-flight':<13} | {'model calls':>11} | {'wall':>8} | {'p50':>8} | coalesced")
+        for mode in ("off", "on"):
+            main.single_flight = SingleFlight() if mode == "on" else None
+            model = SlowModel(responses=[json.dumps(RECS)], latency=latency)
+            main._get_lc_model = lambda model=model: model
+            latencies = []
+
+            async def one(thread_id):
+                t0 = time.perf_counter()
+                r = await client.post("/recommendations", json={"thread_id": thread_id})
+                r.raise_for_status()
+                latencies.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            await asyncio.gather(*(one(t) for t in thread_ids))
+            wall = time.perf_counter() - t0
+            latencies.sort()
+            coalesced = main.single_flight.stats()["coalesced"] if main.single_flight is not None else 0
+            print(f"{mode:<13} | {model.calls:>11} | {wall:7.2f}s | {latencies[len(latencies) // 2]:7.2f}s | {coalesced}")
+
+
+if __name__ == "__main__":
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    asyncio.run(run(concurrency, latency))
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Latency of /chat and /recommendations with and without the write-behind queue.
+
+Runs the app in-process over ASGI with a fake instant model (so the database is
+the only real work), drives each endpoint at a fixed concurrency, and reports
+req/s, p50 and p99. With write-behind on, the /recommendations assistant log
+message is written by the background thread in batches. /chat writes its exchange
+in the request either way (it is history), so it is the control.
+
+Usage:
+    python bench_write_behind.py                 # 10 concurrent, 1000 requests per endpoint
+    python bench_write_behind.py 50 2000
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp(prefix="a2d_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+os.environ["ADMISSION_ENABLED"] = "false"  # one in-process client; admission control would shed the burst
+os.environ["REC_CACHE_ENABLED"] = "false"
+os.environ["WRITE_BEHIND_ENABLED"] = "false"  # toggled below
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+import httpx
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from sqlmodel import Session, func, select
+
+import main
+from db import engine, init_db
+from models import ChatMessage
+from shared.write_behind import WriteBehindQueue
+
+RECS = {"categories": [{"category_name": f"Category {i}", "emoji": "📝", "items": [
+    {"item": f"Item {i}.{j}", "rationale": "why " * 20, "estimated_gain_minutes": 30, "difficulty": "low"}
+    for j in range(5)]} for i in range(6)]}
+
+
+async def drive(client, path: str, bodies: list, concurrency: int) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(body):
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                r = await client.post(path, json=body)
+                ok = r.status_code == 200
+            except Exception:  # e.g. "database is locked" escaping the route
+                ok = False
+            latencies.append(time.perf_counter() - t0)
+            errors += not ok
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(b) for b in bodies))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {"rps": len(bodies) / elapsed, "p50": latencies[len(latencies) // 2],
+            "p99": latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)], "errors": errors}
+
+
+async def run(concurrency: int, total: int):
+    init_db()
+    transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        thread_ids = []
+        for i in range(50):
+            r = await client.post("/onboard", json={"role": "pm", "industry": "SaaS", "pains": f"meetings {i}"})
+            thread_ids.append(r.json()["thread_id"])
+
+        print(f"{concurrency} concurrent, {total} requests per endpoint, fake instant model")
+        print(f"{'endpoint':<17} | {'write-behind':<12} | {'req/s':>7} | {'p50':>8} | {'p99':>8} | errors")
+        for mode in ("off", "on"):
+            main.write_behind = WriteBehindQueue(engine) if mode == "on" else None
+            if main.write_behind is not None:
+                main.write_behind.start()
+            for path in ("/chat", "/recommendations"):
+                model = (FakeListChatModel(responses=["Batch status updates into one weekly note."])
+                         if path == "/chat" else FakeListChatModel(responses=[json.dumps(RECS)]))
+                main._get_lc_model = lambda model=model: model
+                bodies = [{"thread_id": thread_ids[i % len(thread_ids)], "message": f"q{i}"} for i in range(total)]
+                res = await drive(client, path, bodies, concurrency)
+                print(f"{path:<17} | {mode:<12} | {res['rps']:7.1f} | {res['p50'] * 1e3:6.1f}ms | {res['p99'] * 1e3:6.1f}ms | {res['errors']}")
+            if main.write_behind is not None:
+                await asyncio.to_thread(main.write_behind.close)
+                print(f"  write-behind: {main.write_behind.stats()}")
+
+    with Session(engine) as session:
+        print(f"chat messages in DB: {session.exec(select(func.count()).select_from(ChatMessage)).one()}")
+
+
+if __name__ == "__main__":
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    asyncio.run(run(concurrency, total))
@@ -0,0 +1,226 @@
+# cache.py — Recommendation response cache
+# Purpose: serve repeat onboarding profiles from memory (or a local SQLite file)
+# instead of paying for a full LLM generation every time.
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+from settings import settings
+
+
+def _norm(value) -> str:
+    """Case-fold and collapse whitespace so trivially different inputs share a key."""
+    return " ".join(str(value or "").split()).casefold()
+
+
+@lru_cache(maxsize=32)
+def _static_digest(system: str, instructions: str, few_shot: str) -> str:
+    # The static prompt parts are module constants: hash them once, not per request
+    return hashlib.sha256("\x00".join((system, instructions, few_shot)).encode("utf-8")).hexdigest()
+
+
+def prompt_digest(prompt_blob: dict) -> str:
+    """Hash of the static prompt parts (system, instructions, few-shot): a prompt change invalidates entries."""
+    few_shot = prompt_blob.get("few_shot")
+    if not isinstance(few_shot, str):
+        few_shot = json.dumps(few_shot, sort_keys=True, ensure_ascii=False)
+    return _static_digest(prompt_blob.get("system", ""), prompt_blob.get("instructions", ""), few_shot)
+
+
+def make_cache_key(prompt_blob: dict, model: str) -> str:
+    """
+    Stable hash of the recommendation prompt + model name.
+    The raw role input is left out on purpose: role_normalized already captures it,
+    so "pm" and "PM" onboarding profiles land on the same entry.
+    """
+    context = prompt_blob.get("context", {})
+    key_material = {
+        "model": model,
+        "prompt": prompt_digest(prompt_blob),
+        "profile": {
+            "role_normalized": _norm(context.get("role_normalized")),
+            "industry": _norm(context.get("industry_input")),
+            "pains": _norm(context.get("pains_input")),
+            "onet_code": _norm(context.get("onet_code")),
+        },
+    }
+    raw = json.dumps(key_material, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CacheBackend(ABC):
+    """Interface for a cache tier. Values are JSON-serializable dicts."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: dict) -> None:
+        ...
+
+    def stats(self) -> dict:
+        return {}
+
+
+class LRUCache(CacheBackend):
+    """In-process LRU with a per-entry TTL. Thread-safe."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 86400):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: dict) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SQLiteCache(CacheBackend):
+    """Disk tier backed by a standalone SQLite file, so entries survive restarts."""
+
+    def __init__(self, path: str, ttl_seconds: float = 86400):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rec_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM rec_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            if created_at + self.ttl_seconds < time.time():
+                self._conn.execute("DELETE FROM rec_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(value)
+
+    def set(self, key: str, value: dict) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO rec_cache (key, value, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time()),
+            )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM rec_cache").fetchone()
+        return {
+            "path": self.path,
+            "size": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+        }
+
+
+class RecommendationCache:
+    """
+    Two-tier cache: memory first, then the optional disk tier.
+    Disk hits are promoted into memory.
+    """
+
+    def __init__(self, memory: CacheBackend, disk: Optional[CacheBackend] = None):
+        self.memory = memory
+        self.disk = disk
+        self._lock = threading.Lock()
+        self.bypasses = 0
+
+    def record_bypass(self) -> None:
+        """Count a request that skipped the cache ("bypass_cache": true)."""
+        with self._lock:
+            self.bypasses += 1
+
+    def get(self, key: str) -> Optional[dict]:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: dict) -> None:
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def stats(self) -> dict:
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+            "bypasses": self.bypasses,
+        }
+
+
+def build_recommendation_cache() -> Optional[RecommendationCache]:
+    """Create the cache from settings. Returns None when caching is disabled."""
+    if not settings.rec_cache_enabled:
+        return None
+    memory = LRUCache(
+        max_entries=settings.rec_cache_max_entries,
+        ttl_seconds=settings.rec_cache_ttl_seconds,
+    )
+    disk = None
+    if settings.rec_cache_sqlite_path:
+        disk = SQLiteCache(settings.rec_cache_sqlite_path, ttl_seconds=settings.rec_cache_ttl_seconds)
+    return RecommendationCache(memory, disk)
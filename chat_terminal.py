@@ -16,6 +16,7 @@ HEADERS = {"Content-Type": "application/json"}
 class AntiToDoChat:
     def __init__(self):
         self.thread_id: Optional[int] = None
+        self.stream = False  # toggle with /stream
         self.session = requests.Session()
         self.session.headers.update(HEADERS)
     
@@ -41,8 +42,8 @@ class AntiToDoChat:
             print(f"❌ Failed to create session: {e}")
             return False
     
-    def send_message(self, message: str) -> str:
-        """Send a message and get response"""
+    def send_message(self, message: str, stream: bool = False) -> str:
+        """Send a message and get response (stream=True prints tokens as they arrive)"""
         if not self.thread_id:
             print("❌ No active session. Create one first with /session")
             return ""
@@ -52,6 +53,9 @@ class AntiToDoChat:
             "message": message
         }
         
+        if stream:
+            return self._stream_message(payload)
+        
         try:
             response = self.session.post(f"{API_BASE}/chat", json=payload)
             response.raise_for_status()
@@ -61,6 +65,36 @@ class AntiToDoChat:
             print(f"❌ Failed to send message: {e}")
             return ""
     
+    def _stream_message(self, payload: dict) -> str:
+        """POST to /chat/stream and print SSE tokens as they arrive"""
+        parts = []
+        event = None
+        try:
+            with self.session.post(f"{API_BASE}/chat/stream", json=payload, stream=True) as response:
+                response.raise_for_status()
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line:
+                        event = None
+                        continue
+                    if line.startswith("event:"):
+                        event = line[len("event:"):].strip()
+                        continue
+                    if not line.startswith("data:"):
+                        continue
+                    data = json.loads(line[len("data:"):])
+                    if event == "error":
+                        print(f"\n❌ {data.get('detail')}")
+                        return ""
+                    if event == "done":
+                        return data.get("reply", "".join(parts))
+                    token = data.get("token", "")
+                    parts.append(token)
+                    print(token, end="", flush=True)
+            return "".join(parts)
+        except Exception as e:
+            print(f"\n❌ Failed to stream message: {e}")
+            return ""
+    
     def get_recommendations(self) -> str:
         """Get AI recommendations"""
         if not self.thread_id:
@@ -94,6 +128,7 @@ class AntiToDoChat:
         print("Commands:")
         print("  /session [role] [industry] [pains] - Create new session")
         print("  /recs - Get AI recommendations")
+        print("  /stream - Toggle streaming replies")
         print("  /help - Show this help")
         print("  /quit - Exit")
         print("  /clear - Clear screen")
@@ -116,8 +151,10 @@ class AntiToDoChat:
                 
                 # Send message
                 print("🤖 Assistant: ", end="", flush=True)
-                response = self.send_message(user_input)
-                if response:
+                response = self.send_message(user_input, stream=self.stream)
+                if self.stream:
+                    print()  # tokens were already printed as they arrived
+                elif response:
                     print(response)
                 print()
                 
@@ -147,6 +184,7 @@ class AntiToDoChat:
             print("\n🤖 Anti-To-Do Chat Commands:")
             print("  /session [role] [industry] [pains] - Create new session")
             print("  /recs - Get AI recommendations")
+            print("  /stream - Toggle streaming replies")
             print("  /help - Show this help")
             print("  /quit - Exit")
             print("  /clear - Clear screen")
@@ -169,6 +207,11 @@ class AntiToDoChat:
                 print(recs)
             print()
         
+        elif cmd == "/stream":
+            self.stream = not self.stream
+            print(f"🔁 Streaming replies {'on' if self.stream else 'off'}")
+            print()
+        
         else:
             print(f"❌ Unknown command: {cmd}")
             print("Type /help for available commands")
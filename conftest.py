@@ -0,0 +1,18 @@
+# conftest.py — Test environment for the a2d tests (repo root)
+# Purpose: point every test at a throwaway SQLite file and the offline fake model
+# before settings.py is first imported, so the suite needs no API key or network.
+#
+# The ownership assistant's tests run from their own directory
+# (cd ownership_assistant && python -m pytest -q): both apps import flat modules
+# with the same names (settings, db, models, main), so they can't share a process.
+
+import os
+import tempfile
+
+collect_ignore = ["ownership_assistant"]
+
+_tmpdir = tempfile.mkdtemp(prefix="a2d_test_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'test.db')}"
+os.environ["REC_CACHE_ENABLED"] = "false"
+os.environ["ADMISSION_ENABLED"] = "false"
+os.environ["LLM_PROVIDER"] = "fake"
@@ -1,11 +1,128 @@
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from settings import settings
 
-engine = create_engine(settings.database_url, echo=False)
+# Async driver per backend (requirements.txt lists aiosqlite; asyncpg + psycopg2 for Postgres)
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+# What a bare in-memory URL becomes: one named memory database shared by every connection
+# in the process, so the sync engine (init_db, write-behind) and the async engine (routes)
+# see the same tables. It lives as long as the pool holds a connection to it.
+SHARED_MEMORY_URL = "sqlite:///file:a2d_memory?mode=memory&cache=shared&uri=true"
+
+def _is_bare_sqlite_memory(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+def _is_sqlite_memory(url) -> bool:
+    return _is_bare_sqlite_memory(url) or (url.get_backend_name() == "sqlite" and url.query.get("mode") == "memory")
+
+def _shared_memory_url(url: str) -> str:
+    """sqlite:// and sqlite:///:memory: -> SHARED_MEMORY_URL; any other URL unchanged."""
+    return SHARED_MEMORY_URL if _is_bare_sqlite_memory(make_url(url)) else url
+
+def _async_url(url: str) -> str:
+    """Map a sync DATABASE_URL onto its async driver (aiosqlite / asyncpg), keeping query options."""
+    parsed = make_url(url)
+    backend, _, driver = parsed.drivername.partition("+")
+    if backend == "postgres":
+        backend = "postgresql"
+    async_driver = ASYNC_DRIVERS.get(backend)
+    if async_driver is None or driver == async_driver:
+        return url
+    return parsed.set(drivername=f"{backend}+{async_driver}").render_as_string(hide_password=False)
+
+def engine_kwargs(url: str) -> dict:
+    """Pool configuration for DATABASE_URL (in-memory SQLite keeps SQLAlchemy's single-connection pool)."""
+    parsed = make_url(url)
+    if _is_sqlite_memory(parsed):
+        return {}
+    kwargs = dict(
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout_seconds,
+    )
+    if parsed.get_backend_name() == "sqlite":
+        # pooled connections move between threads; the driver-level timeout matches busy_timeout
+        kwargs["connect_args"] = {"check_same_thread": False,
+                                  "timeout": settings.db_sqlite_busy_timeout_ms / 1000}
+    else:
+        kwargs.update(pool_recycle=settings.db_pool_recycle_seconds, pool_pre_ping=settings.db_pool_pre_ping)
+    return kwargs
+
+def sqlite_pragmas() -> list:
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(settings.db_sqlite_busy_timeout_ms)}",
+        f"PRAGMA synchronous = {settings.db_sqlite_synchronous}",
+        f"PRAGMA mmap_size = {int(settings.db_sqlite_mmap_size)}",
+        f"PRAGMA cache_size = -{int(settings.db_sqlite_cache_size_kib)}",  # negative = KiB
+    ]
+    if settings.db_sqlite_wal:
+        pragmas.insert(0, "PRAGMA journal_mode = WAL")
+    return pragmas
+
+def _install_sqlite_pragmas(sync_engine):
+    if sync_engine.dialect.name != "sqlite":
+        return
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+def build_engine(url: str):
+    engine = create_engine(url, echo=False, **engine_kwargs(url))
+    _install_sqlite_pragmas(engine)
+    return engine
+
+def build_async_engine(url: str):
+    async_url = _async_url(url)
+    engine = create_async_engine(async_url, echo=False, **engine_kwargs(async_url))
+    _install_sqlite_pragmas(engine.sync_engine)
+    return engine
+
+database_url = _shared_memory_url(settings.database_url)
+engine = build_engine(database_url)
+async_engine = build_async_engine(database_url)
 
 def get_session():
     with Session(engine) as s:
         yield s
 
+def new_async_session() -> AsyncSession:
+    # expire_on_commit=False: routes keep reading ORM attributes after commit,
+    # and an expired attribute cannot lazy-load outside of an await.
+    return AsyncSession(async_engine, expire_on_commit=False)
+
+async def get_async_session():
+    async with new_async_session() as s:
+        yield s
+
+def _ensure_indexes():
+    """create_all() skips tables that already exist, so add any indexes they are missing."""
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+def _ensure_columns():
+    """create_all() doesn't alter existing tables either: add nullable columns declared since."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    ddl = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {ddl}'))
+
 def init_db():
-    SQLModel.metadata.create_all(engine)
\ No newline at end of file
+    SQLModel.metadata.create_all(engine)
+    _ensure_columns()
+    _ensure_indexes()
@@ -0,0 +1,181 @@
+# history.py — Token-budgeted chat history window
+# Purpose: keep the history sent with each /chat turn under a fixed token budget,
+# however long the thread runs. Large structured messages (the recommendations
+# JSON logged by /recommendations) are replaced with short digests, the newest
+# turns are kept verbatim, and turns that no longer fit are folded into a rolling
+# summary stored on the SessionThread.
+#
+# Everything here is local: tokens are counted with tiktoken when its encoding is
+# available (chars/4 otherwise) and the summary is extractive (no extra model call).
+# tiktoken may download its encoding on first use, which blocks (or hangs, offline),
+# so it is loaded on a background thread; counts use chars/4 until it is ready.
+
+import json
+import threading
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from settings import settings
+
+MESSAGE_OVERHEAD_TOKENS = 4   # role + separators per chat message
+SUMMARY_LINE_TOKENS = 60      # one line per folded message
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+
+
+# ---------- Token counting ----------
+_tokenizer = None
+_tokenizer_loaded = threading.Event()   # set once loading finished, successfully or not
+_tokenizer_lock = threading.Lock()
+_tokenizer_started = False
+
+
+def _load_tokenizer():
+    global _tokenizer
+    try:
+        import tiktoken
+        try:
+            _tokenizer = tiktoken.encoding_for_model(settings.model)
+        except KeyError:
+            _tokenizer = tiktoken.get_encoding("o200k_base")
+    except Exception:  # not installed, or the encoding can't be downloaded (offline)
+        pass
+    finally:
+        _tokenizer_loaded.set()
+
+
+def load_tokenizer(wait: Optional[float] = None) -> bool:
+    """Start loading tiktoken's encoding in the background (once); optionally wait up to `wait` s.
+    Returns whether tiktoken is in use."""
+    global _tokenizer_started
+    with _tokenizer_lock:
+        if not _tokenizer_started:
+            _tokenizer_started = True
+            threading.Thread(target=_load_tokenizer, name="tokenizer-load", daemon=True).start()
+    if wait:
+        _tokenizer_loaded.wait(wait)
+    return _tokenizer is not None
+
+
+def _encoding():
+    """The tiktoken encoding, or None (still loading, or unavailable): never blocks."""
+    if _tokenizer is None and not _tokenizer_started:
+        load_tokenizer()
+    return _tokenizer
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to about max_tokens, marking the cut."""
+    encoding = _encoding()
+    if encoding is None:
+        return text if len(text) <= max_tokens * 4 else text[:max(max_tokens, 0) * 4].rstrip() + " …"
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max(max_tokens, 0)]).rstrip() + " …"
+
+
+# ---------- Digests ----------
+def _recommendations_digest(data: dict) -> str:
+    """Category and item titles only: the rationale and estimates stay in the Recommendation rows."""
+    if "categories" in data:
+        parts = []
+        for category in data.get("categories", []):
+            titles = "; ".join(str(it.get("item", "")) for it in category.get("items", []) if isinstance(it, dict))
+            parts.append(f"{category.get('category_name', 'General')}: {titles}")
+        return "[Recommendations given] " + " | ".join(parts)
+    titles = "; ".join(str(it.get("item", "")) for it in data.get("items", []) if isinstance(it, dict))
+    return f"[Recommendations given] {titles}"
+
+
+def digest(content: str, max_tokens: int) -> str:
+    """Compact form of one message: recommendations JSON -> titles, other JSON -> minified, then capped."""
+    text = content.strip()
+    if text[:1] in ("{", "["):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and ("categories" in data or "items" in data):
+            text = _recommendations_digest(data)
+        elif data is not None:
+            text = "[Structured data] " + json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+    return truncate_tokens(text, max_tokens)
+
+
+# ---------- Window + rolling summary ----------
+class HistoryWindow(NamedTuple):
+    turns: List[Tuple[str, str]]          # LangChain (role, content), summary first
+    tokens: int                           # what `turns` costs against the budget
+    summary: Optional[str]                # rolling summary after this turn
+    summary_until: Optional[Tuple[datetime, int]]  # (created_at, id) of the last message folded into it
+    summary_changed: bool
+
+
+def _fit(rendered: Sequence[Tuple[str, str, int]], budget: int) -> Tuple[int, int]:
+    """Keep the newest messages that fit in budget (the newest one always). Returns (first kept index, tokens)."""
+    used, start = 0, len(rendered)
+    while start > 0:
+        cost = rendered[start - 1][2]
+        if used + cost > budget and start < len(rendered):
+            break
+        used += cost
+        start -= 1
+    return start, used
+
+
+def extend_summary(summary: Optional[str], folded: Sequence[Tuple[str, str]], max_tokens: int) -> str:
+    """Append one short line per folded message; drop the oldest lines past max_tokens."""
+    lines = summary.splitlines() if summary else []
+    for role, content in folded:
+        line = " ".join(content.split())
+        lines.append(f"{role.capitalize()}: {truncate_tokens(line, SUMMARY_LINE_TOKENS)}")
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def fold_messages(summary: Optional[str], messages: Sequence, summary_max_tokens: int) -> str:
+    """Fold messages that never made it into a window (a backlog older than the newest
+    chat_history_max_messages) straight into the summary, digested like window turns."""
+    folded = [("assistant" if m.sender == "assistant" else "user", digest(m.content, SUMMARY_LINE_TOKENS))
+              for m in messages]
+    return extend_summary(summary, folded, summary_max_tokens)
+
+
+def build_history(messages: Sequence, summary: Optional[str], summary_until: Optional[Tuple[datetime, int]],
+                  budget: int, message_max_tokens: int, summary_max_tokens: int) -> HistoryWindow:
+    """
+    messages: the thread's user/assistant ChatMessages after summary_until in (created_at, id)
+    order, oldest first.
+    Returns the turns to send; messages that don't fit are folded into the summary.
+    """
+    rendered = []
+    for m in messages:
+        role = "assistant" if m.sender == "assistant" else "user"
+        content = digest(m.content, message_max_tokens)
+        rendered.append((role, content, count_tokens(content) + MESSAGE_OVERHEAD_TOKENS))
+
+    header_tokens = count_tokens(SUMMARY_HEADER) + MESSAGE_OVERHEAD_TOKENS
+    summary_tokens = count_tokens(summary) + header_tokens if summary else 0
+    start, used = _fit(rendered, budget - summary_tokens)
+    changed = False
+    if start > 0:
+        # Something is folded, so the summary grows: reserve its full size
+        start, used = _fit(rendered, budget - summary_max_tokens - header_tokens)
+        summary = extend_summary(summary, [(role, content) for role, content, _ in rendered[:start]],
+                                 summary_max_tokens)
+        summary_until = (messages[start - 1].created_at, messages[start - 1].id)
+        summary_tokens = count_tokens(summary) + header_tokens
+        changed = True
+
+    turns = [(role, content) for role, content, _ in rendered[start:]]
+    if summary:
+        turns.insert(0, ("system", SUMMARY_HEADER + summary))
+    return HistoryWindow(turns, used + summary_tokens, summary, summary_until, changed)
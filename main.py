@@ -1,43 +1,68 @@
 # main.py — LangChain version
-# Purpose: Keep the same REST surface (/onboard, /recommendations, /chat),
+# Purpose: Keep the same REST surface (/onboard, /recommendations, /chat) plus streaming
+# variants (/recommendations/stream, /chat/stream),
 # but route LLM calls through LangChain (ChatOpenAI + structured JSON parsing).
 
+import asyncio
 import json
-from typing import Optional, List, Tuple
+import math
+import time
+from typing import Dict, Optional, List, Tuple
 
-from fastapi import FastAPI, Depends, HTTPException
+from datetime import datetime
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from sqlmodel import select
+from sqlmodel import and_, or_, select
 
 # ---- Local modules (unchanged from your project) ----
-from db import init_db, get_session
-from models import SessionThread, ChatMessage, Recommendation
+from db import init_db, get_async_session, new_async_session, engine
+from models import SessionThread, ChatMessage, Recommendation, RecommendationBatch
 from settings import settings
-from prompts import build_recommendations_prompt
+from prompts import build_recommendations_prompt, render_recommendations_payload
+from cache import build_recommendation_cache, make_cache_key, prompt_digest
+from semantic_cache import build_semantic_cache
+from shared.write_behind import build_write_behind
+from shared.singleflight import build_single_flight, flight_key
+from shared.ratelimit import build_rate_limiter, RateLimited
+from shared.admission import AdmissionMiddleware, build_admission_control
+from history import build_history, fold_messages, load_tokenizer
+from storage import recommendation_ref, resolve_messages
 
 # ---- LangChain imports ----
-# LangChain v0.2+ splits providers & core
-from langchain_openai import ChatOpenAI
+# LangChain v0.2+ splits providers & core; the model itself lives in shared/llm.py
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.runnables import RunnablePassthrough
+from langchain_core.messages import HumanMessage
 
-# ---- LangFuse integration (optional) ----
-try:
-    from langfuse import Langfuse
-    from langfuse.langchain import CallbackHandler
-    LANGFUSE_AVAILABLE = True
-except ImportError:
-    LANGFUSE_AVAILABLE = False
-    Langfuse = None
-    CallbackHandler = None
+# ---- Shared model + LangFuse clients (built once per process) ----
+from shared.llm import init_models, close_models, get_model, model_label, request_callbacks, usage_tracker, langfuse_configured
 
 
+# ---------- Recommendation cache ----------
+rec_cache = build_recommendation_cache()
+semantic_cache = build_semantic_cache()
+
+# ---------- Write-behind queue for log inserts (optional) ----------
+write_behind = build_write_behind(engine)
+
+# ---------- Single-flight: identical concurrent model calls share one call ----------
+single_flight = build_single_flight()
+
+# ---------- Outbound rate limiter: every model call waits for the RPM/TPM buckets + a concurrency slot ----------
+rate_limiter = build_rate_limiter()
+
+# ---------- Admission control: bounded in-flight work per route / tenant, shed the rest ----------
+admission = build_admission_control()
 
 # ---------- FastAPI app ----------
 app = FastAPI(title="Anti-To-Do Backend (LangChain)", version="0.2")
 
+if admission is not None:
+    app.add_middleware(AdmissionMiddleware, control=admission)  # inside CORS, so 503/429 carry CORS headers
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"],
@@ -46,13 +71,23 @@ app.add_middleware(
 @app.on_event("startup")
 def startup():
     init_db()
+    init_models()
+    load_tokenizer()  # background load; counts fall back to chars/4 until it is ready
+    if write_behind is not None:
+        write_behind.start()
     
     # Initialize LangFuse if credentials are provided
-    if LANGFUSE_AVAILABLE and settings.langfuse_secret_key and settings.langfuse_public_key:
+    if langfuse_configured():
         print(f"✅ LangFuse initialized: {settings.langfuse_host}")
     else:
         print("ℹ️  LangFuse not configured (optional)")
 
+@app.on_event("shutdown")
+async def shutdown():
+    if write_behind is not None:
+        await asyncio.to_thread(write_behind.close)  # flush queued log rows
+    await close_models()
+
 # ---------- Pydantic Schemas ----------
 class OnboardIn(BaseModel):
     role: str
@@ -66,6 +101,7 @@ class OnboardOut(BaseModel):
 
 class RecsIn(BaseModel):
     thread_id: int
+    bypass_cache: bool = False  # force a fresh generation (the result still refreshes the cache)
 
 class RecItem(BaseModel):
     item: str
@@ -77,6 +113,35 @@ class RecItem(BaseModel):
 class RecsOut(BaseModel):
     thread_id: int
     items: List[RecItem]
+    batch_id: Optional[int] = None
+
+class RecsBatchIn(BaseModel):
+    thread_ids: List[int]
+    bypass_cache: bool = False
+    max_concurrency: Optional[int] = None  # parallel model calls, capped at RECS_BATCH_MAX_CONCURRENCY
+
+class RecsBatchResult(BaseModel):
+    ok: bool
+    batch_id: Optional[int] = None
+    items: int = 0
+    cached: bool = False                   # no model call: recommendation cache, or same profile earlier in the request
+    error: Optional[str] = None
+
+class RecsBatchOut(BaseModel):
+    results: Dict[int, RecsBatchResult]    # per thread_id
+    threads: int
+    succeeded: int
+    failed: int
+    profiles: int                          # distinct profile hashes among the threads
+    model_calls: int
+    elapsed_ms: float
+
+class RecommendationBatchOut(BaseModel):
+    thread_id: int
+    batch_id: int
+    model: str
+    created_at: datetime
+    items: List[RecItem]
 
 class ChatIn(BaseModel):
     thread_id: int
@@ -100,78 +165,304 @@ def _normalize_role(role: str, industry: str) -> Tuple[Optional[str], Optional[s
     normalized = alias.get(r, role.title())
     return normalized, None
 
-def _get_langfuse_handler():
+def _get_callbacks() -> list:
     """
-    Get LangFuse CallbackHandler if credentials are configured.
-    Returns None if LangFuse is not configured or not available.
+    Per-request callbacks: token-usage metrics (incl. provider-cached prompt tokens)
+    plus the LangFuse CallbackHandler if credentials are configured.
     """
-    if (LANGFUSE_AVAILABLE and 
-        settings.langfuse_secret_key and 
-        settings.langfuse_public_key):
-        # Initialize LangFuse client
-        langfuse = Langfuse(
-            public_key=settings.langfuse_public_key,
-            secret_key=settings.langfuse_secret_key,
-            host=settings.langfuse_host
-        )
-        # Create callback handler
-        return CallbackHandler()
-    return None
+    return request_callbacks()
 
-def _get_lc_model(callbacks=None):
+def _get_lc_model():
     """
-    Single place to instantiate the LC model.
-    Uses environment variable OPENAI_API_KEY via settings.
+    The process-wide LC model (see shared/llm.py). Per-request callbacks are passed
+    through the invoke/stream config, never baked into the model. Calls go
+    through the rate limiter when it is enabled.
     """
-    # You can swap models here without touching business logic.
-    return ChatOpenAI(
-        model=settings.model,       # e.g., "gpt-4o-mini"
-        temperature=0.3,
-        api_key=settings.openai_api_key,
-        callbacks=callbacks or [],
-    )
+    model = get_model()
+    return rate_limiter.wrap(model) if rate_limiter is not None else model
+
+def _overloaded(e: RateLimited) -> HTTPException:
+    """503 + Retry-After for a throttled model, instead of a 500."""
+    return HTTPException(503, str(e), headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
+
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Events frame."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+def _lookup_cached_recs(prompt_blob: dict, bypass: bool) -> Tuple[str, Optional[dict]]:
+    """Exact cache first, then near-duplicate profiles. Returns (cache_key, data or None)."""
+    cache_key = make_cache_key(prompt_blob, model_label())
+    data = None
+    if rec_cache is not None:
+        if bypass:
+            rec_cache.record_bypass()
+        else:
+            data = rec_cache.get(cache_key)
+            if data is not None and not _has_recommendations(data):
+                data = None  # an empty result cached before _store_cached_recs refused them
+
+    # Then near-duplicate profiles (e.g. "pm / saas" vs "product manager / SaaS")
+    if data is None and semantic_cache is not None and not bypass:
+        data = semantic_cache.get(prompt_blob["context"], model_label(), prompt_digest(prompt_blob))
+        if data is not None and rec_cache is not None:
+            rec_cache.set(cache_key, data)
+    return cache_key, data
+
+def _has_recommendations(data) -> bool:
+    """At least one item, in the per-category or the old flat format."""
+    if not isinstance(data, dict):
+        return False
+    if "categories" in data:
+        return any(isinstance(c, dict) and c.get("items") for c in data.get("categories") or [])
+    return bool(data.get("items"))
+
+def _store_cached_recs(cache_key: str, prompt_blob: dict, data: dict):
+    # An empty result (a stream that ended on a non-object, a model that returned
+    # nothing usable) would be served to this profile for the whole TTL
+    if not _has_recommendations(data):
+        return
+    if rec_cache is not None:
+        rec_cache.set(cache_key, data)
+    if semantic_cache is not None:
+        semantic_cache.set(prompt_blob["context"], model_label(), data, prompt_digest(prompt_blob))
+
+def _to_recommendations(thread_id: int, raw_items: list, category_name: Optional[str] = None):
+    """
+    Convert raw model items into Recommendation rows + RecItem responses.
+    `category_name` (new per-category format) overrides each item's own category.
+    """
+    recs: List[Recommendation] = []
+    items: List[RecItem] = []
+    for it in raw_items:
+        try:
+            rec = Recommendation(
+                thread_id=thread_id,
+                item=str(it["item"]),
+                rationale=str(it.get("rationale", "")),
+                category=str(category_name if category_name is not None else it.get("category", "General")),
+                estimated_gain_minutes=int(it.get("estimated_gain_minutes", 0)),
+                difficulty=str(it.get("difficulty", "medium"))
+            )
+            items.append(RecItem(**{
+                "item": rec.item,
+                "rationale": rec.rationale,
+                "category": rec.category,
+                "estimated_gain_minutes": rec.estimated_gain_minutes,
+                "difficulty": rec.difficulty
+            }))
+            recs.append(rec)
+        except Exception:
+            # skip invalid items rather than 500 the whole request
+            continue
+    return recs, items
+
+def _recommendation_rows(thread_id: int, data: dict):
+    """Handle both the new format (categories) and the old one (flat items, capped at 5)."""
+    if "categories" not in data:
+        return _to_recommendations(thread_id, data.get("items", [])[:5])
+    recs: List[Recommendation] = []
+    items: List[RecItem] = []
+    for category_data in data.get("categories", []):
+        category_recs, category_items = _to_recommendations(
+            thread_id, category_data.get("items", []), category_data.get("category_name", "General"))
+        recs.extend(category_recs)
+        items.extend(category_items)
+    return recs, items
+
+async def _coalesced(key: str, fn):
+    """Await fn(), or the identical call another request already has in flight."""
+    if single_flight is None:
+        return await fn()
+    return await single_flight.ado(key, fn)
+
+async def _generate_recs(prompt_blob: dict, bypass_cache: bool, callbacks: list) -> Tuple[str, dict]:
+    """Cached result if any, else one model call (shared with identical in-flight requests). Returns (cache_key, data)."""
+    cache_key, data = _lookup_cached_recs(prompt_blob, bypass_cache)
+    if data is not None:
+        return cache_key, data
+
+    chain, user_payload = _build_recommendations_chain(prompt_blob)
+
+    async def generate():
+        # Run the chain (returns Python dict thanks to JsonOutputParser)
+        result = await chain.ainvoke(user_payload, config={"callbacks": callbacks})
+        _store_cached_recs(cache_key, prompt_blob, result)
+        return result
+
+    # Same profile already being generated (cache_key is the prompt hash): wait for that call
+    return cache_key, await _coalesced(cache_key, generate)
+
+async def _add_batch(session, thread_id: int, prompt_hash: str, recs: List[Recommendation]) -> RecommendationBatch:
+    """Add a RecommendationBatch and link recs to it (the flush assigns the batch id)."""
+    batch = RecommendationBatch(thread_id=thread_id, model=model_label(), prompt_hash=prompt_hash,
+                                item_count=len(recs))
+    session.add(batch)
+    await session.flush()
+    for rec in recs:
+        rec.batch_id = batch.id
+    session.add_all(recs)
+    return batch
+
+def _batch_etag(batch_id: int) -> str:
+    # A batch never changes once written: its id is a strong validator
+    return f'"rb-{batch_id}"'
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+async def _recommendations_log(session, recs: List[Recommendation], data: dict) -> str:
+    """Assistant log message content: the full JSON, or (compact storage) a reference to the rows."""
+    if not settings.chat_storage_compact:
+        return json.dumps(data)
+    await session.flush()  # assigns the Recommendation ids the reference points at
+    return recommendation_ref(recs, data)
+
+def _write_behind(*rows) -> bool:
+    """Hand log rows to the write-behind queue; False means the caller must write them itself."""
+    return write_behind is not None and write_behind.submit(*rows)
 
 # ---------- LangChain: Recommendation chain ----------
-def _build_recommendations_chain(prompt_blob: dict, callbacks=None):
+# Chains are compiled once and reused; they are rebuilt only when the system
+# prompt or the model instance changes (e.g. settings reloaded in shared/llm.py).
+_recs_chain = None
+_recs_chain_key: Tuple = (None, None, None)
+
+def _thread_prompt_blob(thread: SessionThread) -> dict:
+    return build_recommendations_prompt(
+        role_raw=thread.role_raw,
+        industry_raw=thread.industry_raw,
+        pains_raw=thread.pains_raw,
+        role_normalized=thread.role_normalized,
+        onet_code=thread.onet_code,
+        cache_friendly=settings.prompt_cache_layout,
+    )
+
+def _build_recommendations_chain(prompt_blob: dict):
     """
-    Build a deterministic chain:
-    System + user JSON blob --> JSON output.
+    Return the compiled deterministic chain:
+    System + user JSON blob --> JSON output,
+    together with the rendered user payload for this request.
     """
-    # Prepare pieces
+    global _recs_chain, _recs_chain_key
     system_text = prompt_blob["system"]
-    instructions = prompt_blob["instructions"]
-    context = prompt_blob["context"]
-    few_shot = prompt_blob["few_shot"]
+    static_prefix = prompt_blob.get("static_prefix")
+    model = _get_lc_model()
+
+    if (_recs_chain is None or _recs_chain_key[0] != system_text
+            or _recs_chain_key[1] != static_prefix or _recs_chain_key[2] is not model):
+        # Prompt template: fixed system (+ static block in the cache-friendly layout)
+        # + dynamic user content. The static block is a message object, not a
+        # template, so its JSON braces are sent verbatim.
+        messages = [("system", system_text)]
+        if static_prefix:
+            messages.append(HumanMessage(content=static_prefix))
+        messages.append(("user", "{payload}"))
+        prompt = ChatPromptTemplate.from_messages(messages)
+
+        # JSON parser to force structured output (raises on invalid JSON)
+        parser = JsonOutputParser()
+
+        # Chain: input -> prompt.format -> llm -> parser
+        _recs_chain = (
+            {"payload": RunnablePassthrough()}  # pass through our rendered payload
+            | prompt
+            | model
+            | parser
+        )
+        _recs_chain_key = (system_text, static_prefix, model)
 
     # We pass a single "payload" variable to the LLM as the user message
     # to keep things deterministic and easily reproducible.
-    user_payload = {
-        "instructions": instructions,
-        "context": context,
-        "few_shot": few_shot
-    }
+    return _recs_chain, render_recommendations_payload(prompt_blob)
 
-    # Prompt template: fixed system + dynamic user content
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", system_text),
-        ("user", "{payload}")
-    ])
+# ---------- LangChain: Chat chain ----------
+CHAT_SYSTEM_PROMPT = (
+    "You are the Anti-To-Do assistant. "
+    "Be concise and actionable; avoid stereotypes; clarify only if essential."
+)
 
-    # JSON parser to force structured output (raises on invalid JSON)
-    parser = JsonOutputParser()
+def _after(marker: Tuple[datetime, Optional[int]]):
+    """Messages after a (created_at, id) marker. Ties on created_at are broken by id, so a
+    message stamped in the same instant as the last folded one is neither lost nor folded twice."""
+    created_at, message_id = marker
+    if message_id is None:  # marker written before ids were recorded
+        return ChatMessage.created_at > created_at
+    return or_(ChatMessage.created_at > created_at,
+               and_(ChatMessage.created_at == created_at, ChatMessage.id > message_id))
 
-    # Chain: input -> prompt.format -> llm -> parser
-    chain = (
-        {"payload": RunnablePassthrough()}  # pass through our dict
-        | prompt
-        | _get_lc_model(callbacks=callbacks)
-        | parser
+async def _load_chat_history(session, thread: SessionThread) -> List[Tuple[str, str]]:
+    """
+    Build the token-budgeted history as LangChain (role, content) tuples: the rolling
+    summary, then the newest user/assistant turns (large ones digested). Only messages
+    newer than the summary are read, and only their recommendation references (compact
+    storage) are resolved. When turns are folded into the summary, the
+    thread is updated in the session; the caller's next commit persists it.
+    """
+    batch_size = settings.chat_history_max_messages
+    base = select(ChatMessage).where(ChatMessage.thread_id == thread.id,
+                                     ChatMessage.sender.in_(("user", "assistant")))
+    if thread.history_summary_until is not None:
+        base = base.where(_after((thread.history_summary_until, thread.history_summary_until_id)))
+    q = base.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(batch_size)
+    messages = list(reversed((await session.exec(q)).all()))
+
+    # A full window may leave older unsummarized messages behind it: fold them into
+    # the summary first, oldest first and a batch at a time, so the marker never skips rows
+    if len(messages) == batch_size:
+        first = messages[0]
+        while True:
+            q = base.where(or_(ChatMessage.created_at < first.created_at,
+                               and_(ChatMessage.created_at == first.created_at, ChatMessage.id < first.id)))
+            backlog = (await session.exec(q.order_by(ChatMessage.created_at, ChatMessage.id)
+                                          .limit(batch_size))).all()
+            if not backlog:
+                break
+            backlog = await resolve_messages(session, backlog)
+            thread.history_summary = fold_messages(thread.history_summary, backlog,
+                                                   settings.chat_history_summary_max_tokens)
+            thread.history_summary_until, thread.history_summary_until_id = backlog[-1].created_at, backlog[-1].id
+            if len(backlog) < batch_size:
+                break
+            base = base.where(_after((thread.history_summary_until, thread.history_summary_until_id)))
+
+    messages = await resolve_messages(session, messages)
+
+    summary_until = None
+    if thread.history_summary_until is not None:
+        summary_until = (thread.history_summary_until, thread.history_summary_until_id)
+    window = build_history(
+        messages, thread.history_summary, summary_until,
+        budget=settings.chat_history_token_budget,
+        message_max_tokens=settings.chat_history_message_max_tokens,
+        summary_max_tokens=settings.chat_history_summary_max_tokens,
     )
-    return chain, user_payload
+    if window.summary_changed:
+        thread.history_summary = window.summary
+        thread.history_summary_until, thread.history_summary_until_id = window.summary_until
+    return window.turns
+
+_chat_prompt = ChatPromptTemplate.from_messages([
+    ("system", CHAT_SYSTEM_PROMPT),
+    MessagesPlaceholder(variable_name="history"),
+    ("user", "{user_msg}")
+])
+_chat_chain = None
+
+def _build_chat_chain():
+    """System prompt + rolling history + the new user message --> chat model (compiled once)."""
+    global _chat_chain
+    model = _get_lc_model()
+    if _chat_chain is None or _chat_chain.last is not model:
+        _chat_chain = _chat_prompt | model
+    return _chat_chain
 
 # ---------- Routes ----------
 @app.post("/onboard", response_model=OnboardOut)
-def onboard(payload: OnboardIn, session=Depends(get_session)):
+async def onboard(payload: OnboardIn, session=Depends(get_async_session)):
     role_n, onet = _normalize_role(payload.role, payload.industry)
     thread = SessionThread(
         role_raw=payload.role,
@@ -181,160 +472,394 @@ def onboard(payload: OnboardIn, session=Depends(get_session)):
         onet_code=onet
     )
     session.add(thread)
-    session.commit()
-    session.refresh(thread)
+    await session.flush()  # assigns thread.id inside the transaction; one commit below
 
     # Seed initial messages for continuity
-    session.add(ChatMessage(thread_id=thread.id, sender="system",
-                            content="Anti-To-Do assistant initialized."))
-    session.add(ChatMessage(thread_id=thread.id, sender="user",
-                            content=f"Role={payload.role}; Industry={payload.industry}; Pains={payload.pains}"))
-    session.commit()
+    session.add_all([
+        ChatMessage(thread_id=thread.id, sender="system",
+                    content="Anti-To-Do assistant initialized."),
+        ChatMessage(thread_id=thread.id, sender="user",
+                    content=f"Role={payload.role}; Industry={payload.industry}; Pains={payload.pains}"),
+    ])
+    await session.commit()
 
     return OnboardOut(thread_id=thread.id, role_normalized=role_n, onet_code=onet)
 
 @app.post("/recommendations", response_model=RecsOut)
-def recommendations(payload: RecsIn, session=Depends(get_session)):
-    thread = session.get(SessionThread, payload.thread_id)
+async def recommendations(payload: RecsIn, session=Depends(get_async_session)):
+    thread = await session.get(SessionThread, payload.thread_id)
     if not thread:
         raise HTTPException(404, "Thread not found")
+    # End the read transaction so the pooled connection isn't held during the LLM call
+    await session.commit()
     
-    # Get LangFuse handler for tracing
-    langfuse_handler = _get_langfuse_handler()
-    callbacks = [langfuse_handler] if langfuse_handler else []
+    # Per-request callbacks (usage metrics + LangFuse tracing)
+    callbacks = _get_callbacks()
 
-    # Build context + chain
-    prompt_blob = build_recommendations_prompt(
-        role_raw=thread.role_raw,
-        industry_raw=thread.industry_raw,
-        pains_raw=thread.pains_raw,
-        role_normalized=thread.role_normalized,
-        onet_code=thread.onet_code
-    )
-    chain, user_payload = _build_recommendations_chain(prompt_blob, callbacks=callbacks)
+    # Build context (the chain is built on a cache miss)
+    prompt_blob = _thread_prompt_blob(thread)
 
-    # Run the chain (returns Python dict thanks to JsonOutputParser)
     try:
-        data = chain.invoke(user_payload, config={"callbacks": callbacks})
+        cache_key, data = await _generate_recs(prompt_blob, payload.bypass_cache, callbacks)
+    except RateLimited as e:
+        raise _overloaded(e)
     except Exception as e:
         raise HTTPException(500, f"Model failed to produce JSON: {e}")
 
-    # Persist recs - handle new structured format
-    items: List[RecItem] = []
-    
-    # Handle both old format (items) and new format (categories)
-    if "categories" in data:
-        # New structured format by category
-        for category_data in data.get("categories", []):
-            category_name = category_data.get("category_name", "General")
-            for it in category_data.get("items", []):
-                try:
-                    rec = Recommendation(
-                        thread_id=thread.id,
-                        item=str(it["item"]),
-                        rationale=str(it.get("rationale", "")),
-                        category=str(category_name),
-                        estimated_gain_minutes=int(it.get("estimated_gain_minutes", 0)),
-                        difficulty=str(it.get("difficulty", "medium"))
-                    )
-                    session.add(rec)
-                    items.append(RecItem(**{
-                        "item": rec.item,
-                        "rationale": rec.rationale,
-                        "category": rec.category,
-                        "estimated_gain_minutes": rec.estimated_gain_minutes,
-                        "difficulty": rec.difficulty
-                    }))
-                except Exception as e:
-                    # skip invalid items rather than 500 the whole request
-                    continue
-    else:
-        # Fallback to old format for backward compatibility
-        for it in data.get("items", [])[:5]:
+    # Persist the batch + recs (new structured format) + the assistant log message in one transaction
+    recs, items = _recommendation_rows(thread.id, data)
+    batch = await _add_batch(session, thread.id, cache_key, recs)
+    log = ChatMessage(thread_id=thread.id, sender="assistant", content=await _recommendations_log(session, recs, data))
+    if not _write_behind(log):
+        session.add(log)
+    await session.commit()
+
+    return RecsOut(thread_id=thread.id, items=items, batch_id=batch.id)
+
+@app.post("/recommendations/stream")
+async def recommendations_stream(payload: RecsIn, session=Depends(get_async_session)):
+    """
+    Same as /recommendations, but parses the model's JSON as it streams and sends each
+    category as soon as it is complete (`event: category` SSE frames). Ends with an
+    `event: done` frame. The batch, all Recommendation rows and the assistant log message are
+    persisted in one transaction once the stream completes; a client disconnect
+    persists nothing (same as /chat/stream).
+    """
+    thread = await session.get(SessionThread, payload.thread_id)
+    if not thread:
+        raise HTTPException(404, "Thread not found")
+    thread_id = thread.id
+    prompt_blob = _thread_prompt_blob(thread)
+    # Release the request-scoped session now; the stream outlives it
+    await session.close()
+
+    callbacks = _get_callbacks()
+    cache_key, cached = _lookup_cached_recs(prompt_blob, payload.bypass_cache)
+
+    pending: List[Recommendation] = []
+
+    def category_event(category_data: dict) -> str:
+        category_name = category_data.get("category_name", "General")
+        recs, items = _to_recommendations(thread_id, category_data.get("items", []), category_name)
+        pending.extend(recs)
+        return _sse({
+            "category": category_name,
+            "emoji": category_data.get("emoji"),
+            "items": jsonable_encoder(items),
+        }, event="category")
+
+    async def event_stream():
+        data = cached
+        emitted = 0
+        if data is None:
+            chain, user_payload = _build_recommendations_chain(prompt_blob)
+            data = {}
             try:
-                rec = Recommendation(
-                    thread_id=thread.id,
-                    item=str(it["item"]),
-                    rationale=str(it.get("rationale", "")),
-                    category=str(it.get("category", "General")),
-                    estimated_gain_minutes=int(it.get("estimated_gain_minutes", 0)),
-                    difficulty=str(it.get("difficulty", "medium"))
-                )
-                session.add(rec)
-                items.append(RecItem(**{
-                    "item": rec.item,
-                    "rationale": rec.rationale,
-                    "category": rec.category,
-                    "estimated_gain_minutes": rec.estimated_gain_minutes,
-                    "difficulty": rec.difficulty
-                }))
-            except Exception:
-                continue
-    
-    session.commit()
+                # JsonOutputParser yields the partially parsed object as tokens arrive
+                async for partial in chain.astream(user_payload, config={"callbacks": callbacks}):
+                    data = partial if isinstance(partial, dict) else {}
+                    categories = data.get("categories")
+                    if not isinstance(categories, list):
+                        continue
+                    # Every category before the last one seen is complete
+                    while emitted < len(categories) - 1:
+                        yield category_event(categories[emitted])
+                        emitted += 1
+            except RateLimited as e:
+                yield _sse({"detail": str(e), "retry_after": e.retry_after}, event="error")
+                return
+            except Exception as e:
+                yield _sse({"detail": f"Model failed to produce JSON: {e}"}, event="error")
+                return
+            _store_cached_recs(cache_key, prompt_blob, data)
+
+        if "categories" in data:
+            for category_data in data.get("categories", [])[emitted:]:
+                yield category_event(category_data)
+        else:
+            # Old flat format: no categories to stream, send the items in one frame
+            recs, items = _recommendation_rows(thread_id, data)
+            pending.extend(recs)
+            yield _sse({"category": None, "emoji": None, "items": jsonable_encoder(items)}, event="category")
+
+        # Stream finished: one unit of work for the rows + the assistant log message
+        async with new_async_session() as write_session:
+            batch = await _add_batch(write_session, thread_id, cache_key, pending)
+            log = ChatMessage(thread_id=thread_id, sender="assistant",
+                              content=await _recommendations_log(write_session, pending, data))
+            if not _write_behind(log):
+                write_session.add(log)
+            await write_session.commit()
+        yield _sse({"thread_id": thread_id, "batch_id": batch.id}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# One batch job at a time per process: a second one waits instead of doubling the model fan-out
+_recs_batch_lock = asyncio.Lock()
+
+async def _recommend_wave(session, thread_ids: List[int], bypass_cache: bool, concurrency: int,
+                          callbacks: list, results: Dict[int, RecsBatchResult],
+                          seen: Dict[str, dict]) -> Tuple[set, int]:
+    """
+    Generate + persist recommendations for one wave of threads (one transaction).
+    Threads with the same profile hash share one cache lookup / model call, also across
+    waves via `seen` (profile hash -> data). Fills `results`; returns (profile hashes, model calls).
+    """
+    threads = {t.id: t for t in (await session.exec(
+        select(SessionThread).where(SessionThread.id.in_(thread_ids)))).all()}
+    # End the read transaction so the pooled connection isn't held during the model calls
+    await session.commit()
+
+    keys: Dict[int, str] = {}
+    blobs: Dict[str, dict] = {}
+    found: Dict[str, dict] = {}
+    for thread_id in thread_ids:
+        thread = threads.get(thread_id)
+        if thread is None:
+            results[thread_id] = RecsBatchResult(ok=False, error="Thread not found")
+            continue
+        blob = _thread_prompt_blob(thread)
+        key = keys[thread_id] = make_cache_key(blob, model_label())
+        if key not in blobs:
+            blobs[key] = blob
+            data = seen.get(key)
+            if data is None:
+                _, data = _lookup_cached_recs(blob, bypass_cache)
+            if data is not None:
+                found[key] = data
+
+    # Fan out the cache misses: one model call per distinct profile, at most `concurrency` at a time
+    misses = [key for key in blobs if key not in found]
+    generated: Dict[str, dict] = {}
+    errors: Dict[str, str] = {}
+    if misses:
+        chain = None
+        payloads = []
+        for key in misses:
+            chain, payload = _build_recommendations_chain(blobs[key])
+            payloads.append(payload)
+        outputs = await chain.abatch(payloads, config={"callbacks": callbacks, "max_concurrency": concurrency},
+                                     return_exceptions=True)
+        for key, output in zip(misses, outputs):
+            if isinstance(output, Exception):
+                errors[key] = str(output) if isinstance(output, RateLimited) else f"Model failed to produce JSON: {output}"
+            else:
+                generated[key] = seen[key] = output
+                _store_cached_recs(key, blobs[key], output)
+
+    # Persist every successful thread in bulk: batches (one flush for all ids), rows, log messages
+    done = []
+    for thread_id, key in keys.items():
+        if key in errors:
+            results[thread_id] = RecsBatchResult(ok=False, error=errors[key])
+            continue
+        data = found[key] if key in found else generated[key]  # a cached value may be falsy ({})
+        recs, _ = _recommendation_rows(thread_id, data)
+        done.append((thread_id, key, data, recs,
+                     RecommendationBatch(thread_id=thread_id, model=model_label(), prompt_hash=key,
+                                         item_count=len(recs))))
+    try:
+        session.add_all([batch for *_, batch in done])
+        await session.flush()
+        for _, _, _, recs, batch in done:
+            for rec in recs:
+                rec.batch_id = batch.id
+            session.add_all(recs)
+        # Compact storage flushes the rows once here, for all threads
+        logs = [ChatMessage(thread_id=thread_id, sender="assistant",
+                            content=await _recommendations_log(session, recs, data))
+                for thread_id, _, data, recs, _ in done]
+        if not _write_behind(*logs):
+            session.add_all(logs)
+        await session.commit()
+    except Exception as e:
+        await session.rollback()
+        for thread_id, *_ in done:
+            results[thread_id] = RecsBatchResult(ok=False, error=f"Failed to save: {e}")
+        return set(blobs), len(misses)
+
+    for thread_id, key, data, recs, batch in done:
+        results[thread_id] = RecsBatchResult(ok=True, batch_id=batch.id, items=len(recs), cached=key in found)
+        seen[key] = data
+    return set(blobs), len(misses)
+
+async def _recommend_threads(session, thread_ids: List[int], bypass_cache: bool = False,
+                             max_concurrency: Optional[int] = None, on_wave=None) -> RecsBatchOut:
+    """Recommendations for many threads, wave by wave (also used by recommend_batch.py)."""
+    concurrency = max(1, min(max_concurrency or settings.recs_batch_max_concurrency,
+                             settings.recs_batch_max_concurrency))
+    thread_ids = list(dict.fromkeys(thread_ids))  # de-duplicate, keep order
+    callbacks = _get_callbacks()
+    results: Dict[int, RecsBatchResult] = {}
+    seen: Dict[str, dict] = {}
+    profiles: set = set()
+    model_calls = 0
+    t0 = time.perf_counter()
+    async with _recs_batch_lock:
+        for start in range(0, len(thread_ids), settings.recs_batch_wave_size):
+            wave = thread_ids[start:start + settings.recs_batch_wave_size]
+            keys, calls = await _recommend_wave(session, wave, bypass_cache, concurrency, callbacks, results, seen)
+            profiles |= keys
+            model_calls += calls
+            if on_wave is not None:
+                on_wave(len(results), len(thread_ids))
+    succeeded = sum(r.ok for r in results.values())
+    return RecsBatchOut(
+        results={thread_id: results[thread_id] for thread_id in thread_ids},
+        threads=len(thread_ids), succeeded=succeeded, failed=len(thread_ids) - succeeded,
+        profiles=len(profiles), model_calls=model_calls, elapsed_ms=round((time.perf_counter() - t0) * 1000, 1),
+    )
 
-    # Log assistant output as a message (optional)
-    session.add(ChatMessage(thread_id=thread.id, sender="assistant", content=json.dumps(data)))
-    session.commit()
+@app.post("/recommendations/batch", response_model=RecsBatchOut)
+async def recommendations_batch(payload: RecsBatchIn, session=Depends(get_async_session)):
+    """
+    Recommendations for many threads in one call, e.g. a cohort pre-generated overnight.
+    Threads are processed in waves of RECS_BATCH_WAVE_SIZE. Each wave de-duplicates
+    profiles by hash, serves what the cache has, sends the rest through the chain's
+    abatch() with bounded concurrency, and persists the wave in one transaction. One
+    failed thread doesn't fail the others: see the per-thread `results`.
+    """
+    if len(payload.thread_ids) > settings.recs_batch_max_threads:
+        raise HTTPException(413, f"At most {settings.recs_batch_max_threads} thread_ids per request")
+    return await _recommend_threads(session, payload.thread_ids, payload.bypass_cache, payload.max_concurrency)
 
-    return RecsOut(thread_id=thread.id, items=items)
+@app.get("/threads/{thread_id}/recommendations", response_model=RecommendationBatchOut)
+async def latest_recommendations(thread_id: int, request: Request, response: Response,
+                                 session=Depends(get_async_session)):
+    """
+    The thread's latest recommendation batch, read from the database (no generation).
+    Supports If-None-Match: a client holding the current ETag gets 304 after one indexed lookup.
+    """
+    q = select(RecommendationBatch).where(RecommendationBatch.thread_id == thread_id)\
+                                   .order_by(RecommendationBatch.created_at.desc()).limit(1)
+    batch = (await session.exec(q)).first()
+    if batch is None:
+        if await session.get(SessionThread, thread_id) is None:
+            raise HTTPException(404, "Thread not found")
+        raise HTTPException(404, "No recommendations for this thread yet")
+
+    etag = _batch_etag(batch.id)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    rows = (await session.exec(select(Recommendation).where(Recommendation.batch_id == batch.id)
+                                                     .order_by(Recommendation.id))).all()
+    response.headers.update(headers)
+    return RecommendationBatchOut(
+        thread_id=thread_id, batch_id=batch.id, model=batch.model, created_at=batch.created_at,
+        items=[RecItem(item=r.item, rationale=r.rationale, category=r.category,
+                       estimated_gain_minutes=r.estimated_gain_minutes, difficulty=r.difficulty)
+               for r in rows],
+    )
 
 @app.post("/chat", response_model=ChatOut)
-def chat(payload: ChatIn, session=Depends(get_session)):
-    thread = session.get(SessionThread, payload.thread_id)
+async def chat(payload: ChatIn, session=Depends(get_async_session)):
+    thread = await session.get(SessionThread, payload.thread_id)
     if not thread:
         raise HTTPException(404, "Thread not found")
     
-    # Get LangFuse handler for tracing
-    langfuse_handler = _get_langfuse_handler()
-    callbacks = [langfuse_handler] if langfuse_handler else []
-
-    # Pull a short history window
-    q = select(ChatMessage).where(ChatMessage.thread_id == thread.id)\
-                           .order_by(ChatMessage.created_at.desc()).limit(12)
-    history = list(reversed(session.exec(q).all()))
-
-    # LangChain prompt with a history placeholder
-    base_system = (
-        "You are the Anti-To-Do assistant. "
-        "Be concise and actionable; avoid stereotypes; clarify only if essential."
-    )
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", base_system),
-        MessagesPlaceholder(variable_name="history"),
-        ("user", "{user_msg}")
-    ])
-    llm = _get_lc_model(callbacks=callbacks)
+    # Per-request callbacks (usage metrics + LangFuse tracing)
+    callbacks = _get_callbacks()
+
+    lc_history = await _load_chat_history(session, thread)
+    # End the read transaction (+ persist a grown summary) so the pooled connection isn't held during the LLM call
+    await session.commit()
 
-    # Prepare LC "history" messages in LangChain's expected format
-    # Convert our stored messages to tuples ("user"/"assistant", content)
-    lc_history = []
-    for m in history:
-        role = "assistant" if m.sender == "assistant" else "user" if m.sender == "user" else "system"
-        # Only include user/assistant in the rolling history; system is already set above
-        if role in ("user", "assistant"):
-            lc_history.append((role, m.content))
+    chain = _build_chat_chain()
 
-    chain = prompt | llm
+    chat_input = {"history": lc_history, "user_msg": payload.message}
+    key = flight_key("chat", model_label(), CHAT_SYSTEM_PROMPT, chat_input)
 
     try:
-        resp = chain.invoke({"history": lc_history, "user_msg": payload.message}, config={"callbacks": callbacks})
+        resp = await _coalesced(key, lambda: chain.ainvoke(chat_input, config={"callbacks": callbacks}))
         reply_text = resp.content if hasattr(resp, "content") else str(resp)
+    except RateLimited as e:
+        raise _overloaded(e)
     except Exception as e:
         raise HTTPException(500, f"Chat model error: {e}")
 
-    # Persist the exchange
-    session.add(ChatMessage(thread_id=thread.id, sender="user", content=payload.message))
-    session.add(ChatMessage(thread_id=thread.id, sender="assistant", content=reply_text))
-    session.commit()
+    # Persist the exchange in the request: it is the history the next turn reads, so it
+    # never goes through write-behind
+    session.add_all((ChatMessage(thread_id=thread.id, sender="user", content=payload.message),
+                     ChatMessage(thread_id=thread.id, sender="assistant", content=reply_text)))
+    await session.commit()
 
     return ChatOut(thread_id=thread.id, reply=reply_text)
 
+@app.post("/chat/stream")
+async def chat_stream(payload: ChatIn, session=Depends(get_async_session)):
+    """
+    Same as /chat, but streams tokens as SSE `data: {"token": ...}` frames and ends with
+    an `event: done` frame carrying the full reply. The exchange is persisted only once
+    the stream completes; a client disconnect persists nothing.
+    """
+    thread = await session.get(SessionThread, payload.thread_id)
+    if not thread:
+        raise HTTPException(404, "Thread not found")
+    thread_id = thread.id
+
+    callbacks = _get_callbacks()
+
+    lc_history = await _load_chat_history(session, thread)
+    # Persist a grown summary, then release the request-scoped session; the stream outlives it
+    await session.commit()
+    await session.close()
+
+    chain = _build_chat_chain()
+
+    async def event_stream():
+        parts: List[str] = []
+        try:
+            async for chunk in chain.astream({"history": lc_history, "user_msg": payload.message},
+                                             config={"callbacks": callbacks}):
+                token = chunk.content if hasattr(chunk, "content") else str(chunk)
+                if token:
+                    parts.append(token)
+                    yield _sse({"token": token})
+        except RateLimited as e:
+            yield _sse({"detail": str(e), "retry_after": e.retry_after}, event="error")
+            return
+        except Exception as e:
+            yield _sse({"detail": f"Chat model error: {e}"}, event="error")
+            return
+
+        # Stream finished: persist the exchange (history, so not write-behind) with a
+        # short-lived session of its own
+        reply_text = "".join(parts)
+        async with new_async_session() as write_session:
+            write_session.add_all((ChatMessage(thread_id=thread_id, sender="user", content=payload.message),
+                                   ChatMessage(thread_id=thread_id, sender="assistant", content=reply_text)))
+            await write_session.commit()
+        yield _sse({"thread_id": thread_id, "reply": reply_text}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # ---- (Optional) health checks ----
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/metrics")
+def metrics():
+    return {
+        "recommendation_cache": rec_cache.stats() if rec_cache is not None else None,
+        "semantic_cache": semantic_cache.stats() if semantic_cache is not None else None,
+        "llm_usage": usage_tracker.stats(),
+        "write_behind": write_behind.stats() if write_behind is not None else None,
+        "single_flight": single_flight.stats() if single_flight is not None else None,
+        "rate_limiter": rate_limiter.stats() if rate_limiter is not None else None,
+        "admission": admission.stats() if admission is not None else None,
+    }
+
 # # ---- Start the server ----
 if __name__ == "__main__":
     import uvicorn
@@ -1,7 +1,9 @@
 from datetime import datetime
 from typing import Optional, List
 from enum import Enum
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field, Relationship
+from storage import CompactText
 
 # Enums
 class SenderType(str, Enum):
@@ -23,22 +25,56 @@ class SessionThread(SQLModel, table=True):
     pains_raw: str
     role_normalized: Optional[str] = None
     onet_code: Optional[str] = None
+    # Rolling summary of chat turns that fell out of the /chat history window (history.py)
+    history_summary: Optional[str] = None
+    # (created_at, id) of the last message folded in: the id breaks ties between equal timestamps
+    history_summary_until: Optional[datetime] = None
+    history_summary_until_id: Optional[int] = None
 
     messages: List["ChatMessage"] = Relationship(back_populates="thread")
     recommendations: List["Recommendation"] = Relationship(back_populates="thread")
+    recommendation_batches: List["RecommendationBatch"] = Relationship(back_populates="thread")
 
 class ChatMessage(SQLModel, table=True):
+    __table_args__ = (
+        # /chat history: WHERE thread_id = ? ORDER BY created_at DESC LIMIT 12
+        Index("ix_chatmessage_thread_created", "thread_id", "created_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     thread_id: int = Field(foreign_key="sessionthread.id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     sender: SenderType
-    content: str
+    content: str = Field(sa_type=CompactText)  # compressed / reference markers, see storage.py
 
     thread: SessionThread = Relationship(back_populates="messages")
 
+class RecommendationBatch(SQLModel, table=True):
+    """One /recommendations result: the Recommendation rows it produced link back here."""
+    __table_args__ = (
+        # latest batch of a thread: WHERE thread_id = ? ORDER BY created_at DESC LIMIT 1
+        Index("ix_recommendationbatch_thread_created", "thread_id", "created_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    thread_id: int = Field(foreign_key="sessionthread.id")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    model: str
+    prompt_hash: str            # recommendation cache key: same profile + prompt + model
+    item_count: int = 0
+
+    thread: SessionThread = Relationship(back_populates="recommendation_batches")
+    items: List["Recommendation"] = Relationship(back_populates="batch")
+
 class Recommendation(SQLModel, table=True):
+    __table_args__ = (
+        # recommendations of one thread, newest first
+        Index("ix_recommendation_thread_created", "thread_id", "created_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     thread_id: int = Field(foreign_key="sessionthread.id")
+    batch_id: Optional[int] = Field(default=None, foreign_key="recommendationbatch.id", index=True)  # None: written before batches
     created_at: datetime = Field(default_factory=datetime.utcnow)
     item: str                   # concise Anti-To-Do action
     rationale: str              # why this matters for this role/industry
@@ -46,4 +82,5 @@ class Recommendation(SQLModel, table=True):
     difficulty: DifficultyLevel
     category: str               # automate / outsource / batch / eliminate / delegate
 
-    thread: SessionThread = Relationship(back_populates="recommendations")
\ No newline at end of file
+    thread: SessionThread = Relationship(back_populates="recommendations")
+    batch: Optional[RecommendationBatch] = Relationship(back_populates="items")
\ No newline at end of file
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Offline batch jobs: run a JSONL file of ownership queries through the same code as POST /query, without HTTP.
+
+Each input line is one query:
+    {"id": "t-1", "query": "Who owns the billing page?", "context": "customer can't download invoices"}
+"id" is optional (the line number is used) and must be unique within the file;
+"context" is optional.
+
+Results are appended to the output JSONL, one line per query:
+    {"id": "t-1", "ok": true, "attempts": 1, "result": {"ticket_id": 12, "query": "...", "matches": [...], "best_match": {...}}}
+    {"id": "t-2", "ok": false, "attempts": 3, "error": "Model failed to produce JSON: ..."}
+The output file is also the checkpoint: a re-run with the same output skips
+every id already in it, so a crashed or interrupted job resumes where it stopped
+(--retry-failed re-runs the failed ones too). Model/database errors are retried
+with exponential backoff; bad input (missing "query") is not.
+
+Usage:
+    python batch_runner.py tickets.jsonl results.jsonl
+    python batch_runner.py tickets.jsonl results.jsonl --concurrency 8 --retries 5
+    python batch_runner.py tickets.jsonl results.jsonl --no-save      # resolve only, no tickets/audit rows
+    python batch_runner.py tickets.jsonl results.jsonl --parquet results.parquet   # needs pyarrow
+"""
+
+import asyncio
+
+import shared_path  # noqa: F401  (makes ../shared importable)
+from shared.batch_jobs import InvalidRequest, job_parser, run_app_jobs, run_cli
+
+
+# ---------- Ownership jobs ----------
+def ownership_handler(save: bool):
+    """POST /query's own code, on a worker thread (the route and the database session are sync)."""
+    from fastapi import HTTPException
+    from sqlmodel import Session
+
+    import main
+    from db import engine
+
+    def resolve(query: main.OwnershipQueryIn) -> dict:
+        with Session(engine) as session:
+            if not save:
+                data = main._resolve_ownership(session, query.query, query.context)
+                matches = [main.OwnerMatch(**match).model_dump() for match in data.get("matches", [])]
+                return {"query": query.query, "matches": matches, "best_match": matches[0] if matches else None}
+            try:
+                return main.query_ownership(query, session).model_dump()
+            except HTTPException as e:
+                if e.status_code < 500:
+                    raise InvalidRequest(e.detail)
+                raise RuntimeError(e.detail)
+
+    async def handle(record: dict) -> dict:
+        try:
+            query = main.OwnershipQueryIn(query=record["query"], context=record.get("context"))
+        except Exception as e:
+            raise InvalidRequest(f"Expected query (and optional context): {e}")
+        return await asyncio.to_thread(resolve, query)
+
+    return handle
+
+
+async def run(args) -> dict:
+    return await run_app_jobs(args, ownership_handler)
+
+
+def cli():
+    parser = job_parser(__doc__, "queries, one JSON object per line",
+                        "don't write tickets/audit messages to the database",
+                        concurrency=4, concurrency_help="queries in flight (each holds a DB connection)")
+    run_cli(parser, run)
+
+
+if __name__ == "__main__":
+    cli()
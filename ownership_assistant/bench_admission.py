@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+A /query traffic spike with and without admission control, and what it does to /health.
+
+/query is a sync route: every request holds a threadpool thread for the whole model
+call. Without admission control a spike fills the threadpool (40 threads) and the
+rest queue behind it, cheap routes included. With it, at most ADMISSION_ROUTE_LIMITS
+["/query"] calls run at once, a bounded queue waits up to the deadline, and the rest
+are shed with 503 right away.
+
+Runs in-process over ASGI against a fake model with a fixed latency (outbound rate
+limiter off, so only admission control differs). While N distinct queries arrive at
+once (from 50 API keys), /health is probed every 20 ms. Reports outcomes, /query latency of the
+answered requests, /health latency during the spike, and the queue-time histogram.
+
+Usage:
+    python bench_admission.py               # 200 queries, 0.5 s model latency (the "off" run takes ~2 min)
+    python bench_admission.py 1000 1.0
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+
+_tmpdir = tempfile.mkdtemp(prefix="own_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+os.environ["LLM_RATE_LIMIT_ENABLED"] = "false"
+os.environ["ADMISSION_ENABLED"] = "true"
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+import httpx
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import main
+from db import init_db
+from settings import settings
+
+TENANTS = 50  # distinct API keys in the spike, so the per-tenant cap isn't what sheds load
+ANSWER = ('{"matches": [{"owner_name": "Ada", "owner_email": "ada@example.com", "team": "Payments", '
+          '"rationale": "Owns billing", "confidence_score": 0.9}]}')
+
+
+class SlowModel(FakeListChatModel):
+    """Fake model that blocks its (threadpool) thread for a fixed latency."""
+
+    latency: float = 0.5
+
+    def _call(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return super()._call(*args, **kwargs)
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+async def spike(client: httpx.AsyncClient, n: int, tag: str):
+    health = []
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            t0 = time.perf_counter()
+            (await client.get("/health")).raise_for_status()
+            health.append(time.perf_counter() - t0)
+            await asyncio.sleep(0.02)
+
+    async def query(i: int):
+        t0 = time.perf_counter()
+        r = await client.post("/query", json={"query": f"Who owns billing? ({tag} {i})"},
+                              headers={"X-API-Key": f"tenant-{i % TENANTS}"})
+        return r.status_code, time.perf_counter() - t0
+
+    prober = asyncio.create_task(probe())
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(query(i) for i in range(n)))
+    wall = time.perf_counter() - t0
+    done.set()
+    await prober
+    return results, health, wall
+
+
+async def run(n: int, latency: float):
+    init_db()
+    main._get_lc_model = lambda model=SlowModel(responses=[ANSWER], latency=latency): model
+    limits = main.admission.routes
+    transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)  # count unhandled errors as 500s
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await client.post("/ingest", json={"source": "bench", "data": [
+            {"feature_name": "Billing", "owner_name": "Ada", "owner_email": "ada@example.com", "team": "Payments"}]})
+
+        print(f"{n} concurrent /query, model latency {latency:.2f} s, /query limit "
+              f"{settings.admission_route_limits.get('/query')}, queue timeout {settings.admission_queue_timeout_ms} ms")
+        print(f"{'admission':<9} | {'statuses':<18} | {'query p50':>9} | {'p99':>7} | "
+              f"{'health p50':>10} | {'p99':>7} | {'wall':>6}")
+        for label in ("off", "on"):
+            main.admission.routes = limits if label == "on" else {}
+            results, health, wall = await spike(client, n, label)
+            statuses = ", ".join(f"{code}×{count}" for code, count in sorted(Counter(s for s, _ in results).items()))
+            ok = [t for s, t in results if s == 200]
+            print(f"{label:<9} | {statuses:<18} | {statistics.median(ok):8.2f}s | {pct(ok, 0.99):6.2f}s | "
+                  f"{statistics.median(health) * 1e3:8.1f}ms | {pct(health, 0.99) * 1e3:5.0f}ms | {wall:5.1f}s")
+
+        histogram = main.admission.stats()["routes"]["/query"]["queue_ms"]
+        print("queue time (ms, cumulative):", ", ".join(f"≤{b} {c}" for b, c in histogram["buckets"].items()))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(run(int(args[0]) if len(args) > 0 else 200, float(args[1]) if len(args) > 1 else 0.5))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark loading the ownership catalog for /query.
+
+Seeds a throwaway SQLite database with N ownership rows (10k by default) and times:
+  - N+1:      the previous loop (select Ownership, then session.get area + owner per row)
+  - joined:   catalog.load_ownership_records (one joined query -> slotted tuples)
+  - snapshot: catalog_cache.get() once the snapshot is warm, between version checks
+  - checked:  the same with CATALOG_CHECK_INTERVAL_SECONDS=0 (a version query on every get)
+
+Usage:
+    python bench_catalog.py            # 10000 rows
+    python bench_catalog.py 50000
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from catalog import CatalogCache, load_ownership_records
+from models import Owner, Ownership, ProductArea
+
+
+def seed(engine, n: int):
+    with Session(engine) as session:
+        owners = [Owner(name=f"Owner {i}", email=f"owner{i}@example.com", team="Product", role="PM")
+                  for i in range(max(n // 5, 1))]
+        areas = [ProductArea(name=f"Area {i}", description=f"Feature area {i}", category="Core")
+                 for i in range(n)]
+        session.add_all(owners + areas)
+        session.flush()
+        session.add_all([
+            Ownership(area_id=area.id, owner_id=owners[i % len(owners)].id, notes=f"note {i}")
+            for i, area in enumerate(areas)
+        ])
+        session.commit()
+
+
+def n_plus_one(session) -> list:
+    """The previous query_ownership loading loop, verbatim."""
+    records = []
+    for ownership in session.exec(select(Ownership)).all():
+        area = session.get(ProductArea, ownership.area_id)
+        owner = session.get(Owner, ownership.owner_id)
+        records.append({
+            "area_name": area.name,
+            "description": area.description,
+            "category": area.category,
+            "owner_name": owner.name,
+            "owner_email": owner.email,
+            "team": owner.team,
+            "role": owner.role,
+            "notes": ownership.notes
+        })
+    return records
+
+
+def measure(label: str, engine, fn, runs: int):
+    times = []
+    for _ in range(runs):
+        with Session(engine) as session:  # fresh session: no identity-map carry-over between runs
+            t0 = time.perf_counter()
+            records = fn(session)
+            times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    with Session(engine) as session:
+        kept = fn(session)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<10} p50={statistics.median(times) * 1e3:10.3f} ms  "
+          f"peak alloc={peak / 2**20:7.1f} MiB  rows={len(records)}")
+    del kept
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        SQLModel.metadata.create_all(engine)
+        seed(engine, n)
+        print(f"{n:,} ownership rows")
+        measure("N+1", engine, n_plus_one, runs=3)
+        measure("joined", engine, load_ownership_records, runs=10)
+        cache = CatalogCache()
+        with Session(engine) as session:
+            cache.get(session)  # warm
+        measure("snapshot", engine, lambda s: cache.get(s).records, runs=1000)
+        checked = CatalogCache(check_interval_s=0)
+        with Session(engine) as session:
+            checked.get(session)
+        measure("checked", engine, lambda s: checked.get(s).records, runs=1000)
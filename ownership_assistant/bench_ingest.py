@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark /ingest: the previous per-record loop vs ingest.bulk_ingest.
+
+Each run starts from an empty throwaway SQLite database and ingests N synthetic
+product-matrix records (one owner per 5 areas, so owners repeat like in a real
+matrix). The per-record loop is only run up to --legacy-max records, because
+it commits twice per new owner/area and gets very slow.
+
+Usage:
+    python bench_ingest.py                         # 1k, 10k, 100k
+    python bench_ingest.py 50000 --legacy-max 0    # bulk only
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from sqlmodel import Session, SQLModel, create_engine, func, select
+
+from ingest import bulk_ingest
+from models import Owner, Ownership, ProductArea
+from settings import settings
+
+
+def synthetic_records(n: int) -> list:
+    return [{
+        "feature_name": f"Area {i}",
+        "description": f"Feature area {i}",
+        "category": "Core",
+        "owner_name": f"Owner {i // 5}",
+        "owner_email": f"owner{i // 5}@example.com",
+        "team": "Product",
+        "role": "PM",
+        "notes": f"note {i}",
+    } for i in range(n)]
+
+
+def legacy_ingest(session, records) -> int:
+    """The previous ingest_data loop, verbatim."""
+    records_ingested = 0
+    for record in records:
+        owner = session.exec(select(Owner).where(Owner.email == record.get("owner_email"))).first()
+        if not owner:
+            owner = Owner(name=record.get("owner_name"), email=record.get("owner_email"),
+                          team=record.get("team"), role=record.get("role"))
+            session.add(owner)
+            session.commit()
+            session.refresh(owner)
+        area = session.exec(select(ProductArea).where(ProductArea.name == record.get("feature_name"))).first()
+        if not area:
+            area = ProductArea(name=record.get("feature_name"), description=record.get("description"),
+                               category=record.get("category"))
+            session.add(area)
+            session.commit()
+            session.refresh(area)
+        ownership = session.exec(select(Ownership).where(
+            Ownership.area_id == area.id, Ownership.owner_id == owner.id)).first()
+        if not ownership:
+            session.add(Ownership(area_id=area.id, owner_id=owner.id, confidence=1.0, notes=record.get("notes")))
+            records_ingested += 1
+    session.commit()
+    return records_ingested
+
+
+def run(label: str, records: list, fn):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            t0 = time.perf_counter()
+            fn(session, records)
+            elapsed = time.perf_counter() - t0
+            rows = session.exec(select(func.count()).select_from(Ownership)).one()
+        # a second pass over the same data exercises the "everything already exists" path
+        with Session(engine) as session:
+            t0 = time.perf_counter()
+            fn(session, records)
+            again = time.perf_counter() - t0
+        engine.dispose()
+    print(f"  {label:<6} {elapsed:8.2f} s  ({len(records) / elapsed:9,.0f} rec/s)  "
+          f"re-ingest {again:7.2f} s  rows={rows}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sizes", nargs="*", type=int, default=[1_000, 10_000, 100_000])
+    parser.add_argument("--legacy-max", type=int, default=10_000)
+    args = parser.parse_args()
+    for n in args.sizes:
+        records = synthetic_records(n)
+        print(f"{n:,} records (chunk size {settings.ingest_chunk_size})")
+        if n <= args.legacy_max:
+            run("loop", records, legacy_ingest)
+        run("bulk", records, lambda s, r: bulk_ingest(s, r, chunk_size=settings.ingest_chunk_size))
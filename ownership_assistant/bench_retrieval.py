@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark /query prompt size and latency: whole catalog vs top-k BM25 candidates.
+
+Builds synthetic ownership catalogs (100, 10k, 100k areas by default) and, for a
+set of queries that each target one known area, reports:
+  - prompt tokens (tiktoken if it can load o200k_base, else chars/4)
+  - end-to-end local latency: retrieval + prompt build + chain run against a
+    fake model (so this is everything except the provider's own time)
+  - recall@k: how often the targeted area survived the pruning
+  - whether the prompt still fits a 128k context window
+
+Usage:
+    python bench_retrieval.py                  # 100, 10000, 100000 areas, k from settings
+    python bench_retrieval.py 100 10000 --k 10
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import main
+from prompts import build_ownership_resolution_prompt
+from retrieval import BM25Index
+from settings import settings
+
+CONTEXT_WINDOW = 128_000
+
+MODEL = FakeListChatModel(responses=['{"matches": []}'])
+main._get_lc_model = lambda: MODEL
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:  # not installed, or the encoding can't be downloaded (offline)
+    _ENCODING = None
+
+
+def count_tokens(text: str) -> int:
+    if _ENCODING is None:
+        return len(text) // 4
+    return len(_ENCODING.encode(text, disallowed_special=()))
+
+
+NOUNS = ("search billing invoice payment checkout login signup onboarding export import report "
+         "dashboard notification email webhook api sso permission role audit analytics cart refund "
+         "subscription pricing coupon tax shipping inventory catalog review rating upload storage "
+         "sync calendar chat comment mention share template workflow automation integration mobile").split()
+QUALIFIERS = ("advanced bulk realtime scheduled legacy enterprise mobile web internal partner "
+              "self-serve regional v2 beta admin guest").split()
+CATEGORIES = ("Core", "Growth", "Platform", "Monetization", "Infrastructure", "Security", "Mobile")
+TEAMS = ("Product", "Platform", "Growth", "Payments", "Identity", "Data", "Mobile", "Infra")
+
+
+def synthetic_catalog(n: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    records = []
+    for i in range(n):
+        a, b = rng.sample(NOUNS, 2)
+        name = f"{rng.choice(QUALIFIERS).title()} {a.title()} {b.title()} {i}"
+        records.append({
+            "area_name": name,
+            "description": f"Handles {a} and {b} for {rng.choice(QUALIFIERS)} customers ({rng.choice(NOUNS)} flows).",
+            "category": rng.choice(CATEGORIES),
+            "owner_name": f"Owner {i}",
+            "owner_email": f"owner{i}@example.com",
+            "team": rng.choice(TEAMS),
+            "role": rng.choice(("PM", "Tech Lead", "EM")),
+            "notes": f"Escalate {b} incidents via #{a}-oncall",
+        })
+    return records
+
+
+def run_query(records: list, index, query: str, k: int):
+    t0 = time.perf_counter()
+    candidates = index.search(query, k) if index is not None else records
+    blob = build_ownership_resolution_prompt(
+        query=query, context=None, ownership_data=candidates,
+        cache_friendly=settings.prompt_cache_layout, candidates_pruned=index is not None,
+    )
+    chain, payload = main._build_ownership_chain(blob)
+    messages = chain.steps[1].invoke({"payload": payload}).to_messages()
+    chain.invoke(payload)
+    elapsed = time.perf_counter() - t0
+    return elapsed, candidates, "\n".join(m.content for m in messages)
+
+
+def bench(n: int, k: int, queries: int = 20):
+    records = synthetic_catalog(n)
+    rng = random.Random(n)
+    targets = rng.sample(range(n), min(queries, n))
+
+    t0 = time.perf_counter()
+    index = BM25Index(records)
+    build_s = time.perf_counter() - t0
+
+    for label, idx in (("full catalog", None), (f"top-{k} BM25", index)):
+        latencies, hits, tokens = [], 0, 0
+        for q, target in enumerate(targets):
+            area = records[target]["area_name"]
+            query = f"Who owns {area}?"
+            if idx is None and q >= 3 and n > 1000:
+                break  # the full-catalog path is the same every time and slow at this size
+            elapsed, candidates, text = run_query(records, idx, query, k)
+            latencies.append(elapsed)
+            hits += any(c["area_name"] == area for c in candidates)
+            if q == 0:
+                tokens = count_tokens(text)
+        fits = "yes" if tokens <= CONTEXT_WINDOW else "NO"
+        print(f"  {label:<14} prompt={tokens:>10,} tok  fits 128k={fits:<3}  "
+              f"p50={statistics.median(latencies) * 1e3:9.2f} ms  "
+              f"recall={hits / len(latencies):.0%} ({len(latencies)} queries)")
+    print(f"  index build: {build_s * 1e3:.1f} ms ({len(index._postings):,} terms, once per /ingest)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sizes", nargs="*", type=int, default=[100, 10_000, 100_000])
+    parser.add_argument("--k", type=int, default=settings.retrieval_top_k)
+    args = parser.parse_args()
+    for n in args.sizes:
+        print(f"{n:,} areas")
+        bench(n, args.k)
@@ -0,0 +1,151 @@
+# catalog.py — In-memory ownership catalog
+# Purpose: load every ownership mapping with ONE joined query (instead of two
+# session.get calls per row) into flat, slotted records, and keep a materialized
+# snapshot of the result until the catalog changes.
+#
+# Ingest only ever inserts Ownership rows, so (max id, row count) of that table is
+# a cheap catalog version that any process can read: every worker re-checks it at
+# most once per CATALOG_CHECK_INTERVAL_SECONDS and reloads when it moved (an ingest
+# in another worker, ingest_file.py, a delete). /ingest in this process invalidates
+# at once; CATALOG_TTL_SECONDS bounds staleness from out-of-band owner/area edits.
+
+import threading
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from models import Owner, Ownership, ProductArea
+from retrieval import BM25Index
+from settings import settings
+
+
+class OwnershipRecord(NamedTuple):
+    """One area -> owner mapping, flattened. A tuple, so no per-record __dict__."""
+    area_name: str
+    description: Optional[str]
+    category: Optional[str]
+    owner_name: str
+    owner_email: str
+    team: Optional[str]
+    role: Optional[str]
+    notes: Optional[str]
+
+    def get(self, field: str, default=None):
+        # dict-style access, so prompts/retrieval take records and plain dicts alike
+        return getattr(self, field, default)
+
+
+_COLUMNS = (
+    ProductArea.name, ProductArea.description, ProductArea.category,
+    Owner.name, Owner.email, Owner.team, Owner.role,
+    Ownership.notes,
+)
+
+
+def load_ownership_records(session: Session) -> List[OwnershipRecord]:
+    """All ownership mappings joined with their area and owner, in one round trip."""
+    stmt = (
+        select(*_COLUMNS)
+        .join(ProductArea, ProductArea.id == Ownership.area_id)
+        .join(Owner, Owner.id == Ownership.owner_id)
+        .order_by(Ownership.id)
+    )
+    make = OwnershipRecord._make
+    return [make(row) for row in session.exec(stmt)]
+
+
+def catalog_version(session: Session) -> Tuple[int, int]:
+    """(max ownership id, ownership count): moves on every insert or delete, one indexed query."""
+    max_id, count = session.exec(select(func.max(Ownership.id), func.count(Ownership.id))).one()
+    return max_id or 0, count
+
+
+class CatalogSnapshot:
+    """Materialized catalog: the records plus a lazily built BM25 index over them."""
+
+    def __init__(self, records: List[OwnershipRecord], version: Tuple[int, int] = (0, 0)):
+        self.records = records
+        self.version = version
+        self.loaded_at = self.checked_at = time.monotonic()
+        self._index: Optional[BM25Index] = None
+        self._lock = threading.Lock()
+
+    @property
+    def index(self) -> BM25Index:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = BM25Index(self.records)
+        return self._index
+
+
+class CatalogCache:
+    """
+    Holds the current snapshot. `invalidate()` bumps a generation counter, so a
+    load that started before an ingest never installs its (stale) result.
+    A snapshot is served while it is younger than `ttl_s` and the DB-side
+    catalog_version() (re-read every `check_interval_s`) still matches it; the
+    first request to find it stale invalidates it the same way.
+    """
+
+    def __init__(self, ttl_s: float = 300.0, check_interval_s: float = 1.0):
+        self.ttl_s = ttl_s
+        self.check_interval_s = check_interval_s
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.hits = 0
+        self.stale = 0  # reloads because the DB version moved or the TTL ran out
+
+    def get(self, session: Session) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        now = time.monotonic()
+        version = None
+        if snapshot is not None:
+            if now - snapshot.loaded_at < self.ttl_s:
+                if now - snapshot.checked_at < self.check_interval_s:
+                    self.hits += 1
+                    return snapshot
+                version = catalog_version(session)
+                if version == snapshot.version:
+                    snapshot.checked_at = now
+                    self.hits += 1
+                    return snapshot
+            self.stale += 1
+            with self._lock:
+                if self._snapshot is snapshot:  # a load already under way read the old catalog
+                    self._generation += 1
+                    self._snapshot = None
+        generation = self._generation
+        # Version first: a concurrent insert then only makes the next check reload again
+        if version is None:
+            version = catalog_version(session)
+        snapshot = CatalogSnapshot(load_ownership_records(session), version)
+        with self._lock:
+            self.loads += 1
+            if generation == self._generation:
+                self._snapshot = snapshot
+        return snapshot
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "records": len(snapshot.records) if snapshot is not None else None,
+            "loads": self.loads,
+            "hits": self.hits,
+            "stale_reloads": self.stale,
+            "generation": self._generation,
+            "version": list(snapshot.version) if snapshot is not None else None,
+        }
+
+
+catalog_cache = CatalogCache(ttl_s=settings.catalog_ttl_seconds,
+                             check_interval_s=settings.catalog_check_interval_seconds)
@@ -0,0 +1,19 @@
+# conftest.py — Test environment for the ownership assistant's tests
+# Purpose: point every test at a throwaway SQLite file and the offline fake model
+# before settings.py is first imported, so the suite needs no API key or network.
+#
+# Run from this directory (python -m pytest -q): the app imports its own flat
+# modules (settings, db, models, main), which share names with a2d's at the repo root.
+
+import os
+import tempfile
+
+import shared_path  # noqa: F401  (makes ../shared importable)
+
+# Smoke script against a running server: python test_ownership.py
+collect_ignore = ["test_ownership.py"]
+
+_tmpdir = tempfile.mkdtemp(prefix="ownership_test_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'test.db')}"
+os.environ["ADMISSION_ENABLED"] = "false"
+os.environ["LLM_PROVIDER"] = "fake"
@@ -1,7 +1,58 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import SQLModel, create_engine, Session
 from settings import settings
 
-engine = create_engine(settings.database_url, echo=False)
+
+def engine_kwargs(url: str) -> dict:
+    """Pool configuration for DATABASE_URL (in-memory SQLite keeps SQLAlchemy's single-connection pool)."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return {}
+    kwargs = dict(
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout_seconds,
+    )
+    if parsed.get_backend_name() == "sqlite":
+        # pooled connections move between threads; the driver-level timeout matches busy_timeout
+        kwargs["connect_args"] = {"check_same_thread": False,
+                                  "timeout": settings.db_sqlite_busy_timeout_ms / 1000}
+    else:
+        kwargs.update(pool_recycle=settings.db_pool_recycle_seconds, pool_pre_ping=settings.db_pool_pre_ping)
+    return kwargs
+
+
+def sqlite_pragmas() -> list:
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(settings.db_sqlite_busy_timeout_ms)}",
+        f"PRAGMA synchronous = {settings.db_sqlite_synchronous}",
+        f"PRAGMA mmap_size = {int(settings.db_sqlite_mmap_size)}",
+        f"PRAGMA cache_size = -{int(settings.db_sqlite_cache_size_kib)}",  # negative = KiB
+    ]
+    if settings.db_sqlite_wal:
+        pragmas.insert(0, "PRAGMA journal_mode = WAL")
+    return pragmas
+
+
+def build_engine(url: str):
+    engine = create_engine(url, echo=False, **engine_kwargs(url))
+    if engine.dialect.name == "sqlite":
+        pragmas = sqlite_pragmas()
+
+        @event.listens_for(engine, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for pragma in pragmas:
+                    cursor.execute(pragma)
+            finally:
+                cursor.close()
+    return engine
+
+
+engine = build_engine(settings.database_url)
 
 
 def get_session():
@@ -9,6 +60,17 @@ def get_session():
         yield s
 
 
+def _ensure_indexes():
+    """create_all() skips tables that already exist, so add any indexes they are missing."""
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(engine, checkfirst=True)
+            except IntegrityError as e:
+                # e.g. duplicate owner emails from before the unique index existed
+                print(f"⚠️  Could not create {index.name}: {e.orig}. De-duplicate {table.name} and restart.")
+
+
 def init_db():
     SQLModel.metadata.create_all(engine)
-
+    _ensure_indexes()
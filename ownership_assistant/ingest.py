@@ -0,0 +1,372 @@
+# ingest.py — Bulk, set-based ownership ingest
+# Purpose: load product-matrix records in chunks instead of row by row.
+# Per chunk: de-duplicate owners/areas in memory, resolve existing IDs with
+# batched IN lookups, bulk-insert what is missing, and commit once. Inserts are
+# INSERT ... ON CONFLICT DO NOTHING followed by a re-select, so two concurrent
+# ingests of the same new owner/area both succeed instead of one failing on the
+# unique index.
+#
+# The streaming half (parsers + load_records) reads NDJSON, CSV or a JSON array
+# incrementally from any iterable of byte chunks, so memory stays bounded by
+# one batch no matter how big the file or request body is.
+
+import codecs
+import csv
+import json
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from models import Owner, Ownership, ProductArea
+
+# Stay well under SQLite's bound-parameter limit for IN (...) lists
+LOOKUP_BATCH = 500
+# A chunk that still hits a unique index (databases without ON CONFLICT) is retried this often
+CHUNK_RETRIES = 2
+
+
+def _batches(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _lookup_ids(session: Session, key_column, id_column, keys: List[str]) -> Dict[str, int]:
+    """key -> id for the keys that already exist, in batched IN lookups."""
+    found = {}
+    for batch in _batches(keys, LOOKUP_BATCH):
+        for key, row_id in session.exec(select(key_column, id_column).where(key_column.in_(batch))):
+            found[key] = row_id
+    return found
+
+
+def _insert_ignore(session: Session, model):
+    """INSERT that skips rows hitting a unique index (ON CONFLICT DO NOTHING) where the database supports it."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        return sqlite.insert(model).on_conflict_do_nothing()
+    if dialect == "postgresql":
+        return postgresql.insert(model).on_conflict_do_nothing()
+    return insert(model)  # a conflict raises IntegrityError; ingest_chunk retries the chunk
+
+
+def _resolve(session: Session, model, key_field: str, rows: Dict[str, dict]) -> Dict[str, int]:
+    """IDs for every key in `rows`, inserting the ones that don't exist yet."""
+    key_column = getattr(model, key_field)
+    ids = _lookup_ids(session, key_column, model.id, list(rows))
+    missing = [row for key, row in rows.items() if key not in ids]
+    if missing:
+        # a concurrent ingest may insert some of these first: skip them, then re-select every ID
+        session.exec(_insert_ignore(session, model), params=missing)
+        ids.update(_lookup_ids(session, key_column, model.id, [row[key_field] for row in missing]))
+    return ids
+
+
+def _existing_pairs(session: Session, pairs: List[Tuple[int, int]]) -> set:
+    """The (area_id, owner_id) pairs that are already mapped, via the area_id-led index."""
+    wanted = set(pairs)
+    found = set()
+    area_ids = sorted({area_id for area_id, _ in pairs})
+    for batch in _batches(area_ids, LOOKUP_BATCH):
+        stmt = select(Ownership.area_id, Ownership.owner_id).where(Ownership.area_id.in_(batch))
+        found.update(pair for pair in map(tuple, session.exec(stmt)) if pair in wanted)
+    return found
+
+
+def ingest_chunk(session: Session, records: List[dict]) -> Tuple[int, int]:
+    """
+    Apply one chunk of product-matrix records in a single transaction.
+    Same semantics as the old per-record loop: existing owners/areas are reused
+    (first occurrence wins, nothing is overwritten) and only new area/owner
+    pairs count as ingested. Returns (ingested, skipped).
+    """
+    for attempt in range(CHUNK_RETRIES + 1):
+        try:
+            return _apply_chunk(session, records)
+        except IntegrityError:
+            # a concurrent ingest inserted the same owner/area/pair first: redo the lookups
+            session.rollback()
+            if attempt == CHUNK_RETRIES:
+                raise
+
+
+def _apply_chunk(session: Session, records: List[dict]) -> Tuple[int, int]:
+    now = datetime.utcnow()
+    owners: Dict[str, dict] = {}
+    areas: Dict[str, dict] = {}
+    valid = []
+    for record in records:
+        email, name = record.get("owner_email"), record.get("feature_name")
+        if not email or not name or not record.get("owner_name"):
+            continue
+        valid.append(record)
+        owners.setdefault(email, {
+            "name": record.get("owner_name"), "email": email,
+            "team": record.get("team"), "role": record.get("role"), "created_at": now,
+        })
+        areas.setdefault(name, {
+            "name": name, "description": record.get("description"),
+            "category": record.get("category"), "created_at": now,
+        })
+
+    owner_ids = _resolve(session, Owner, "email", owners)
+    area_ids = _resolve(session, ProductArea, "name", areas)
+
+    new_pairs: Dict[Tuple[int, int], dict] = {}
+    for record in valid:
+        pair = (area_ids[record["feature_name"]], owner_ids[record["owner_email"]])
+        new_pairs.setdefault(pair, {
+            "area_id": pair[0], "owner_id": pair[1], "confidence": 1.0,
+            "notes": record.get("notes"), "created_at": now,
+        })
+    for pair in _existing_pairs(session, list(new_pairs)):
+        new_pairs.pop(pair, None)
+    ingested = 0
+    if new_pairs:
+        # pairs a concurrent ingest mapped first are skipped and not counted (when the driver reports it)
+        result = session.connection().execute(_insert_ignore(session, Ownership), list(new_pairs.values()))
+        ingested = result.rowcount if result.rowcount >= 0 else len(new_pairs)
+
+    session.commit()
+    return ingested, len(records) - len(valid)
+
+
+def bulk_ingest(session: Session, records: Iterable[dict], chunk_size: int = 1000) -> Tuple[int, int]:
+    """Ingest records chunk by chunk (one transaction each). Returns (ingested, skipped)."""
+    ingested = skipped = 0
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            added, bad = ingest_chunk(session, chunk)
+            ingested, skipped, chunk = ingested + added, skipped + bad, []
+    if chunk:
+        added, bad = ingest_chunk(session, chunk)
+        ingested, skipped = ingested + added, skipped + bad
+    return ingested, skipped
+
+
+# ---------- Streaming ingest ----------
+FORMATS = ("ndjson", "csv", "json")
+
+
+class IngestRecord(BaseModel):
+    """One product-matrix row, as accepted by the streaming loaders."""
+    feature_name: str = Field(min_length=1)
+    owner_name: str = Field(min_length=1)
+    owner_email: str = Field(min_length=1)
+    description: Optional[str] = None
+    category: Optional[str] = None
+    team: Optional[str] = None
+    role: Optional[str] = None
+    notes: Optional[str] = None
+
+
+class IngestProgress:
+    """Running counters for one streaming load."""
+
+    MAX_ERRORS = 20  # keep only the first few error messages
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.records_seen = 0
+        self.records_ingested = 0
+        self.records_skipped = 0  # invalid rows (parse or validation errors)
+        self.batches = 0
+        self.bytes_read = 0
+        self.errors: List[str] = []
+        self.done = False
+
+    def error(self, where: str, message: str):
+        self.records_skipped += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append(f"{where}: {message}")
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            "records_seen": self.records_seen,
+            "records_ingested": self.records_ingested,
+            "records_skipped": self.records_skipped,
+            "batches": self.batches,
+            "bytes_read": self.bytes_read,
+            "elapsed_seconds": round(elapsed, 3),
+            "records_per_second": round(self.records_seen / elapsed, 1) if elapsed > 0 else 0.0,
+            "done": self.done,
+            "errors": list(self.errors),
+        }
+
+
+def _counted(chunks: Iterable[bytes], progress: IngestProgress) -> Iterator[bytes]:
+    for chunk in chunks:
+        progress.bytes_read += len(chunk)
+        yield chunk
+
+
+def iter_text(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Decode UTF-8 byte chunks incrementally (multi-byte characters may straddle chunks)."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Text lines (newline kept, like a file) from byte chunks."""
+    pending = ""
+    for text in iter_text(chunks):
+        # the last piece may be an incomplete line: keep it for the next chunk
+        *lines, pending = (pending + text).split("\n")
+        for line in lines:
+            yield line + "\n"
+    if pending:
+        yield pending
+
+
+def parse_ndjson(chunks: Iterable[bytes], progress: IngestProgress) -> Iterator[dict]:
+    for lineno, line in enumerate(iter_lines(chunks), start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            progress.records_seen += 1
+            progress.error(f"line {lineno}", f"invalid JSON ({e})")
+            continue
+        yield record
+
+
+def parse_csv(chunks: Iterable[bytes], progress: IngestProgress) -> Iterator[dict]:
+    # DictReader pulls further lines itself when a quoted field spans lines
+    for row in csv.DictReader(iter_lines(chunks)):
+        yield {key: (value if value != "" else None) for key, value in row.items() if key}
+
+
+# A decode error this close to the end of the buffer may just be a cut-off literal,
+# number or escape ("tru", "1e", "\\u00"): read more before calling the element malformed
+_PARTIAL_TAIL = 16
+# One array element is never this large; stop buffering instead of reading the rest of the body
+MAX_ELEMENT_CHARS = 1 << 20
+
+
+def _incomplete(buf: str, error: json.JSONDecodeError) -> bool:
+    """Whether `error` can be fixed by more input (vs. a malformed element)."""
+    if error.msg.startswith("Unterminated string"):
+        return True
+    return len(buf[error.pos:].rstrip()) <= _PARTIAL_TAIL
+
+
+def parse_json_array(chunks: Iterable[bytes], progress: IngestProgress) -> Iterator[dict]:
+    """
+    Objects from a top-level JSON array (e.g. data/sample_product_matrix.json), one at a time.
+    A malformed element raises ValueError with its character offset right away.
+    """
+    decoder = json.JSONDecoder()
+    texts = iter_text(chunks)
+    buf, pos, eof, started = "", 0, False, False
+    offset = 0  # characters dropped from the front of buf
+    while True:
+        # skip whitespace and separators between elements
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise ValueError(f"unexpected end of JSON array at character {offset + pos}")
+            buf, pos, offset = buf[pos:], 0, offset + pos
+            try:
+                buf += next(texts)
+            except StopIteration:
+                eof = True
+            continue
+        if not started:
+            if buf[pos] != "[":
+                raise ValueError("expected a JSON array of records")
+            started, pos = True, pos + 1
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            record, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+            if eof or not _incomplete(buf, e) or len(buf) - pos > MAX_ELEMENT_CHARS:
+                raise ValueError(f"malformed JSON at character {offset + e.pos}: {e.msg}") from None
+            try:
+                buf, pos, offset = buf[pos:] + next(texts), 0, offset + pos  # element not complete yet: read more
+            except StopIteration:
+                eof = True
+            continue
+        pos = end
+        yield record
+
+
+PARSERS: Dict[str, Callable[[Iterable[bytes], IngestProgress], Iterator[dict]]] = {
+    "ndjson": parse_ndjson,
+    "csv": parse_csv,
+    "json": parse_json_array,
+}
+
+
+def detect_format(name: Optional[str] = None, content_type: Optional[str] = None) -> Optional[str]:
+    """Format from an explicit name, a file extension or a Content-Type header."""
+    hint = (name or "").lower()
+    if hint in FORMATS:
+        return hint
+    if hint.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if hint.endswith(".csv"):
+        return "csv"
+    if hint.endswith(".json"):
+        return "json"
+    ctype = (content_type or "").split(";")[0].strip().lower()
+    if ctype in ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines"):
+        return "ndjson"
+    if ctype in ("text/csv", "application/csv"):
+        return "csv"
+    if ctype == "application/json":
+        return "json"
+    return None
+
+
+def load_records(session: Session, chunks: Iterable[bytes], fmt: str, batch_size: int = 1000,
+                 progress: Optional[IngestProgress] = None,
+                 on_batch: Optional[Callable[[IngestProgress], None]] = None) -> IngestProgress:
+    """
+    Parse `chunks` incrementally, validate every record and apply them in batches
+    of `batch_size` through ingest_chunk (one transaction per batch).
+    Invalid rows are counted and skipped; a malformed stream raises ValueError.
+    """
+    progress = progress or IngestProgress()
+    batch: List[dict] = []
+
+    def flush():
+        added, skipped = ingest_chunk(session, batch)
+        progress.records_ingested += added
+        progress.records_skipped += skipped
+        progress.batches += 1
+        batch.clear()
+        if on_batch is not None:
+            on_batch(progress)
+
+    for record in PARSERS[fmt](_counted(chunks, progress), progress):
+        progress.records_seen += 1
+        try:
+            batch.append(IngestRecord.model_validate(record).model_dump())
+        except ValidationError as e:
+            missing = ", ".join(".".join(map(str, err["loc"])) for err in e.errors())
+            progress.error(f"record {progress.records_seen}", f"invalid fields: {missing}")
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    progress.done = True
+    return progress
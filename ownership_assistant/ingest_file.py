@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Load a product-matrix file (JSON array, NDJSON or CSV) into the ownership database.
+
+The file is read in fixed-size chunks, parsed incrementally and applied in
+batches, so memory stays flat whatever the file size. Progress and throughput
+are printed as the load runs.
+
+Usage:
+    python ingest_file.py data/sample_product_matrix.json
+    python ingest_file.py matrix.csv --batch-size 5000
+    python ingest_file.py matrix.ndjson --url http://localhost:8001   # stream to a running server
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from settings import settings
+from ingest import FORMATS, PARSERS, IngestProgress, detect_format, load_records
+
+READ_SIZE = 64 * 1024
+
+
+def read_chunks(path: str, size: int = READ_SIZE):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def print_progress(progress: IngestProgress, final: bool = False):
+    stats = progress.stats()
+    print(f"{'done' if final else '...':>4} {stats['records_seen']:>10,} records  "
+          f"{stats['records_ingested']:>10,} ingested  {stats['records_skipped']:>7,} skipped  "
+          f"{stats['bytes_read'] / 2**20:8.1f} MiB  {stats['records_per_second']:>9,.0f} rec/s",
+          file=sys.stderr if not final else sys.stdout, flush=True)
+
+
+def load_into_db(path: str, fmt: str, batch_size: int) -> IngestProgress:
+    import models  # noqa: F401  (registers the tables)
+    from sqlmodel import Session
+    from db import engine, init_db
+
+    init_db()
+    last = [time.monotonic()]
+
+    def on_batch(progress: IngestProgress):
+        if time.monotonic() - last[0] >= 1.0:
+            last[0] = time.monotonic()
+            print_progress(progress)
+
+    with Session(engine) as session:
+        return load_records(session, read_chunks(path), fmt, batch_size=batch_size, on_batch=on_batch)
+
+
+def upload(path: str, fmt: str, url: str) -> dict:
+    """Stream the file to POST /ingest/stream (chunked transfer, nothing buffered in full)."""
+    import requests
+
+    if fmt == "json":
+        # re-encode the array as NDJSON on the fly so the server can split on newlines
+        progress = IngestProgress()
+        body = (json.dumps(record).encode() + b"\n" for record in PARSERS["json"](read_chunks(path), progress))
+        fmt = "ndjson"
+    else:
+        body = read_chunks(path)
+    response = requests.post(f"{url.rstrip('/')}/ingest/stream", params={"format": fmt}, data=body)
+    response.raise_for_status()
+    return response.json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, help="default: from the file extension")
+    parser.add_argument("--batch-size", type=int, default=settings.ingest_chunk_size)
+    parser.add_argument("--url", help="stream to a running server instead of writing to DATABASE_URL")
+    args = parser.parse_args()
+
+    fmt = detect_format(args.format or args.path)
+    if fmt is None:
+        parser.error(f"can't tell the format of {args.path}; pass --format")
+
+    if args.url:
+        print(json.dumps(upload(args.path, fmt, args.url), indent=2))
+        return
+    progress = load_into_db(args.path, fmt, args.batch_size)
+    print_progress(progress, final=True)
+    for error in progress.errors:
+        print(f"  skipped {error}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
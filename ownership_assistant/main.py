@@ -1,40 +1,58 @@
 # main.py — Ownership Resolution Assistant
 # Purpose: REST API for ownership queries with LangChain integration
 
+import asyncio
 import json
-from typing import Optional, List
+import math
+import queue
+import time
+from typing import Iterator, Optional, List
 
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from sqlmodel import select
+from sqlmodel import Session
 
 # ---- Local modules ----
-from db import init_db, get_session
-from models import SupportTicket, Owner, ProductArea, Ownership, OwnershipMessage
+import shared_path  # noqa: F401  (makes ../shared importable)
+from db import init_db, get_session, engine
+from models import SupportTicket, OwnershipMessage
 from settings import settings
 from prompts import build_ownership_resolution_prompt
+from catalog import catalog_cache
+from ingest import bulk_ingest, load_records, detect_format, IngestProgress, FORMATS
+from shared.write_behind import build_write_behind
+from shared.singleflight import build_single_flight, flight_key
+from shared.ratelimit import build_rate_limiter, RateLimited
+from shared.admission import AdmissionMiddleware, build_admission_control
 
-# ---- LangChain imports ----
-from langchain_openai import ChatOpenAI
+# ---- LangChain imports (the model itself lives in shared/llm.py) ----
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.runnables import RunnablePassthrough
+from langchain_core.messages import HumanMessage
 
-# ---- LangFuse integration (optional) ----
-try:
-    from langfuse import Langfuse
-    from langfuse.langchain import CallbackHandler
-    LANGFUSE_AVAILABLE = True
-except ImportError:
-    LANGFUSE_AVAILABLE = False
-    Langfuse = None
-    CallbackHandler = None
+# ---- Shared model + LangFuse clients (built once per process) ----
+from shared.llm import init_models, close_models, get_model, model_label, request_callbacks, usage_tracker, langfuse_configured
 
 
+# ---------- Write-behind queue for audit rows (optional) ----------
+write_behind = build_write_behind(engine)
+
+# ---------- Single-flight: identical concurrent model calls share one call ----------
+single_flight = build_single_flight()
+
+# ---------- Outbound rate limiter: every model call waits for the RPM/TPM buckets + a concurrency slot ----------
+rate_limiter = build_rate_limiter()
+
+# ---------- Admission control: bounded in-flight work per route / tenant, shed the rest ----------
+admission = build_admission_control()
+
 # ---------- FastAPI app ----------
 app = FastAPI(title="Ownership Resolution Assistant", version="0.1")
 
+if admission is not None:
+    app.add_middleware(AdmissionMiddleware, control=admission)  # inside CORS, so 503/429 carry CORS headers
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"],
@@ -43,14 +61,24 @@ app.add_middleware(
 @app.on_event("startup")
 def startup():
     init_db()
+    init_models()
+    if write_behind is not None:
+        write_behind.start()
     
     # Initialize LangFuse if credentials are provided
-    if LANGFUSE_AVAILABLE and settings.langfuse_secret_key and settings.langfuse_public_key:
+    if langfuse_configured():
         print(f"✅ LangFuse initialized: {settings.langfuse_host}")
     else:
         print("ℹ️  LangFuse not configured (optional)")
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    if write_behind is not None:
+        await asyncio.to_thread(write_behind.close)  # flush queued audit rows
+    await close_models()
+
+
 # ---------- Pydantic Schemas ----------
 class OwnershipQueryIn(BaseModel):
     query: str
@@ -78,34 +106,37 @@ class IngestDataIn(BaseModel):
 class IngestDataOut(BaseModel):
     status: str
     records_ingested: int
+    records_skipped: int = 0  # missing feature_name / owner_name / owner_email
+
+class IngestStreamOut(BaseModel):
+    status: str
+    records_seen: int
+    records_ingested: int
+    records_skipped: int
+    batches: int
+    bytes_read: int
+    elapsed_seconds: float
+    records_per_second: float
+    errors: List[str]
 
 
 # ---------- Helpers ----------
-def _get_langfuse_handler():
-    """Get LangFuse CallbackHandler if configured."""
-    if (LANGFUSE_AVAILABLE and 
-        settings.langfuse_secret_key and 
-        settings.langfuse_public_key):
-        langfuse = Langfuse(
-            public_key=settings.langfuse_public_key,
-            secret_key=settings.langfuse_secret_key,
-            host=settings.langfuse_host
-        )
-        return CallbackHandler()
-    return None
-
-def _get_lc_model(callbacks=None):
-    """Get LangChain model instance."""
-    return ChatOpenAI(
-        model=settings.model,
-        temperature=0.3,
-        api_key=settings.openai_api_key,
-        callbacks=callbacks or [],
-    )
+_STREAM_QUEUE_CHUNKS = 16  # request-body chunks buffered between the reader and the DB worker
+_PROGRESS_LOG_SECONDS = 5.0
+_last_ingest: Optional[IngestProgress] = None  # most recent streaming load, live while it runs
+
+def _get_callbacks() -> list:
+    """Token-usage metrics + LangFuse CallbackHandler if configured (the client itself is shared)."""
+    return request_callbacks()
+
+def _get_lc_model():
+    """Process-wide LangChain model (behind the rate limiter if enabled); callbacks go through the invoke config."""
+    model = get_model()
+    return rate_limiter.wrap(model) if rate_limiter is not None else model
 
 
 # ---------- LangChain: Ownership resolution chain ----------
-def _build_ownership_chain(prompt_blob: dict, callbacks=None):
+def _build_ownership_chain(prompt_blob: dict):
     """Build chain for ownership resolution."""
     
     system_text = prompt_blob["system"]
@@ -113,20 +144,37 @@ def _build_ownership_chain(prompt_blob: dict, callbacks=None):
     context = prompt_blob["context"]
     few_shot = prompt_blob["few_shot"]
     query = prompt_blob["query"]
+    static_prefix = prompt_blob.get("static_prefix")
     
-    # Build user payload
-    user_payload = json.dumps({
-        "instructions": instructions,
-        "query": query,
-        "context": context,
-        "example": few_shot
-    }, indent=2)
-    
-    # Create prompt
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", system_text),
-        ("user", "{payload}")
-    ])
+    if static_prefix:
+        # Cache-friendly layout: static block first (sent verbatim, not templated),
+        # then only the per-query part
+        user_payload = {
+            "query": query,
+            "context": context,
+        }
+        if prompt_blob.get("candidates") is not None:
+            user_payload["ownership_candidates"] = prompt_blob["candidates"]
+        user_payload = json.dumps(user_payload, indent=2)
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", system_text),
+            HumanMessage(content=static_prefix),
+            ("user", "{payload}")
+        ])
+    else:
+        # Build user payload
+        user_payload = json.dumps({
+            "instructions": instructions,
+            "query": query,
+            "context": context,
+            "example": few_shot
+        }, indent=2)
+        
+        # Create prompt
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", system_text),
+            ("user", "{payload}")
+        ])
     
     # JSON parser
     parser = JsonOutputParser()
@@ -135,85 +183,94 @@ def _build_ownership_chain(prompt_blob: dict, callbacks=None):
     chain = (
         {"payload": RunnablePassthrough()}
         | prompt
-        | _get_lc_model(callbacks=callbacks)
+        | _get_lc_model()
         | parser
     )
     
     return chain, user_payload
 
 
-# ---------- Routes ----------
-@app.post("/query", response_model=OwnershipQueryOut)
-def query_ownership(payload: OwnershipQueryIn, session=Depends(get_session)):
-    """Query ownership for a feature or product area."""
+def _resolve_ownership(session, query: str, context: Optional[str]) -> dict:
+    """Retrieve candidate areas and run the ownership chain; returns the model's JSON. Writes nothing."""
     
-    # Get all ownership data from database
-    ownership_records = []
-    for ownership in session.exec(select(Ownership)).all():
-        area = session.get(ProductArea, ownership.area_id)
-        owner = session.get(Owner, ownership.owner_id)
-        ownership_records.append({
-            "area_name": area.name,
-            "description": area.description,
-            "category": area.category,
-            "owner_name": owner.name,
-            "owner_email": owner.email,
-            "team": owner.team,
-            "role": owner.role
-        })
+    # Ownership catalog: one joined query, then served from the in-memory snapshot until /ingest
+    catalog = catalog_cache.get(session)
+    ownership_records = catalog.records
+    
+    # Retrieval: keep only the top-k candidate areas for this query
+    candidates = ownership_records
+    if settings.retrieval_top_k > 0 and len(ownership_records) > settings.retrieval_top_k:
+        search_text = f"{query} {context or ''}"
+        candidates = catalog.index.search(search_text, settings.retrieval_top_k)
     
     # Build prompt
     prompt_blob = build_ownership_resolution_prompt(
-        query=payload.query,
-        context=payload.context,
-        ownership_data=ownership_records
+        query=query,
+        context=context,
+        ownership_data=candidates,
+        cache_friendly=settings.prompt_cache_layout,
+        candidates_pruned=candidates is not ownership_records
     )
     
-    # Get LangFuse handler
-    langfuse_handler = _get_langfuse_handler()
-    callbacks = [langfuse_handler] if langfuse_handler else []
+    # Per-request callbacks (usage metrics + LangFuse tracing)
+    callbacks = _get_callbacks()
     
     # Build chain
-    chain, user_payload = _build_ownership_chain(prompt_blob, callbacks=callbacks)
+    chain, user_payload = _build_ownership_chain(prompt_blob)
     
-    # Run the chain
+    # Run the chain; an identical query already in flight (same prompt hash) is awaited instead
+    run = lambda: chain.invoke(user_payload, config={"callbacks": callbacks})
+    if single_flight is None:
+        return run()
+    return single_flight.do(flight_key("query", model_label(), prompt_blob), run)
+
+
+# ---------- Routes ----------
+@app.post("/query", response_model=OwnershipQueryOut)
+def query_ownership(payload: OwnershipQueryIn, session=Depends(get_session)):
+    """Query ownership for a feature or product area."""
     try:
-        data = chain.invoke(user_payload, config={"callbacks": callbacks})
+        data = _resolve_ownership(session, payload.query, payload.context)
+    except RateLimited as e:
+        # Throttled upstream: tell the client when to come back instead of a 500
+        raise HTTPException(503, str(e), headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
     except Exception as e:
         raise HTTPException(500, f"Model failed to produce JSON: {e}")
     
-    # Create support ticket
+    # Convert matches to response format
+    matches = [OwnerMatch(**match) for match in data.get("matches", [])]
+    best_match = matches[0] if matches else None
+    
+    # Persist ticket (+ best match) and the exchange as one unit of work
     ticket = SupportTicket(
         query_text=payload.query,
         context=payload.context
     )
+    if best_match is not None:
+        ticket.resolved_owner_id = 1  # TODO: Look up actual owner
+        ticket.confidence_score = best_match.confidence_score
+        ticket.supporting_context = best_match.rationale
     session.add(ticket)
-    session.commit()
-    session.refresh(ticket)
+    session.flush()  # assigns ticket.id without committing
     
-    # Store best match
-    if data.get("matches") and len(data["matches"]) > 0:
-        best_match = data["matches"][0]
-        ticket.resolved_owner_id = 1  # TODO: Look up actual owner
-        ticket.confidence_score = best_match.get("confidence_score", 0.0)
-        ticket.supporting_context = best_match.get("rationale", "")
+    audit = (
+        OwnershipMessage(
+            ticket_id=ticket.id,
+            sender="user",
+            content=payload.query
+        ),
+        OwnershipMessage(
+            ticket_id=ticket.id,
+            sender="assistant",
+            content=json.dumps(data, indent=2)
+        ),
+    )
+    if write_behind is not None:
+        # The audit rows reference the ticket: queue them only once it is committed
         session.commit()
-    
-    # Convert matches to response format
-    matches = [OwnerMatch(**match) for match in data.get("matches", [])]
-    best_match = matches[0] if matches else None
-    
-    # Store messages
-    session.add(OwnershipMessage(
-        ticket_id=ticket.id,
-        sender="user",
-        content=payload.query
-    ))
-    session.add(OwnershipMessage(
-        ticket_id=ticket.id,
-        sender="assistant",
-        content=json.dumps(data, indent=2)
-    ))
+        if write_behind.submit(*audit):
+            audit = ()
+    session.add_all(audit)
     session.commit()
     
     return OwnershipQueryOut(
@@ -228,69 +285,112 @@ def query_ownership(payload: OwnershipQueryIn, session=Depends(get_session)):
 def ingest_data(payload: IngestDataIn, session=Depends(get_session)):
     """Ingest ownership data from external sources."""
     
-    records_ingested = 0
-    
-    for record in payload.data:
-        # Create or get owner
-        owner_stmt = select(Owner).where(Owner.email == record.get("owner_email"))
-        owner = session.exec(owner_stmt).first()
-        
-        if not owner:
-            owner = Owner(
-                name=record.get("owner_name"),
-                email=record.get("owner_email"),
-                team=record.get("team"),
-                role=record.get("role")
-            )
-            session.add(owner)
-            session.commit()
-            session.refresh(owner)
-        
-        # Create or get product area
-        area_stmt = select(ProductArea).where(ProductArea.name == record.get("feature_name"))
-        area = session.exec(area_stmt).first()
-        
-        if not area:
-            area = ProductArea(
-                name=record.get("feature_name"),
-                description=record.get("description"),
-                category=record.get("category")
-            )
-            session.add(area)
-            session.commit()
-            session.refresh(area)
-        
-        # Create ownership mapping
-        ownership_stmt = select(Ownership).where(
-            Ownership.area_id == area.id,
-            Ownership.owner_id == owner.id
+    # Set-based: in-memory dedupe, batched IN lookups, bulk inserts, one commit per chunk
+    try:
+        records_ingested, records_skipped = bulk_ingest(
+            session, payload.data, chunk_size=settings.ingest_chunk_size
         )
-        ownership = session.exec(ownership_stmt).first()
-        
-        if not ownership:
-            ownership = Ownership(
-                area_id=area.id,
-                owner_id=owner.id,
-                confidence=1.0,
-                notes=record.get("notes")
-            )
-            session.add(ownership)
-            records_ingested += 1
-    
-    session.commit()
+    finally:
+        catalog_cache.invalidate()  # chunks already committed are visible even if a later one fails
     
     return IngestDataOut(
         status="success",
-        records_ingested=records_ingested
+        records_ingested=records_ingested,
+        records_skipped=records_skipped
     )
 
 
+def _iter_queue(chunks: queue.Queue) -> Iterator[bytes]:
+    while True:
+        chunk = chunks.get()
+        if chunk is None:
+            return
+        yield chunk
+
+
+async def _put(chunks: queue.Queue, item, worker: asyncio.Future) -> bool:
+    """Hand one body chunk to the worker; waits while the queue is full (back-pressure)."""
+    while not worker.done():
+        try:
+            chunks.put_nowait(item)
+            return True
+        except queue.Full:
+            await asyncio.sleep(0.005)
+    return False
+
+
+def _progress_logger():
+    last = time.monotonic()
+
+    def log(progress: IngestProgress):
+        nonlocal last
+        if time.monotonic() - last >= _PROGRESS_LOG_SECONDS:
+            last = time.monotonic()
+            stats = progress.stats()
+            print(f"ingest/stream: {stats['records_seen']} records, {stats['records_ingested']} ingested, "
+                  f"{stats['records_skipped']} skipped, {stats['records_per_second']} rec/s")
+    return log
+
+
+@app.post("/ingest/stream", response_model=IngestStreamOut)
+async def ingest_stream(request: Request, format: Optional[str] = None):
+    """
+    Ingest a streamed NDJSON, CSV or JSON-array body (format from ?format= or Content-Type).
+    The body is parsed incrementally and applied in batches of INGEST_CHUNK_SIZE,
+    so memory stays flat whatever the upload size.
+    """
+    global _last_ingest
+    fmt = detect_format(format, request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(415, f"Unsupported format; use ?format= one of {', '.join(FORMATS)}")
+    
+    progress = _last_ingest = IngestProgress()
+    chunks: queue.Queue = queue.Queue(maxsize=_STREAM_QUEUE_CHUNKS)
+    
+    def run():
+        # parse + validate + write in a worker thread; this coroutine only pumps the body
+        with Session(engine) as session:
+            return load_records(session, _iter_queue(chunks), fmt, batch_size=settings.ingest_chunk_size,
+                                progress=progress, on_batch=_progress_logger())
+    
+    worker = asyncio.get_running_loop().run_in_executor(None, run)
+    try:
+        async for chunk in request.stream():
+            if chunk and not await _put(chunks, chunk, worker):
+                break  # worker stopped early (malformed stream); its error is raised below
+        await _put(chunks, None, worker)
+        await worker
+    except ValueError as e:
+        raise HTTPException(400, f"Malformed {fmt} body after {progress.records_seen} records: {e}")
+    finally:
+        if not worker.done():
+            await _put(chunks, None, worker)  # client went away: let the worker finish its last batch
+        catalog_cache.invalidate()
+    
+    stats = progress.stats()
+    return IngestStreamOut(status="success", **{k: stats[k] for k in IngestStreamOut.model_fields if k in stats})
+
+
 @app.get("/health")
 def health():
     """Health check endpoint."""
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+def metrics():
+    """Runtime counters (LLM token usage incl. provider-cached prompt tokens)."""
+    return {
+        "llm_usage": usage_tracker.stats(),
+        "catalog": catalog_cache.stats(),
+        "ingest": _last_ingest.stats() if _last_ingest is not None else None,
+        "write_behind": write_behind.stats() if write_behind is not None else None,
+        "single_flight": single_flight.stats() if single_flight is not None else None,
+        "rate_limiter": rate_limiter.stats() if rate_limiter is not None else None,
+        "admission": admission.stats() if admission is not None else None,
+    }
+
+
 # ---- Start the server ----
 if __name__ == "__main__":
     import uvicorn
@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Optional, List
 from enum import Enum
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field, Relationship
 
 
@@ -31,7 +32,7 @@ class Owner(SQLModel, table=True):
     """Product owner (PM or team)."""
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
-    email: str
+    email: str = Field(index=True, unique=True)  # ingest resolves owners by email
     team: Optional[str] = None
     role: Optional[str] = None  # PM, Tech Lead, etc.
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -43,7 +44,7 @@ class Owner(SQLModel, table=True):
 class ProductArea(SQLModel, table=True):
     """Product area or feature."""
     id: Optional[int] = Field(default=None, primary_key=True)
-    name: str
+    name: str = Field(index=True, unique=True)  # ingest resolves areas by name
     description: Optional[str] = None
     category: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -54,6 +55,11 @@ class ProductArea(SQLModel, table=True):
 
 class Ownership(SQLModel, table=True):
     """Mapping between product area and owner."""
+    __table_args__ = (
+        # one mapping per (area, owner); also serves ingest's existing-pair lookups
+        Index("ix_ownership_area_owner", "area_id", "owner_id", unique=True),
+    )
+    
     id: Optional[int] = Field(default=None, primary_key=True)
     area_id: int = Field(foreign_key="productarea.id")
     owner_id: int = Field(foreign_key="owner.id")
@@ -68,6 +74,11 @@ class Ownership(SQLModel, table=True):
 
 class OwnershipMessage(SQLModel, table=True):
     """Messages in ownership resolution session."""
+    __table_args__ = (
+        # messages of one ticket in order
+        Index("ix_ownershipmessage_ticket_created", "ticket_id", "created_at"),
+    )
+    
     id: Optional[int] = Field(default=None, primary_key=True)
     ticket_id: int = Field(foreign_key="supportticket.id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -1,3 +1,5 @@
+import json
+
 SYSTEM_PROMPT = """You are an Ownership Resolution Assistant for Customer Support teams.
 Your job: help identify the correct product owner or responsible team for product features and areas.
 
@@ -54,11 +56,20 @@ FEW_SHOT_EXAMPLE = {
 }
 
 
-def build_ownership_resolution_prompt(query: str, context: str = None, ownership_data: list = None):
-    """Build prompt for ownership resolution."""
+def build_ownership_resolution_prompt(query: str, context: str = None, ownership_data: list = None,
+                                      cache_friendly: bool = False, candidates_pruned: bool = False):
+    """
+    Build prompt for ownership resolution.
+
+    With cache_friendly=True, every static part (instructions, example, ownership
+    catalog) is pre-rendered into `static_prefix` in a fixed order, and the user's
+    context is kept out of the catalog so the prefix stays byte-identical across queries.
+    When `ownership_data` is a per-query candidate list (candidates_pruned=True) the
+    catalog is no longer static, so it moves to `candidates`, after the prefix.
+    """
     
     # Build context from ownership data
-    context_text = "\n\n".join([
+    catalog_text = "\n\n".join([
         f"Product Area: {item.get('area_name', 'N/A')}\n"
         f"Description: {item.get('description', 'N/A')}\n"
         f"Category: {item.get('category', 'N/A')}\n"
@@ -69,6 +80,24 @@ def build_ownership_resolution_prompt(query: str, context: str = None, ownership
         for item in (ownership_data or [])
     ])
     
+    if cache_friendly:
+        static = {
+            "instructions": OWNERSHIP_RESOLUTION_INSTRUCTIONS,
+            "example": FEW_SHOT_EXAMPLE,
+        }
+        if not candidates_pruned:
+            static["ownership_catalog"] = catalog_text
+        return {
+            "system": SYSTEM_PROMPT,
+            "instructions": OWNERSHIP_RESOLUTION_INSTRUCTIONS,
+            "context": context,
+            "few_shot": FEW_SHOT_EXAMPLE,
+            "query": query,
+            "candidates": catalog_text if candidates_pruned else None,
+            "static_prefix": json.dumps(static, indent=2),
+        }
+    
+    context_text = catalog_text
     if context:
         context_text = f"User Context: {context}\n\n{context_text}"
     
@@ -77,6 +106,6 @@ def build_ownership_resolution_prompt(query: str, context: str = None, ownership
         "instructions": OWNERSHIP_RESOLUTION_INSTRUCTIONS,
         "context": context_text,
         "few_shot": FEW_SHOT_EXAMPLE,
-        "query": query
+        "query": query,
+        "static_prefix": None,
     }
-
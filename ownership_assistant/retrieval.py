@@ -0,0 +1,101 @@
+# retrieval.py — Candidate pruning for ownership queries
+# Purpose: pick the top-k most relevant ownership records for a query with a
+# local BM25 index, so the prompt carries a handful of candidate areas instead
+# of the whole org chart.
+#
+# Pure Python, no extra dependencies: an inverted index (term -> {doc: weighted tf})
+# scored with Okapi BM25. Fields are weighted, so a hit on the area name counts
+# for more than a hit buried in the notes.
+
+import heapq
+import math
+import re
+from typing import Dict, List, Optional
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Words that carry no signal in "who owns X?" style questions
+_STOPWORDS = frozenset(
+    "a an and are at be by can do does for from how i in is it me my of on or "
+    "our owns owner own responsible the this to what which who whom with we "
+    "team product feature area".split()
+)
+
+# Record fields that go into the index, with their relative weight
+INDEX_FIELDS = (
+    ("area_name", 3.0),
+    ("category", 1.5),
+    ("description", 1.0),
+    ("team", 1.0),
+    ("notes", 0.75),
+)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    tokens = []
+    for word in _TOKEN_RE.findall(str(text or "").lower()):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]  # crude plural folding: "payments" ~ "payment"
+        tokens.append(word)
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over ownership records. Build once per catalog, query many times."""
+
+    def __init__(self, records: List[dict], k1: float = 1.2, b: float = 0.75):
+        self.records = records
+        self.k1 = k1
+        self.b = b
+        postings: Dict[str, Dict[int, float]] = {}
+        lengths = []
+        for doc_id, record in enumerate(records):
+            length = 0.0
+            for field, weight in INDEX_FIELDS:
+                for term in tokenize(record.get(field)):
+                    docs = postings.setdefault(term, {})
+                    docs[doc_id] = docs.get(doc_id, 0.0) + weight
+                    length += weight
+            lengths.append(length)
+        self._postings = postings
+        self._lengths = lengths
+        self._avg_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+        n = len(records)
+        self._idf = {
+            term: math.log(1.0 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def scores(self, query: str) -> Dict[int, float]:
+        """BM25 score for every record sharing at least one term with the query."""
+        k1, b, avg = self.k1, self.b, self._avg_length or 1.0
+        lengths = self._lengths
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            docs = self._postings.get(term)
+            if not docs:
+                continue
+            idf = self._idf[term]
+            for doc_id, tf in docs.items():
+                norm = k1 * (1.0 - b + b * lengths[doc_id] / avg)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1.0) / (tf + norm)
+        return scores
+
+    def search(self, query: str, k: int) -> List[dict]:
+        """
+        Top-k records for the query, best first.
+        Catalogs no bigger than k are returned whole; if nothing matches at all,
+        the first k records are returned so the model can still answer with low confidence.
+        """
+        if k <= 0 or len(self.records) <= k:
+            return list(self.records)
+        scores = self.scores(query)
+        if not scores:
+            return self.records[:k]
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [self.records[doc_id] for doc_id, _ in top]
@@ -1,18 +1,90 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 
 class Settings(BaseSettings):
-    openai_api_key: str
+    openai_api_key: Optional[str] = None  # required for the OpenAI API; not for LLM_PROVIDER=fake or a stub
     model: str = "gpt-4o-mini"
     
     # LangFuse settings (optional - leave empty to disable tracking)
     langfuse_secret_key: Optional[str] = None
     langfuse_public_key: Optional[str] = None
     langfuse_host: str = "https://cloud.langfuse.com"
+
+    # LLM client (one shared ChatOpenAI + HTTP connection pool per process)
+    llm_provider: str = "openai"            # "openai", or "fake": canned offline answers (shared/fake_llm.py)
+    llm_base_url: Optional[str] = None      # OpenAI-compatible endpoint, e.g. ../stub_llm_server.py's http://127.0.0.1:8010/v1
+    llm_fake_latency_ms: int = 0            # LLM_PROVIDER=fake: fixed delay per call
+    llm_max_connections: int = 100
+    llm_max_keepalive_connections: int = 20
+    llm_keepalive_expiry_seconds: float = 30.0
+    llm_timeout_seconds: float = 60.0
+    llm_connect_timeout_seconds: float = 5.0
+    llm_max_retries: int = 2
+
+    # Outbound LLM rate limiting (shared/ratelimit.py): token buckets, AIMD concurrency, Retry-After-aware retries
+    llm_rate_limit_enabled: bool = True
+    llm_requests_per_minute: int = 0          # provider RPM limit (0 = no bucket)
+    llm_tokens_per_minute: int = 0            # provider TPM limit (0 = no bucket)
+    llm_output_tokens_estimate: int = 1000    # completion tokens reserved per call until real usage is known
+    llm_max_concurrency: int = 32             # AIMD ceiling for model calls in flight
+    llm_min_concurrency: int = 1
+    llm_latency_target_seconds: float = 30.0  # slower calls (time to first chunk for streams) shrink the limit (0 = off)
+    llm_rate_limit_retries: int = 4           # replaces llm_max_retries while the limiter is on
+    llm_retry_base_seconds: float = 0.5       # jittered exponential backoff when there is no Retry-After
+    llm_retry_max_seconds: float = 30.0
+    llm_queue_timeout_seconds: float = 30.0   # longest wait for the limits before answering 503
+
+    # Prompt layout: static parts first (byte-stable) so provider-side prompt caching kicks in
+    prompt_cache_layout: bool = False  # opt-in: changes the prompt text every deployment sends
+
+    # Retrieval: only the top-k BM25 candidate areas go into the /query prompt (0 = send the whole catalog)
+    retrieval_top_k: int = 20
+
+    # Catalog snapshot (catalog.py): per-process, re-validated against the DB so other
+    # workers' ingests and ingest_file.py loads show up without a restart
+    catalog_check_interval_seconds: float = 1.0  # how often a worker re-reads the catalog version (0 = every /query)
+    catalog_ttl_seconds: float = 300.0           # full reload at least this often (covers out-of-band edits)
+
+    # Ingest: records applied per transaction (dedupe + batched lookups + bulk insert)
+    ingest_chunk_size: int = 1000
     
     # Database settings
     database_url: str = "sqlite:///ownership_assistant.db"
+
+    # Engine profile. SQLite pragmas are applied to every new connection
+    db_sqlite_wal: bool = True               # journal_mode=WAL: readers don't block the writer
+    db_sqlite_synchronous: str = "NORMAL"    # fsync on checkpoint, not every commit (safe with WAL)
+    db_sqlite_busy_timeout_ms: int = 5000    # wait for a locked database instead of failing
+    db_sqlite_mmap_size: int = 268_435_456   # 256 MiB memory-mapped reads (0 = off)
+    db_sqlite_cache_size_kib: int = 65_536   # page cache per connection
+    # Connection pool (QueuePool for file SQLite and Postgres)
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout_seconds: float = 30.0
+    db_pool_recycle_seconds: int = 1800      # Postgres: drop connections before server-side idle timeouts
+    db_pool_pre_ping: bool = True            # Postgres: check a pooled connection before handing it out
+
+    # Single-flight: concurrent requests with the same prompt share one in-flight model call
+    single_flight_enabled: bool = True
+
+    # Admission control (shared/admission.py): in-flight caps for model-backed routes, per route and per tenant.
+    # Unlisted routes (/health, /onboard, GETs) are never queued. Full queue / missed deadline = 503
+    admission_enabled: bool = False
+    admission_route_limits: Dict[str, int] = {"/query": 10}  # POST path -> max in flight (JSON in the env); /query holds a DB connection + a thread
+    admission_tenant_limit: int = 8              # per API key, queued + in flight; over = 429
+    admission_tenant_header: str = "X-API-Key"   # unauthenticated: fairness between clients, not a security boundary
+    admission_tenant_ip_fallback: bool = False   # no key -> cap per client IP (only without a proxy in front)
+    admission_max_queue: int = 64                # waiting requests per route
+    admission_queue_timeout_ms: int = 5000       # longest wait for a slot (clients can lower it: X-Request-Timeout-Ms)
+
+    # Write-behind: OwnershipMessage audit rows are queued and written in batches
+    # by a background thread instead of inside the request
+    write_behind_enabled: bool = False
+    write_behind_max_queue: int = 10_000       # row groups held in memory
+    write_behind_batch_size: int = 200         # rows per transaction
+    write_behind_flush_interval_ms: int = 50   # max wait to fill a batch
+    write_behind_overflow: str = "inline"      # queue full: "inline" = write in the request, "drop" = discard + count
     
     class Config:
         env_file = ".env"
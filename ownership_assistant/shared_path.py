@@ -0,0 +1,14 @@
+# shared_path.py — Make the repo-root shared/ package importable
+# Purpose: the ownership assistant runs from its own directory, but the modules it
+# shares with a2d (LLM client, rate limiter, admission control, single-flight,
+# write-behind) live in ../shared. Import this before any `shared.` import.
+#
+# The repo root is appended, not prepended: this app's own flat modules
+# (settings, db, models, main, ...) must win over a2d's files of the same name.
+
+import sys
+from pathlib import Path
+
+REPO_ROOT = str(Path(__file__).resolve().parent.parent)
+if REPO_ROOT not in sys.path:
+    sys.path.append(REPO_ROOT)
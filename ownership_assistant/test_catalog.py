@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-memory ownership catalog (catalog.py): snapshots are served
+between version checks, a moved (max id, count) version or an expired TTL
+invalidates the snapshot and bumps the generation, and a load that started before
+an invalidation never installs its result.
+
+Usage:
+    python -m pytest -q test_catalog.py
+"""
+
+import pytest
+from sqlmodel import Session, SQLModel, select
+
+import catalog
+from catalog import CatalogCache, catalog_version
+from db import engine, init_db
+from ingest import ingest_chunk
+from models import Ownership
+
+
+def record(feature: str, email: str = "ana@example.com") -> dict:
+    return {"feature_name": feature, "owner_name": email.split("@")[0].title(), "owner_email": email}
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def session():
+    SQLModel.metadata.drop_all(engine)
+    init_db()
+    with Session(engine) as s:
+        ingest_chunk(s, [record("Billing"), record("Search", "ben@example.com")])
+        yield s
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(catalog.time, "monotonic", clock)
+    return clock
+
+
+def names(snapshot) -> list:
+    return [r.area_name for r in snapshot.records]
+
+
+def test_version_moves_on_insert_and_delete(session):
+    before = catalog_version(session)
+    ingest_chunk(session, [record("Checkout")])
+    after_insert = catalog_version(session)
+    session.delete(session.exec(select(Ownership).order_by(Ownership.id)).first())
+    session.commit()
+    assert len({before, after_insert, catalog_version(session)}) == 3
+
+
+def test_served_from_memory_between_checks(session, clock):
+    cache = CatalogCache(ttl_s=300, check_interval_s=1)
+    first = cache.get(session)
+    ingest_chunk(session, [record("Checkout")])
+    clock.now += 0.5
+    assert cache.get(session) is first  # not re-checked yet
+    stats = cache.stats()
+    assert (stats["loads"], stats["hits"], stats["generation"]) == (1, 1, 0)
+
+
+def test_unchanged_version_keeps_the_snapshot(session, clock):
+    cache = CatalogCache(ttl_s=300, check_interval_s=1)
+    first = cache.get(session)
+    clock.now += 2
+    assert cache.get(session) is first
+    assert first.checked_at == clock.now
+    assert (cache.stats()["loads"], cache.stats()["stale_reloads"]) == (1, 0)
+
+
+@pytest.mark.parametrize("change", ["insert", "delete"])
+def test_moved_version_invalidates_and_bumps_generation(session, clock, change):
+    cache = CatalogCache(ttl_s=300, check_interval_s=1)
+    first = cache.get(session)
+    if change == "insert":
+        ingest_chunk(session, [record("Checkout")])
+    else:
+        session.delete(session.exec(select(Ownership).order_by(Ownership.id)).first())
+        session.commit()
+    clock.now += 2
+    second = cache.get(session)
+    assert second is not first and second.version == catalog_version(session) != first.version
+    assert names(second) == (["Billing", "Search", "Checkout"] if change == "insert" else ["Search"])
+    stats = cache.stats()
+    assert (stats["loads"], stats["stale_reloads"], stats["generation"]) == (2, 1, 1)
+    assert cache.get(session) is second
+
+
+def test_ttl_expiry_reloads(session, clock):
+    cache = CatalogCache(ttl_s=10, check_interval_s=100)
+    first = cache.get(session)
+    clock.now += 11
+    assert cache.get(session) is not first
+    assert (cache.stats()["stale_reloads"], cache.stats()["generation"]) == (1, 1)
+
+
+def test_invalidate_drops_the_snapshot(session):
+    cache = CatalogCache()
+    first = cache.get(session)
+    cache.invalidate()
+    assert cache.stats()["records"] is None and cache.stats()["generation"] == 1
+    assert cache.get(session) is not first
+
+
+def test_load_that_started_before_an_invalidation_is_not_installed(session, monkeypatch):
+    cache = CatalogCache()
+    real_load = catalog.load_ownership_records
+
+    def load_racing_an_ingest(s):
+        records = real_load(s)
+        cache.invalidate()  # e.g. /ingest finished while this load was running
+        return records
+
+    monkeypatch.setattr(catalog, "load_ownership_records", load_racing_an_ingest)
+    assert names(cache.get(session)) == ["Billing", "Search"]  # still answers this request
+    assert cache.stats()["records"] is None
+
+
+def test_older_load_not_installed_after_a_newer_version_was_seen(session, clock, monkeypatch):
+    """
+    Request X starts loading the old catalog. Meanwhile request Z installs the same
+    old catalog, an ingest lands, and request Y finds Z's snapshot stale and installs
+    the new one. X finishing last must not put the old catalog back.
+    """
+    cache = CatalogCache(ttl_s=300, check_interval_s=1)
+    real_load = catalog.load_ownership_records
+    calls = []
+
+    def load(s):
+        calls.append(1)
+        records = real_load(s)
+        if len(calls) == 1:  # X, mid-load
+            cache.get(s)     # Z
+            ingest_chunk(s, [record("Checkout")])
+            clock.now += 2
+            cache.get(s)     # Y
+        return records
+
+    monkeypatch.setattr(catalog, "load_ownership_records", load)
+    old = cache.get(session)
+    assert names(old) == ["Billing", "Search"]
+    assert cache.stats()["version"] == list(catalog_version(session)) != list(old.version)
+    assert cache.stats()["records"] == 3
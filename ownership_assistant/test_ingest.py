@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Tests for set-based ownership ingest (ingest.py): repeat ingests skip what is
+already mapped, the first occurrence of an owner or area inside a chunk wins, and
+rows a concurrent ingest inserted first are skipped by ON CONFLICT DO NOTHING
+instead of failing the chunk. The streaming parsers rebuild rows split across
+body chunks, map CSV columns by header, and a malformed JSON array is a 400.
+
+Usage:
+    python -m pytest -q test_ingest.py
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from sqlmodel import Session, SQLModel, func, select
+
+import ingest
+import main
+from db import engine, init_db
+from ingest import bulk_ingest, ingest_chunk
+from models import Owner, Ownership, ProductArea
+
+
+def record(feature: str, email: str, **extra) -> dict:
+    return {"feature_name": feature, "owner_name": email.split("@")[0].title(), "owner_email": email, **extra}
+
+
+RECORDS = [
+    record("Billing", "ana@example.com", team="Payments", description="Invoices and refunds"),
+    record("Search", "ben@example.com", team="Discovery"),
+    record("Checkout", "ana@example.com", team="Payments"),
+]
+
+
+@pytest.fixture
+def session():
+    SQLModel.metadata.drop_all(engine)
+    init_db()
+    with Session(engine) as s:
+        yield s
+
+
+def count(session: Session, model) -> int:
+    return session.exec(select(func.count()).select_from(model)).one()
+
+
+# ---------- Chunk semantics ----------
+def test_ingest_maps_every_pair(session):
+    assert ingest_chunk(session, RECORDS) == (3, 0)
+    assert (count(session, Owner), count(session, ProductArea), count(session, Ownership)) == (2, 3, 3)
+
+
+def test_invalid_records_skipped(session):
+    bad = [{"feature_name": "Billing", "owner_email": "ana@example.com"}, {"owner_name": "Ana"}]
+    assert ingest_chunk(session, RECORDS[:1] + bad) == (1, 2)
+
+
+def test_repeat_ingest_skips_existing_rows(session):
+    bulk_ingest(session, RECORDS)
+    assert bulk_ingest(session, RECORDS, chunk_size=2) == (0, 0)
+    assert (count(session, Owner), count(session, ProductArea), count(session, Ownership)) == (2, 3, 3)
+
+
+def test_existing_rows_are_not_overwritten(session):
+    bulk_ingest(session, RECORDS[:1])
+    assert ingest_chunk(session, [record("Billing", "ana@example.com", team="Platform", description="New")]) == (0, 0)
+    assert session.exec(select(Owner.team)).one() == "Payments"
+    assert session.exec(select(ProductArea.description)).one() == "Invoices and refunds"
+
+
+def test_first_occurrence_wins_inside_a_chunk(session):
+    chunk = [
+        record("Billing", "ana@example.com", team="Payments", description="first"),
+        record("Billing", "ana@example.com", team="Platform", description="second", notes="dup"),
+        dict(record("Reports", "ana@example.com", team="Growth"), owner_name="Someone Else"),
+    ]
+    assert ingest_chunk(session, chunk) == (2, 0)
+    owner = session.exec(select(Owner)).one()
+    assert (owner.name, owner.team) == ("Ana", "Payments")
+    assert session.exec(select(ProductArea.description).where(ProductArea.name == "Billing")).one() == "first"
+    assert session.exec(select(Ownership.notes)).all() == [None, None]
+
+
+# ---------- Concurrent ingests (ON CONFLICT DO NOTHING) ----------
+def test_rows_inserted_concurrently_are_skipped_not_failed(session, monkeypatch):
+    """Another ingest inserted the same owners, areas and pairs between our lookups and our inserts."""
+    bulk_ingest(session, RECORDS)
+    monkeypatch.setattr(ingest, "_existing_pairs", lambda session, pairs: set())
+    real_lookup, calls = ingest._lookup_ids, []
+
+    def stale_first_lookup(session, key_column, id_column, keys):
+        calls.append(key_column)
+        return {} if calls.count(key_column) == 1 else real_lookup(session, key_column, id_column, keys)
+
+    monkeypatch.setattr(ingest, "_lookup_ids", stale_first_lookup)
+    assert ingest_chunk(session, RECORDS + [record("Search", "cy@example.com")]) == (1, 0)
+    assert (count(session, Owner), count(session, ProductArea), count(session, Ownership)) == (3, 3, 4)
+
+
+# ---------- Streaming parsers ----------
+def chunked(data: bytes, size: int) -> list:
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def parse(fmt: str, data: bytes, size: int) -> list:
+    return list(ingest.PARSERS[fmt](chunked(data, size), ingest.IngestProgress()))
+
+
+ROWS = [{"feature_name": "Billing", "owner_name": "Ana Núñez", "owner_email": "ana@example.com",
+         "notes": "multi-byte: é ü 📅, quoted \"text\", and a \\u escape: é"},
+        {"feature_name": "Search", "owner_name": "Ben", "owner_email": "ben@example.com", "confidence": 1e-3}]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 1 << 16])
+def test_json_array_rows_split_across_chunks(size):
+    data = json.dumps(ROWS, ensure_ascii=False, indent=1).encode("utf-8")
+    assert parse("json", data, size) == ROWS
+
+
+@pytest.mark.parametrize("size", [1, 5, 1 << 16])
+def test_ndjson_rows_split_across_chunks(size):
+    data = "\n".join(json.dumps(row, ensure_ascii=False) for row in ROWS).encode("utf-8")
+    assert parse("ndjson", data, size) == ROWS
+
+
+@pytest.mark.parametrize("size", [1, 4, 1 << 16])
+def test_csv_header_mapping(size):
+    """Columns map by header (any order, extra columns kept, empty cells -> None), with quoted newlines."""
+    data = ('﻿owner_email,feature_name,owner_name,team,extra\r\n'
+            'ana@example.com,Billing,"Núñez, Ana",,x\r\n'
+            'ben@example.com,"Search\nand Discovery",Ben,Growth,\r\n').encode("utf-8")
+    assert parse("csv", data, size) == [
+        {"owner_email": "ana@example.com", "feature_name": "Billing", "owner_name": "Núñez, Ana",
+         "team": None, "extra": "x"},
+        {"owner_email": "ben@example.com", "feature_name": "Search\nand Discovery", "owner_name": "Ben",
+         "team": "Growth", "extra": None},
+    ]
+
+
+@pytest.mark.parametrize("body", [b'[{"feature_name": tru}]', b'[{"feature_name": "Billing"]',
+                                  b'[{"feature_name": "Billing"}', b'{"feature_name": "Billing"}'])
+def test_malformed_json_array_raises(body):
+    with pytest.raises(ValueError):
+        parse("json", body, 4)
+
+
+def test_malformed_stream_answers_400(session, monkeypatch):
+    monkeypatch.setattr(main.settings, "ingest_chunk_size", 2)
+    body = json.dumps(RECORDS[:2])[:-1].encode("utf-8") + b', {"feature_name": oops}]'
+
+    async def stream():
+        for chunk in chunked(body, 16):
+            yield chunk
+
+    async def go():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/ingest/stream?format=json", content=stream())
+
+    response = asyncio.run(go())
+    assert response.status_code == 400
+    assert "Malformed json body after 2 records" in response.json()["detail"]
+    assert count(session, Ownership) == 2  # batches applied before the bad element are kept
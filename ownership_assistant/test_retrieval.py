@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for candidate pruning (retrieval.py): tokenizing, BM25 ranking with field
+weights, and what search() returns for empty queries, queries that match nothing,
+and catalogs no bigger than k.
+
+Usage:
+    python -m pytest -q test_retrieval.py
+"""
+
+import pytest
+
+from retrieval import BM25Index, tokenize
+
+
+def area(name: str, **fields) -> dict:
+    return {"area_name": name, "category": None, "description": None, "team": None, "notes": None, **fields}
+
+
+CATALOG = [
+    area("Billing", category="Payments", description="Invoices, refunds and tax"),
+    area("Checkout", category="Payments", description="Cart and payment flow"),
+    area("Search", category="Discovery", description="Query ranking and autocomplete"),
+    area("Notifications", category="Platform", description="Email and push delivery"),
+    area("Reporting", category="Analytics", description="Dashboards", notes="also owns the billing exports"),
+    area("Onboarding", category="Growth", description="Signup and first-run tour"),
+]
+
+
+def names(records) -> list:
+    return [r["area_name"] for r in records]
+
+
+def test_tokenize_drops_stopwords_and_folds_plurals():
+    assert tokenize("Who owns the Payments feature?") == ["payment"]
+    assert tokenize("class access bus") == ["class", "access", "bus"]
+    assert tokenize(None) == []
+
+
+# ---------- Ranking ----------
+def test_name_hit_outranks_a_hit_in_the_notes():
+    assert names(BM25Index(CATALOG).search("who owns billing?", k=2)) == ["Billing", "Reporting"]
+
+
+def test_rarer_term_decides_between_category_matches():
+    index = BM25Index(CATALOG)
+    assert names(index.search("payment refunds", k=3))[0] == "Billing"
+    assert names(index.search("payment cart", k=3))[0] == "Checkout"
+
+
+def test_only_matching_records_returned_when_fewer_than_k_match():
+    assert names(BM25Index(CATALOG).search("autocomplete", k=3)) == ["Search"]
+
+
+def test_scores_only_cover_records_sharing_a_term():
+    scores = BM25Index(CATALOG).scores("email delivery")
+    assert list(scores) == [3] and scores[3] > 0
+
+
+# ---------- Fallbacks ----------
+@pytest.mark.parametrize("query", ["", "   ", "who owns this?"])
+def test_empty_query_falls_back_to_the_first_k(query):
+    assert BM25Index(CATALOG).search(query, k=3) == CATALOG[:3]
+
+
+def test_query_matching_nothing_falls_back_to_the_first_k():
+    assert BM25Index(CATALOG).search("kubernetes", k=2) == CATALOG[:2]
+
+
+@pytest.mark.parametrize("k", [0, -1, len(CATALOG), 50])
+def test_small_catalog_or_no_k_returns_everything(k):
+    assert BM25Index(CATALOG).search("billing", k=k) == CATALOG
+
+
+def test_empty_catalog():
+    index = BM25Index([])
+    assert len(index) == 0 and index.search("billing", k=5) == []
@@ -1,3 +1,6 @@
+import json
+from functools import lru_cache
+
 SYSTEM_PROMPT = """You are Anti-To-Do, a pragmatic operations and productivity strategist for knowledge workers.
 Your job: identify low-leverage tasks the user should STOP doing manually to reclaim time so they can focus on high-leverage tasks.
 
@@ -317,7 +320,24 @@ FEW_SHOT_EXAMPLE_PM = {
   ]
 }
 
-def build_recommendations_prompt(role_raw, industry_raw, pains_raw, role_normalized=None, onet_code=None):
+# Serialized once at import time; the few-shot block never changes between requests
+FEW_SHOT_EXAMPLE_PM_JSON = json.dumps(FEW_SHOT_EXAMPLE_PM, ensure_ascii=False)
+
+@lru_cache(maxsize=32)
+def _json_string(text: str) -> str:
+    # Static strings hash once (Python caches str hashes), so repeat calls are O(1)
+    return json.dumps(text, ensure_ascii=False)
+
+# Cache-friendly layout: every static part in one byte-stable block, sent before any
+# per-user content so the provider can reuse the prompt prefix across requests.
+RECOMMENDATIONS_STATIC_PREFIX = (
+    '{"instructions": ' + _json_string(RECOMMENDATIONS_INSTRUCTIONS)
+    + ', "few_shot": ' + FEW_SHOT_EXAMPLE_PM_JSON
+    + "}"
+)
+
+def build_recommendations_prompt(role_raw, industry_raw, pains_raw, role_normalized=None, onet_code=None,
+                                 cache_friendly=False):
     # Build a compact, deterministic content block
     header = {
         "role_input": role_raw,
@@ -329,6 +349,24 @@ def build_recommendations_prompt(role_raw, industry_raw, pains_raw, role_normali
     return {
         "system": SYSTEM_PROMPT,
         "instructions": RECOMMENDATIONS_INSTRUCTIONS,
-        "few_shot": FEW_SHOT_EXAMPLE_PM,
-        "context": header
-    }
\ No newline at end of file
+        "few_shot": FEW_SHOT_EXAMPLE_PM_JSON,  # already JSON text
+        "context": header,
+        # Static block sent ahead of the context (None = legacy single-payload layout)
+        "static_prefix": RECOMMENDATIONS_STATIC_PREFIX if cache_friendly else None,
+    }
+
+def render_recommendations_payload(prompt_blob: dict) -> str:
+    """
+    The per-request user message for the recommendations chain, as one JSON object.
+    Only the per-user `context` is serialized per call; in the legacy layout the
+    static parts are spliced in around it, in the cache-friendly layout they were
+    already sent in `static_prefix`.
+    """
+    if prompt_blob.get("static_prefix"):
+        return '{"context": ' + json.dumps(prompt_blob["context"], ensure_ascii=False) + "}"
+    return (
+        '{"instructions": ' + _json_string(prompt_blob["instructions"])
+        + ', "context": ' + json.dumps(prompt_blob["context"], ensure_ascii=False)
+        + ', "few_shot": ' + prompt_blob["few_shot"]
+        + "}"
+    )
\ No newline at end of file
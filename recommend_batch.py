@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Pre-generate recommendations for many threads (e.g. a cohort onboarded today).
+
+Runs the same wave-by-wave pipeline as POST /recommendations/batch: threads are
+de-duplicated by profile hash, cache hits are reused, misses fan out through the
+chain's abatch() with bounded concurrency, and each wave is saved in one
+transaction. Failed threads are listed at the end; re-run with just those.
+
+Usage:
+    python recommend_batch.py 1 2 3
+    python recommend_batch.py --file thread_ids.txt --concurrency 16
+    python recommend_batch.py --missing                  # every thread without a recommendation batch
+    python recommend_batch.py --file ids.txt --url http://localhost:8000   # through a running server
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from settings import settings
+
+
+def read_ids(path: str):
+    with open(path) as f:
+        return [int(line) for line in (line.strip() for line in f) if line and not line.startswith("#")]
+
+
+def missing_ids():
+    """Threads that have no RecommendationBatch yet."""
+    from sqlmodel import Session, select
+    from db import engine, init_db
+    from models import RecommendationBatch, SessionThread
+
+    init_db()
+    with Session(engine) as session:
+        has_batch = select(RecommendationBatch.thread_id)
+        return list(session.exec(select(SessionThread.id).where(SessionThread.id.not_in(has_batch))
+                                 .order_by(SessionThread.id)).all())
+
+
+def print_progress(done: int, total: int, started: float):
+    rate = done / max(time.monotonic() - started, 1e-9) * 3600
+    print(f"... {done:>8,}/{total:,} threads  {rate:>10,.0f} threads/h", file=sys.stderr, flush=True)
+
+
+async def run_in_process(thread_ids, bypass_cache: bool, concurrency: int) -> dict:
+    import main
+    from db import init_db, new_async_session
+
+    init_db()
+    main.init_models()
+    started = time.monotonic()
+    try:
+        async with new_async_session() as session:
+            out = await main._recommend_threads(session, thread_ids, bypass_cache, concurrency,
+                                                on_wave=lambda done, total: print_progress(done, total, started))
+    finally:
+        if main.write_behind is not None:
+            main.write_behind.close()
+        await main.close_models()
+    return out.model_dump()
+
+
+def run_remote(url: str, thread_ids, bypass_cache: bool, concurrency: int, chunk_size: int) -> dict:
+    """POST the ids in chunks, so no single request runs long enough to hit an HTTP timeout."""
+    import requests
+
+    started = time.monotonic()
+    merged = {"results": {}, "threads": 0, "succeeded": 0, "failed": 0, "profiles": 0, "model_calls": 0,
+              "elapsed_ms": 0.0}
+    for start in range(0, len(thread_ids), chunk_size):
+        response = requests.post(f"{url.rstrip('/')}/recommendations/batch", json={
+            "thread_ids": thread_ids[start:start + chunk_size],
+            "bypass_cache": bypass_cache,
+            "max_concurrency": concurrency,
+        })
+        response.raise_for_status()
+        out = response.json()
+        merged["results"].update(out.pop("results"))
+        for field, value in out.items():
+            merged[field] += value
+        print_progress(len(merged["results"]), len(thread_ids), started)
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("thread_ids", nargs="*", type=int)
+    parser.add_argument("--file", help="one thread id per line")
+    parser.add_argument("--missing", action="store_true", help="all threads without a recommendation batch")
+    parser.add_argument("--concurrency", type=int, default=settings.recs_batch_max_concurrency)
+    parser.add_argument("--bypass-cache", action="store_true")
+    parser.add_argument("--url", help="call POST /recommendations/batch on a running server")
+    parser.add_argument("--chunk-size", type=int, default=500, help="thread ids per request with --url")
+    args = parser.parse_args()
+
+    thread_ids = list(args.thread_ids)
+    if args.file:
+        thread_ids += read_ids(args.file)
+    if args.missing:
+        thread_ids += missing_ids()
+    if not thread_ids:
+        parser.error("no thread ids: pass them as arguments, --file or --missing")
+
+    if args.url:
+        out = run_remote(args.url, thread_ids, args.bypass_cache, args.concurrency, args.chunk_size)
+    else:
+        out = asyncio.run(run_in_process(thread_ids, args.bypass_cache, args.concurrency))
+
+    failed = {thread_id: r["error"] for thread_id, r in out["results"].items() if not r["ok"]}
+    print(f"done {out['threads']:,} threads: {out['succeeded']:,} ok, {out['failed']:,} failed, "
+          f"{out['profiles']:,} distinct profiles, {out['model_calls']:,} model calls, "
+          f"{out['elapsed_ms'] / 1000:.1f} s")
+    if failed:
+        print(json.dumps(failed, indent=2), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
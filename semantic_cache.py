@@ -0,0 +1,369 @@
+# semantic_cache.py — Near-duplicate recommendation cache
+# Purpose: reuse a cached recommendation set when a new onboarding profile is
+# "close enough" (cosine similarity) to one we already generated for, e.g.
+# "PM / SaaS / too many meetings" vs "product manager / saas / meetings overload".
+# Entries are partitioned by model and prompt digest, like the exact cache's keys.
+#
+# Everything is local and offline: profiles are vectorized with a hashed
+# word + character n-gram encoder in NumPy, and searched either brute-force
+# (small caches) or through an IVF index (k-means coarse quantizer) once the
+# cache grows past `ivf_min_size`. The encoder is lexical: a rephrasing only
+# scores close when its wording differs by case, punctuation, filler words,
+# plurals, or the phrases folded together in _CONCEPTS below. Anything else
+# ("calendar chaos" for "too many meetings") is a miss and gets generated.
+
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from settings import settings
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    np = None
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Filler words that carry no signal in short onboarding answers
+_STOPWORDS = frozenset(
+    "a an and are at be by for from i in is it my of on or our the to too "
+    "very with we much many lot lots".split()
+)
+
+# Phrases that say the same thing in onboarding answers, folded into one feature
+# before tokenizing: "meetings overload" and "too many meetings" both become
+# {excess, meeting}, while plain "meetings" stays {meeting}.
+_CONCEPTS = (
+    ("excess", r"(?:way |far )?too (?:many|much)|so many|lots of|a lot of|tons of|endless|"
+               r"constant(?:ly)?|never[- ]ending|non[- ]?stop|excessive|overload(?:ed|s)?|"
+               r"overwhelm(?:ed|ing)?|flood(?:ed)?(?: (?:of|with))?|drowning in"),
+    ("meeting", r"meetings?|syncs?|stand[- ]?ups?"),
+    ("email", r"e-?mails?|inbox(?:es)?"),
+    ("chat", r"slack|pings?|notifications?"),
+)
+_CONCEPT_RE = re.compile(
+    "|".join(rf"(?P<{name}>\b(?:{pattern})\b)" for name, pattern in _CONCEPTS)
+)
+
+# Profile fields that make up the vector, with their relative weight
+PROFILE_FIELDS = (
+    ("role_normalized", 1.0),
+    ("industry_input", 1.0),
+    ("pains_input", 1.5),
+)
+
+
+class HashedNgramEncoder:
+    """
+    Hashed bag of words + character n-grams, sublinear TF, L2-normalized per field.
+    Field names are mixed into the hash, so "sales" as an industry never matches
+    "sales" as a pain point.
+    """
+
+    def __init__(self, dim: int = 256, ngram: int = 3, char_weight: float = 0.5):
+        self.dim = dim
+        self.ngram = ngram
+        self.char_weight = char_weight
+
+    def _features(self, text: str):
+        text = str(text or "").lower()
+        for match in _CONCEPT_RE.finditer(text):
+            yield "=" + match.lastgroup, 1.0
+        for word in _TOKEN_RE.findall(_CONCEPT_RE.sub(" ", text)):
+            if word in _STOPWORDS:
+                continue
+            if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+                word = word[:-1]  # crude plural folding: "meetings" ~ "meeting"
+            yield word, 1.0
+            padded = f"#{word}#"
+            for i in range(max(len(padded) - self.ngram + 1, 1)):
+                yield "~" + padded[i:i + self.ngram], self.char_weight
+
+    def encode_field(self, field: str, text: str) -> "np.ndarray":
+        counts = {}
+        for feat, weight in self._features(text):
+            h = zlib.crc32(f"{field}:{feat}".encode("utf-8"))
+            idx = h % self.dim
+            sign = 1.0 if (h >> 31) & 1 else -1.0
+            counts[idx] = counts.get(idx, 0.0) + sign * weight
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for idx, tf in counts.items():
+            # sublinear TF keeps a repeated word from dominating the field
+            vec[idx] = np.sign(tf) * (1.0 + np.log(abs(tf))) if abs(tf) >= 1.0 else tf
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def encode(self, profile: dict) -> "np.ndarray":
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for field, weight in PROFILE_FIELDS:
+            vec += weight * self.encode_field(field, profile.get(field, ""))
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+
+class _Cell:
+    """One IVF cell: member slots plus a contiguous copy of their vectors."""
+    __slots__ = ("ids", "mat", "count")
+
+    def __init__(self, ids: "np.ndarray", mat: "np.ndarray"):
+        self.ids = ids
+        self.mat = mat
+        self.count = len(ids)
+
+    def append(self, slot: int, vec: "np.ndarray") -> int:
+        if self.count == len(self.ids):
+            cap = max(2 * self.count, 16)
+            self.ids = np.resize(self.ids, cap)
+            mat = np.zeros((cap, self.mat.shape[1]), dtype=np.float32)
+            mat[: self.count] = self.mat[: self.count]
+            self.mat = mat
+        pos = self.count
+        self.ids[pos] = slot
+        self.mat[pos] = vec
+        self.count += 1
+        return pos
+
+    def swap_remove(self, pos: int) -> int:
+        """Remove the member at `pos`; returns the slot moved into `pos` (or -1)."""
+        last = self.count - 1
+        moved = -1
+        if pos != last:
+            self.ids[pos] = self.ids[last]
+            self.mat[pos] = self.mat[last]
+            moved = int(self.ids[pos])
+        self.count = last
+        return moved
+
+
+class VectorIndex:
+    """
+    Fixed-capacity cosine index over unit vectors (FIFO overwrite when full).
+    Brute-force below `ivf_min_size`; above it, an IVF index probes the
+    `nprobe` nearest k-means cells and scores only their members. Each cell keeps
+    its vectors contiguous, so a probe is a handful of small mat-vec products.
+    """
+
+    def __init__(self, dim: int, capacity: int, ivf_min_size: int = 4096, nprobe: int = 8,
+                 train_sample: int = 20_000):
+        self.dim = dim
+        self.capacity = capacity
+        self.ivf_min_size = ivf_min_size
+        self.nprobe = nprobe
+        self.train_sample = train_sample
+        self.vectors = np.zeros((min(capacity, 1024), dim), dtype=np.float32)
+        self.size = 0
+        self._next = 0  # next slot to write (wraps around when full)
+        # IVF state
+        self.centroids: Optional["np.ndarray"] = None
+        self._cells: List[_Cell] = []
+        self._cell_of: Optional["np.ndarray"] = None  # slot -> cell
+        self._pos: Optional["np.ndarray"] = None      # slot -> position inside its cell
+        self._trained_at = 0
+
+    def _grow(self, needed: int) -> None:
+        if needed <= len(self.vectors):
+            return
+        new_cap = min(max(needed, len(self.vectors) * 2), self.capacity)
+        grown = np.zeros((new_cap, self.dim), dtype=np.float32)
+        grown[: self.size] = self.vectors[: self.size]
+        self.vectors = grown
+        if self._cell_of is not None:
+            self._cell_of = np.resize(self._cell_of, new_cap)
+            self._pos = np.resize(self._pos, new_cap)
+
+    def add(self, vec: "np.ndarray") -> Tuple[int, bool]:
+        """Store a vector; returns (slot, evicted_previous_occupant)."""
+        slot = self._next
+        evicted = self.size >= self.capacity
+        if not evicted:
+            self._grow(slot + 1)
+            self.size += 1
+        elif self.centroids is not None:
+            self._remove_from_cell(slot)
+        self.vectors[slot] = vec
+        self._next = (slot + 1) % self.capacity
+
+        if self.centroids is not None:
+            cell = int(np.argmax(self.centroids @ vec))
+            self._cell_of[slot] = cell
+            self._pos[slot] = self._cells[cell].append(slot, vec)
+        if self.size >= self.ivf_min_size and self.size >= 2 * self._trained_at:
+            self.train()
+        return slot, evicted
+
+    def _remove_from_cell(self, slot: int) -> None:
+        moved = self._cells[self._cell_of[slot]].swap_remove(int(self._pos[slot]))
+        if moved >= 0:
+            self._pos[moved] = self._pos[slot]
+
+    def train(self, iterations: int = 6, seed: int = 0) -> None:
+        """(Re)build the IVF cells with spherical k-means over (a sample of) the stored vectors."""
+        data = self.vectors[: self.size]
+        n_cells = max(int(2 * np.sqrt(self.size)), 1)
+        rng = np.random.default_rng(seed)
+        sample = data
+        if self.size > self.train_sample:
+            sample = data[rng.choice(self.size, self.train_sample, replace=False)]
+        centroids = sample[rng.choice(len(sample), n_cells, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(assign, kind="stable")
+            starts = np.searchsorted(assign[order], np.arange(n_cells))
+            counts = np.bincount(assign, minlength=n_cells)
+            nonempty = counts > 0
+            sums = np.add.reduceat(sample[order], starts[nonempty], axis=0)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids[nonempty] = sums / norms
+
+        assign = np.argmax(data @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(n_cells + 1))
+        self.centroids = centroids
+        self._cells = []
+        self._cell_of = np.zeros(len(self.vectors), dtype=np.int64)
+        self._pos = np.zeros(len(self.vectors), dtype=np.int64)
+        for c in range(n_cells):
+            ids = order[bounds[c]:bounds[c + 1]]
+            self._cells.append(_Cell(ids.copy(), data[ids]))
+            self._cell_of[ids] = c
+            self._pos[ids] = np.arange(len(ids))
+        self._trained_at = self.size
+
+    def search_brute(self, vec: "np.ndarray") -> Tuple[int, float]:
+        if self.size == 0:
+            return -1, -1.0
+        scores = self.vectors[: self.size] @ vec
+        best = int(np.argmax(scores))
+        return best, float(scores[best])
+
+    def search(self, vec: "np.ndarray") -> Tuple[int, float]:
+        """Best (slot, cosine) for a unit query vector; (-1, -1.0) when empty."""
+        if self.centroids is None:
+            return self.search_brute(vec)
+        cell_scores = self.centroids @ vec
+        nprobe = min(self.nprobe, len(cell_scores))
+        best_slot, best_score = -1, -1.0
+        for c in np.argpartition(-cell_scores, nprobe - 1)[:nprobe]:
+            cell = self._cells[c]
+            if cell.count == 0:
+                continue
+            scores = cell.mat[: cell.count] @ vec
+            i = int(np.argmax(scores))
+            if scores[i] > best_score:
+                best_slot, best_score = int(cell.ids[i]), float(scores[i])
+        return best_slot, best_score
+
+
+class SemanticCache:
+    """
+    Near-duplicate cache for recommendation results, partitioned by model name and
+    prompt digest. The default threshold is strict on purpose: an added pain point
+    ("too many meetings and on-call" vs "too many meetings") scores ~0.83 and must
+    not be served the other profile's recommendations.
+
+    `max_entries` bounds the whole cache, not each partition: once the total goes
+    over it, the least recently used partitions (typically an old model or prompt
+    revision that no request reads any more) are dropped whole.
+    """
+
+    def __init__(self, threshold: float = 0.92, dim: int = 256, max_entries: int = 100_000,
+                 ttl_seconds: float = 86400, ivf_min_size: int = 4096, nprobe: int = 8):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.ivf_min_size = ivf_min_size
+        self.nprobe = nprobe
+        self.encoder = HashedNgramEncoder(dim=dim)
+        # (model, prompt digest) -> (VectorIndex, values, expires_at), least recently used first
+        self._indexes: "OrderedDict[Tuple[str, str], tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.partitions_evicted = 0
+        self.last_hit_score: Optional[float] = None
+
+    def _partition(self, model: str, prompt: str):
+        part = self._indexes.get((model, prompt))
+        if part is None:
+            index = VectorIndex(self.encoder.dim, self.max_entries,
+                                ivf_min_size=self.ivf_min_size, nprobe=self.nprobe)
+            part = (index, [], [])
+            self._indexes[(model, prompt)] = part
+        self._indexes.move_to_end((model, prompt))
+        return part
+
+    def _evict_stale_partitions(self) -> None:
+        """Drop least recently used partitions until the total fits in max_entries."""
+        total = sum(index.size for index, _, _ in self._indexes.values())
+        while total > self.max_entries and len(self._indexes) > 1:
+            _, (index, _, _) = self._indexes.popitem(last=False)
+            total -= index.size
+            self.evictions += index.size
+            self.partitions_evicted += 1
+
+    def get(self, profile: dict, model: str, prompt: str = "") -> Optional[dict]:
+        vec = self.encoder.encode(profile)
+        with self._lock:
+            part = self._indexes.get((model, prompt))
+            if part is not None:
+                self._indexes.move_to_end((model, prompt))
+                index, values, expires = part
+                slot, score = index.search(vec)
+                if slot >= 0 and score >= self.threshold and expires[slot] >= time.monotonic():
+                    self.hits += 1
+                    self.last_hit_score = score
+                    return values[slot]
+            self.misses += 1
+        return None
+
+    def set(self, profile: dict, model: str, value: dict, prompt: str = "") -> None:
+        vec = self.encoder.encode(profile)
+        with self._lock:
+            index, values, expires = self._partition(model, prompt)
+            slot, evicted = index.add(vec)
+            deadline = time.monotonic() + self.ttl_seconds
+            if slot < len(values):
+                values[slot] = value
+                expires[slot] = deadline
+            else:
+                values.append(value)
+                expires.append(deadline)
+            if evicted:
+                self.evictions += 1
+            self._evict_stale_partitions()
+
+    def stats(self) -> dict:
+        return {
+            "size": sum(index.size for index, _, _ in self._indexes.values()),
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "partitions": len(self._indexes),
+            "partitions_evicted": self.partitions_evicted,
+            "last_hit_score": self.last_hit_score,
+        }
+
+
+def build_semantic_cache() -> Optional[SemanticCache]:
+    """Create the near-duplicate cache from settings. None when disabled or NumPy is missing."""
+    if not settings.semantic_cache_enabled:
+        return None
+    if not NUMPY_AVAILABLE:
+        print("ℹ️  Semantic cache disabled: numpy is not installed")
+        return None
+    return SemanticCache(
+        threshold=settings.semantic_cache_threshold,
+        dim=settings.semantic_cache_dim,
+        max_entries=settings.semantic_cache_max_entries,
+        ttl_seconds=settings.rec_cache_ttl_seconds,
+    )
@@ -1,17 +1,109 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
-    openai_api_key: str
+    openai_api_key: Optional[str] = None  # required for the OpenAI API; not for LLM_PROVIDER=fake or a stub
     model: str = "gpt-4o-mini"  # pick your model; adjust as needed
     
     # LangFuse settings (optional - leave empty to disable tracking)
     langfuse_secret_key: Optional[str] = None
     langfuse_public_key: Optional[str] = None
     langfuse_host: str = "https://cloud.langfuse.com"  # or self-hosted URL
+
+    # LLM client (one shared ChatOpenAI + HTTP connection pool per process)
+    llm_provider: str = "openai"            # "openai", or "fake": canned offline answers (shared/fake_llm.py)
+    llm_base_url: Optional[str] = None      # OpenAI-compatible endpoint, e.g. stub_llm_server.py's http://127.0.0.1:8010/v1
+    llm_fake_latency_ms: int = 0            # LLM_PROVIDER=fake: fixed delay per call
+    llm_max_connections: int = 100
+    llm_max_keepalive_connections: int = 20
+    llm_keepalive_expiry_seconds: float = 30.0
+    llm_timeout_seconds: float = 60.0
+    llm_connect_timeout_seconds: float = 5.0
+    llm_max_retries: int = 2
+
+    # Outbound LLM rate limiting (shared/ratelimit.py): token buckets, AIMD concurrency, Retry-After-aware retries
+    llm_rate_limit_enabled: bool = True
+    llm_requests_per_minute: int = 0          # provider RPM limit (0 = no bucket)
+    llm_tokens_per_minute: int = 0            # provider TPM limit (0 = no bucket)
+    llm_output_tokens_estimate: int = 1000    # completion tokens reserved per call until real usage is known
+    llm_max_concurrency: int = 32             # AIMD ceiling for model calls in flight
+    llm_min_concurrency: int = 1
+    llm_latency_target_seconds: float = 30.0  # slower calls (time to first chunk for streams) shrink the limit (0 = off)
+    llm_rate_limit_retries: int = 4           # replaces llm_max_retries while the limiter is on
+    llm_retry_base_seconds: float = 0.5       # jittered exponential backoff when there is no Retry-After
+    llm_retry_max_seconds: float = 30.0
+    llm_queue_timeout_seconds: float = 30.0   # longest wait for the limits before answering 503
+
+    # Prompt layout: static parts first (byte-stable) so provider-side prompt caching kicks in
+    prompt_cache_layout: bool = False  # opt-in: changes the prompt text every deployment sends
+
+    # /chat history: recent turns + rolling summary, kept under a token budget
+    chat_history_token_budget: int = 2000
+    chat_history_message_max_tokens: int = 400   # longer messages are digested / truncated
+    chat_history_summary_max_tokens: int = 400   # rolling summary of turns that no longer fit
+    chat_history_max_messages: int = 50          # newest messages read per turn
     
     # Database settings
     database_url: str = "sqlite:///anti_todo.db"
+
+    # Engine profile. SQLite pragmas are applied to every new connection
+    db_sqlite_wal: bool = True               # journal_mode=WAL: readers don't block the writer
+    db_sqlite_synchronous: str = "NORMAL"    # fsync on checkpoint, not every commit (safe with WAL)
+    db_sqlite_busy_timeout_ms: int = 5000    # wait for a locked database instead of failing
+    db_sqlite_mmap_size: int = 268_435_456   # 256 MiB memory-mapped reads (0 = off)
+    db_sqlite_cache_size_kib: int = 65_536   # page cache per connection
+    # Connection pool (QueuePool for file SQLite and Postgres)
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout_seconds: float = 30.0
+    db_pool_recycle_seconds: int = 1800      # Postgres: drop connections before server-side idle timeouts
+    db_pool_pre_ping: bool = True            # Postgres: check a pooled connection before handing it out
+
+    # Write-behind: the /recommendations assistant log messages are queued and written in
+    # batches by a background thread instead of inside the request (/chat turns never are)
+    write_behind_enabled: bool = False
+    write_behind_max_queue: int = 10_000       # row groups held in memory
+    write_behind_batch_size: int = 200         # rows per transaction
+    write_behind_flush_interval_ms: int = 50   # max wait to fill a batch
+    write_behind_overflow: str = "inline"      # queue full: "inline" = write in the request, "drop" = discard + count
+
+    # Compact ChatMessage storage: recommendation log messages store a reference to their
+    # Recommendation rows, and large content is zlib-compressed (see storage.py)
+    chat_storage_compact: bool = False
+    chat_compress_min_bytes: int = 1024
+
+    # /recommendations/batch: threads are processed in waves (load, generate, persist, commit)
+    recs_batch_max_threads: int = 5000       # per request
+    recs_batch_wave_size: int = 200
+    recs_batch_max_concurrency: int = 8      # parallel model calls (abatch max_concurrency)
+
+    # Single-flight: concurrent requests with the same prompt share one in-flight model call
+    single_flight_enabled: bool = True
+
+    # Admission control (shared/admission.py): in-flight caps for model-backed routes, per route and per tenant.
+    # Unlisted routes (/health, /onboard, GETs) are never queued. Full queue / missed deadline = 503
+    admission_enabled: bool = False
+    admission_route_limits: Dict[str, int] = {
+        "/recommendations": 16, "/recommendations/stream": 16, "/chat": 32, "/chat/stream": 32,
+        "/recommendations/batch": 2,  # each batch already runs RECS_BATCH_MAX_CONCURRENCY model calls
+    }  # POST path -> max in flight (JSON in the env)
+    admission_tenant_limit: int = 8              # per API key, queued + in flight; over = 429
+    admission_tenant_header: str = "X-API-Key"   # unauthenticated: fairness between clients, not a security boundary
+    admission_tenant_ip_fallback: bool = False   # no key -> cap per client IP (only without a proxy in front)
+    admission_max_queue: int = 64                # waiting requests per route
+    admission_queue_timeout_ms: int = 5000       # longest wait for a slot (clients can lower it: X-Request-Timeout-Ms)
+
+    # Recommendation cache (exact match on normalized profile + model)
+    rec_cache_enabled: bool = True
+    rec_cache_max_entries: int = 1024
+    rec_cache_ttl_seconds: int = 86400
+    rec_cache_sqlite_path: Optional[str] = None  # e.g. "rec_cache.db" to keep entries across restarts
+
+    # Near-duplicate cache (cosine similarity over locally encoded profiles, needs numpy)
+    semantic_cache_enabled: bool = False
+    semantic_cache_threshold: float = 0.92       # an added pain point scores ~0.83: keep it a miss
+    semantic_cache_dim: int = 256
+    semantic_cache_max_entries: int = 100_000    # total across (model, prompt) partitions
     
     class Config:
         env_file = ".env"
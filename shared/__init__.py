@@ -0,0 +1,8 @@
+# shared — Modules both apps use: a2d (repo root) and ownership_assistant/
+# Purpose: one copy of the LLM client registry (llm, fake_llm), the outbound rate
+# limiter, admission control, request coalescing and the write-behind queue.
+#
+# Like the rest of each app, these modules import `settings` flat, so they read
+# the settings of the app that runs them. Both apps' settings.py define the
+# fields used here. The ownership assistant makes this package importable with
+# its shared_path.py.
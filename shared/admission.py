@@ -0,0 +1,231 @@
+# admission.py — Admission control and load shedding for expensive routes
+# Purpose: cap how many model-backed requests run at once, per route and per tenant
+# (API key header), so a traffic spike waits in a short bounded queue or is
+# turned away with 503/429 instead of piling unbounded work onto the event loop and
+# threadpool until everything times out. Routes that aren't listed (/health,
+# /onboard, /metrics, GETs) never queue, so they stay fast during a spike.
+#
+# A request waits for a route slot only while it can still start in time: if the
+# estimated wait (queue position x recent service time) or the actual wait exceeds
+# its deadline, it fails fast with 503 + Retry-After. A tenant that already has its
+# cap of requests queued or in flight gets 429 at once. Queue times go into
+# per-route histograms.
+#
+# The tenant header is not authenticated here: the per-tenant cap is fairness
+# between well-behaved clients, the route limits are what bound the load. Requests
+# without the header are only held to the route limits, unless tenant_ip_fallback
+# is on (direct exposure only: behind a proxy every client shares one IP).
+
+import asyncio
+import hashlib
+import math
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from starlette.responses import JSONResponse
+
+from settings import settings
+
+QUEUE_MS_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)  # histogram upper bounds
+SERVICE_SMOOTHING = 0.2   # EWMA weight of the newest request duration
+DEADLINE_HEADER = b"x-request-timeout-ms"  # optional client deadline, tighter than the configured timeout
+
+
+class _Route:
+    """Slots, FIFO waiters and counters for one limited route."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiters: "deque[asyncio.Future]" = deque()
+        self.service_s = 1.0  # EWMA request duration, for the fast-fail estimate
+        self.admitted = 0
+        self.shed = 0        # 503: queue full or deadline can't be met
+        self.throttled = 0   # 429: tenant at its cap
+        self.queue_ms_counts = [0] * (len(QUEUE_MS_BUCKETS) + 1)
+        self.queue_ms_sum = 0.0
+
+    def observe_queue(self, ms: float):
+        for i, bound in enumerate(QUEUE_MS_BUCKETS):
+            if ms <= bound:
+                self.queue_ms_counts[i] += 1
+                break
+        else:
+            self.queue_ms_counts[-1] += 1
+        self.queue_ms_sum += ms
+
+    def release(self):
+        self.in_flight -= 1
+        while self.waiters and self.in_flight < self.limit:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def stats(self) -> dict:
+        cumulative, buckets = 0, {}
+        for bound, count in zip(QUEUE_MS_BUCKETS + ("+Inf",), self.queue_ms_counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": len(self.waiters),
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "throttled": self.throttled,
+            "service_ms_avg": round(self.service_s * 1000, 1),
+            # Prometheus-style cumulative histogram of time spent waiting for a slot
+            "queue_ms": {"buckets": buckets, "sum": round(self.queue_ms_sum, 1), "count": cumulative},
+        }
+
+
+class Rejected(Exception):
+    def __init__(self, status: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AdmissionControl:
+    """Per-route concurrency limits with a bounded, deadline-aware queue + per-tenant caps. Event-loop only."""
+
+    def __init__(self, route_limits: Dict[str, int], tenant_limit: int = 8, max_queue: int = 64,
+                 queue_timeout_s: float = 2.0, tenant_header: str = "x-api-key", tenant_ip_fallback: bool = False):
+        self.routes = {path: _Route(limit) for path, limit in route_limits.items() if limit > 0}
+        self.tenant_limit = tenant_limit
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self.tenant_header = tenant_header.lower().encode("latin-1")
+        self.tenant_ip_fallback = tenant_ip_fallback
+        self._tenants: Dict[str, int] = {}  # tenant -> expensive requests queued or in flight (all routes)
+
+    def tenant_of(self, scope) -> Optional[str]:
+        """API key / tenant header (hashed: keys never end up in memory dumps or metrics),
+        else the client IP if tenant_ip_fallback is on, else None (no tenant cap)."""
+        for name, value in scope.get("headers", ()):
+            if name == self.tenant_header and value:
+                return "key:" + hashlib.sha256(value).hexdigest()[:16]
+        if not self.tenant_ip_fallback:
+            return None
+        client = scope.get("client")
+        return "ip:" + (client[0] if client else "unknown")
+
+    def deadline_of(self, scope) -> float:
+        """Longest time this request may wait for a slot."""
+        for name, value in scope.get("headers", ()):
+            if name == DEADLINE_HEADER:
+                try:
+                    return min(self.queue_timeout_s, max(0.0, int(value) / 1000))
+                except ValueError:
+                    break
+        return self.queue_timeout_s
+
+    async def admit(self, route: _Route, tenant: Optional[str], deadline_s: float) -> float:
+        """Take a tenant slot and a route slot, or raise Rejected. Returns the queue time in seconds."""
+        if tenant is not None:
+            if self.tenant_limit and self._tenants.get(tenant, 0) >= self.tenant_limit:
+                route.throttled += 1
+                raise Rejected(429, "Too many concurrent requests for this API key", route.service_s)
+            # Queued requests count against the tenant too, so one client can't fill the queue
+            self._tenants[tenant] = self._tenants.get(tenant, 0) + 1
+        try:
+            queued = await self._take_slot(route, deadline_s)
+        except BaseException:
+            self._leave(tenant)
+            raise
+        route.admitted += 1
+        route.observe_queue(queued * 1000)
+        return queued
+
+    async def _take_slot(self, route: _Route, deadline_s: float) -> float:
+        started = time.monotonic()
+        if route.in_flight < route.limit and not route.waiters:
+            route.in_flight += 1
+            return 0.0
+
+        # Fail fast when the queue is full or this request would start after its deadline
+        expected_wait = (len(route.waiters) + 1) / route.limit * route.service_s
+        if len(route.waiters) >= self.max_queue or expected_wait > deadline_s:
+            route.shed += 1
+            raise Rejected(503, "Server busy, retry later", expected_wait)
+        waiter = asyncio.get_running_loop().create_future()
+        route.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), deadline_s)
+        except asyncio.TimeoutError:
+            if not waiter.done():  # (a slot granted right at the deadline is still taken)
+                route.waiters.remove(waiter)
+                route.shed += 1
+                raise Rejected(503, "Server busy, retry later", route.service_s)
+        except asyncio.CancelledError:
+            if waiter.done():
+                route.release()  # granted just as the client went away
+            else:
+                route.waiters.remove(waiter)
+            raise
+        return time.monotonic() - started
+
+    def _leave(self, tenant: Optional[str]):
+        if tenant is None:
+            return
+        remaining = self._tenants[tenant] - 1
+        if remaining:
+            self._tenants[tenant] = remaining
+        else:
+            del self._tenants[tenant]
+
+    def release(self, route: _Route, tenant: Optional[str], service_s: float):
+        route.service_s += SERVICE_SMOOTHING * (service_s - route.service_s)
+        route.release()
+        self._leave(tenant)
+
+    def stats(self) -> dict:
+        return {
+            "tenant_limit": self.tenant_limit,
+            "tenants_in_flight": len(self._tenants),
+            "routes": {path: route.stats() for path, route in self.routes.items()},
+        }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware: limited routes go through AdmissionControl; the slot is held until the response (or stream) ends."""
+
+    def __init__(self, app, control: AdmissionControl):
+        self.app = app
+        self.control = control
+
+    async def __call__(self, scope, receive, send):
+        route = self.control.routes.get(scope["path"]) if scope["type"] == "http" else None
+        if route is None or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        tenant = self.control.tenant_of(scope)
+        try:
+            await self.control.admit(route, tenant, self.control.deadline_of(scope))
+        except Rejected as e:
+            response = JSONResponse({"detail": str(e)}, status_code=e.status,
+                                    headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
+            await response(scope, receive, send)
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.control.release(route, tenant, time.monotonic() - started)
+
+
+def build_admission_control() -> Optional[AdmissionControl]:
+    if not settings.admission_enabled:
+        return None
+    return AdmissionControl(
+        route_limits=settings.admission_route_limits,
+        tenant_limit=settings.admission_tenant_limit,
+        max_queue=settings.admission_max_queue,
+        queue_timeout_s=settings.admission_queue_timeout_ms / 1000,
+        tenant_header=settings.admission_tenant_header,
+        tenant_ip_fallback=settings.admission_tenant_ip_fallback,
+    )
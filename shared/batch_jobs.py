@@ -0,0 +1,193 @@
+# batch_jobs.py — Offline JSONL batch runner shared by both apps' batch_runner.py
+# Purpose: stream a JSONL file of requests through an async handler with bounded
+# concurrency, retry transient failures with jittered exponential backoff, and
+# append one result line per request. The output file is the checkpoint: a re-run
+# skips every id already in it. Each app's batch_runner.py supplies the handler
+# (its own route code) and the CLI wording.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from typing import Awaitable, Callable, Iterator, Optional, Set, Tuple
+
+FSYNC_EVERY = 100  # results between fsyncs of the output file
+
+
+class InvalidRequest(Exception):
+    """The request itself is wrong: retrying won't help."""
+
+
+# ---------- Input / checkpoint ----------
+def iter_requests(path: str) -> Iterator[Tuple[str, Optional[dict], Optional[str]]]:
+    """(id, record, parse error) per non-empty line."""
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield f"line:{line_no}", None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield f"line:{line_no}", None, "Expected a JSON object"
+                continue
+            yield str(record.get("id", f"line:{line_no}")), record, None
+
+
+def load_checkpoint(path: str, retry_failed: bool) -> Set[str]:
+    """
+    Ids already done according to the output file. A torn last line (crash mid-write)
+    is cut off so appending continues on a clean line boundary.
+    """
+    if not os.path.exists(path):
+        return set()
+    done, failed = set(), set()
+    good_end = 0
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b"\n"):
+                break
+            good_end += len(line)
+            (done if result.get("ok") or not retry_failed else failed).add(str(result["id"]))
+    if good_end < os.path.getsize(path):
+        with open(path, "rb+") as f:
+            f.truncate(good_end)
+    return done - failed if retry_failed else done
+
+
+# ---------- Runner ----------
+async def _attempt(handle: Callable[[dict], Awaitable[dict]], record: dict, retries: int,
+                   backoff: float) -> dict:
+    for attempt in range(1, retries + 2):
+        try:
+            return {"ok": True, "attempts": attempt, "result": await handle(record)}
+        except InvalidRequest as e:
+            return {"ok": False, "attempts": attempt, "error": str(e)}
+        except Exception as e:
+            if attempt > retries:
+                return {"ok": False, "attempts": attempt, "error": str(e)}
+            await asyncio.sleep(backoff * 2 ** (attempt - 1) * (0.5 + random.random()))
+
+
+async def run_jobs(input_path: str, output_path: str, handle: Callable[[dict], Awaitable[dict]],
+                   concurrency: int = 8, retries: int = 3, backoff: float = 1.0,
+                   retry_failed: bool = False) -> dict:
+    """Stream input through `concurrency` workers, appending each result (= checkpoint) as it completes."""
+    done = load_checkpoint(output_path, retry_failed)
+    stats = {"skipped": 0, "ok": 0, "failed": 0, "retried": 0}
+    queue: "asyncio.Queue[Optional[Tuple[str, Optional[dict], Optional[str]]]]" = asyncio.Queue(concurrency * 2)
+    started = last_report = time.monotonic()
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        def write(result: dict):
+            nonlocal last_report
+            out.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+            out.flush()
+            stats["ok" if result["ok"] else "failed"] += 1
+            stats["retried"] += result["attempts"] > 1
+            finished = stats["ok"] + stats["failed"]
+            if finished % FSYNC_EVERY == 0:
+                os.fsync(out.fileno())
+            if time.monotonic() - last_report >= 2.0:
+                last_report = time.monotonic()
+                print(f"... {finished:>8,} done  {stats['failed']:>6,} failed  "
+                      f"{finished / (last_report - started):8.1f} req/s", file=sys.stderr, flush=True)
+
+        async def worker():
+            while (item := await queue.get()) is not None:
+                request_id, record, error = item
+                if error is not None:
+                    result = {"ok": False, "attempts": 0, "error": error}
+                else:
+                    result = await _attempt(handle, record, retries, backoff)
+                write({"id": request_id, **result})
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        for item in iter_requests(input_path):
+            if item[0] in done:
+                stats["skipped"] += 1
+                continue
+            await queue.put(item)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+        os.fsync(out.fileno())
+
+    stats["elapsed_s"] = round(time.monotonic() - started, 1)
+    return stats
+
+
+def write_parquet(jsonl_path: str, parquet_path: str):
+    """Columns id, ok, attempts, error, result (JSON text); the last line per id wins."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rows = {}
+    with open(jsonl_path, encoding="utf-8") as f:
+        for line in f:
+            r = json.loads(line)
+            rows[str(r["id"])] = {"id": str(r["id"]), "ok": r["ok"], "attempts": r["attempts"],
+                                  "error": r.get("error"),
+                                  "result": json.dumps(r["result"], ensure_ascii=False) if "result" in r else None}
+    pq.write_table(pa.Table.from_pylist(list(rows.values())), parquet_path)
+
+
+# ---------- CLI ----------
+def job_parser(doc: str, input_help: str, no_save_help: str, concurrency: int,
+               concurrency_help: Optional[str] = None) -> argparse.ArgumentParser:
+    """The arguments every batch_runner.py takes; `doc` is the script's docstring."""
+    parser = argparse.ArgumentParser(description=doc.strip().split("\n\n")[0])
+    parser.add_argument("input", help=input_help)
+    parser.add_argument("output", help="results JSONL; also the checkpoint to resume from")
+    parser.add_argument("--concurrency", type=int, default=concurrency, help=concurrency_help)
+    parser.add_argument("--retries", type=int, default=3, help="extra attempts for model/database errors")
+    parser.add_argument("--backoff", type=float, default=1.0, help="first retry delay in seconds (doubles)")
+    parser.add_argument("--retry-failed", action="store_true", help="re-run ids that failed in an earlier run")
+    parser.add_argument("--no-save", action="store_true", help=no_save_help)
+    parser.add_argument("--parquet", help="also write the results as a Parquet file (needs pyarrow)")
+    return parser
+
+
+async def run_app_jobs(args: argparse.Namespace, handler: Callable[[bool], Callable[[dict], Awaitable[dict]]]) -> dict:
+    """Start the running app's database, model and write-behind queue, run `handler(save)` over the input, shut down."""
+    import main
+    from db import init_db
+
+    init_db()
+    main.init_models()
+    if main.write_behind is not None:
+        main.write_behind.start()
+    try:
+        return await run_jobs(args.input, args.output, handler(not args.no_save),
+                              concurrency=args.concurrency, retries=args.retries, backoff=args.backoff,
+                              retry_failed=args.retry_failed)
+    finally:
+        if main.write_behind is not None:
+            main.write_behind.close()
+        await main.close_models()
+
+
+def run_cli(parser: argparse.ArgumentParser, run: Callable[[argparse.Namespace], Awaitable[dict]]):
+    """Parse arguments, `run` the jobs and report (plus the optional Parquet copy)."""
+    args = parser.parse_args()
+    if args.parquet:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("--parquet needs pyarrow (pip install pyarrow)")
+
+    stats = asyncio.run(run(args))
+    print(f"done: {stats['ok']:,} ok, {stats['failed']:,} failed ({stats['retried']:,} needed retries), "
+          f"{stats['skipped']:,} already in {args.output}, {stats['elapsed_s']} s")
+    if args.parquet:
+        write_parquet(args.output, args.parquet)
+        print(f"wrote {args.parquet}")
@@ -0,0 +1,165 @@
+# fake_llm.py — Deterministic canned model responses for offline runs and load tests
+# Purpose: answer the prompts this project sends (recommendations JSON, ownership
+# matches JSON, free-form chat) without a provider. The same prompt always gets
+# the same answer. Used in-process by LLM_PROVIDER=fake (FakeChatModel) and over
+# HTTP by the repo-root stub_llm_server.py (one stub for both apps).
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+CATEGORIES = (("Meetings", "📅"), ("Email & Messaging", "📧"), ("Reporting", "📊"),
+              ("Approvals", "✅"), ("Scheduling", "🗓️"), ("Data Entry", "⌨️"))
+VERBS = ("Stop", "Automate", "Batch", "Delegate", "Template", "Drop")
+OBJECTS = ("status updates", "recurring syncs", "inbox triage", "weekly reports", "meeting notes",
+           "expense approvals", "calendar juggling", "follow-up reminders", "data exports",
+           "ticket routing", "handoff checklists", "vendor emails")
+CATALOG_ENTRY = re.compile(
+    r"Product Area: (?P<area_name>.*?)\n.*?Owner: (?P<owner_name>.*?)\nEmail: (?P<owner_email>.*?)\n"
+    r"Team: (?P<team>.*?)\nRole: (?P<role>[^\n\"]*)", re.S)
+WORD = re.compile(r"[a-z0-9]+")
+
+
+def _rng(text: str) -> random.Random:
+    """Same prompt, same answer."""
+    return random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+
+
+def _context(text: str) -> dict:
+    """The per-user "context" object of a recommendations payload, if it parses."""
+    try:
+        context = json.loads(text).get("context")
+    except (ValueError, AttributeError):
+        return {}
+    return context if isinstance(context, dict) else {}
+
+
+def _recommendations(user_text: str) -> dict:
+    rng = _rng(user_text)
+    context = _context(user_text)
+    role = context.get("role_normalized") or context.get("role_input") or "your role"
+    pains = context.get("pains_input") or "busywork"
+    return {"categories": [{
+        "category_name": name,
+        "emoji": emoji,
+        "items": [{
+            "item": f"{rng.choice(VERBS)} {rng.choice(OBJECTS)}",
+            "rationale": f"As {role}, this frees time otherwise lost to {pains}.",
+            "estimated_gain_minutes": rng.choice((30, 45, 60, 90, 120, 180)),
+            "difficulty": rng.choice(("low", "medium", "high")),
+        } for _ in range(rng.randint(5, 7))],
+    } for name, emoji in CATEGORIES]}
+
+
+def _ownership(all_text: str, query: str) -> dict:
+    """Rank the catalog entries in the prompt by word overlap with the query; top 3 become matches."""
+    entries = [m.groupdict() for m in CATALOG_ENTRY.finditer(all_text.replace("\\n", "\n"))]
+    words = set(WORD.findall(query.lower()))
+    scored = sorted(((len(words & set(WORD.findall(" ".join(e.values()).lower()))), i, e)
+                     for i, e in enumerate(entries)), key=lambda s: (-s[0], s[1]))
+    matches = []
+    for rank, (score, _, entry) in enumerate(scored[:3]):
+        confidence = round(max(0.1, min(0.95, 0.5 + 0.15 * score - 0.2 * rank)), 2)
+        matches.append({**entry, "rationale": f"{entry['owner_name']} owns {entry['area_name']}, "
+                                              f"which matches the query.", "confidence_score": confidence})
+    return {"matches": matches}
+
+
+def _chat(user_text: str) -> str:
+    rng = _rng(user_text)
+    topic = " ".join(user_text.split()[:8]) or "that"
+    return (f"On \"{topic}\": {rng.choice(VERBS).lower()} {rng.choice(OBJECTS)} first. "
+            f"Then {rng.choice(VERBS).lower()} {rng.choice(OBJECTS)} and review the saved time next week.")
+
+
+def canned_reply(messages: List[dict]) -> str:
+    """Reply text for OpenAI-style messages ({"role", "content"}); the prompt decides the schema."""
+    texts = [m["content"] if isinstance(m.get("content"), str) else json.dumps(m.get("content"))
+             for m in messages]
+    # Schema instructions may arrive JSON-encoded inside a payload; earlier assistant
+    # turns (chat history) don't count
+    all_text = "\n".join(t for m, t in zip(messages, texts) if m.get("role") != "assistant").replace('\\"', '"')
+    user_text = next((t for m, t in zip(reversed(messages), reversed(texts)) if m.get("role") == "user"), "")
+    if '"categories"' in all_text:
+        return json.dumps(_recommendations(user_text), ensure_ascii=False)
+    if '"matches"' in all_text and "owner_email" in all_text:
+        query = user_text
+        try:
+            query = json.loads(user_text).get("query") or user_text
+        except (ValueError, AttributeError):
+            pass
+        return json.dumps(_ownership(all_text, query), ensure_ascii=False)
+    return _chat(user_text)
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def split_tokens(text: str) -> List[str]:
+    """~4-character pieces, the granularity a streaming provider sends."""
+    return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+
+def _openai_messages(messages: List[BaseMessage]) -> List[dict]:
+    roles = {"human": "user", "ai": "assistant", "system": "system"}
+    return [{"role": roles.get(m.type, m.type), "content": m.content} for m in messages]
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that answers with canned_reply() after an optional fixed latency, streaming included."""
+
+    latency_s: float = 0.0
+    model_name: str = "fake"
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-canned"
+
+    def _reply(self, messages: List[BaseMessage]):
+        text = canned_reply(_openai_messages(messages))
+        prompt_tokens = sum(count_tokens(str(m.content)) for m in messages)
+        completion_tokens = count_tokens(text)
+        usage = {"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        return text, usage
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        text, usage = self._reply(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        text, usage = self._reply(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        text, usage = self._reply(messages)
+        for piece in split_tokens(text):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any):
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        text, usage = self._reply(messages)
+        for piece in split_tokens(text):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage))
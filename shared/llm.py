@@ -0,0 +1,178 @@
+# llm.py — Process-wide model/client registry
+# Purpose: build the ChatOpenAI model (with its HTTP connection pools) and the
+# LangFuse client once per process instead of on every request. Per-request
+# callbacks are passed through `config={"callbacks": ...}` at invoke time.
+# LLM_BASE_URL points the client at any OpenAI-compatible server (e.g. the
+# repo-root stub_llm_server.py); LLM_PROVIDER=fake swaps in fake_llm.FakeChatModel, no network.
+
+import threading
+from typing import Optional
+
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_openai import ChatOpenAI
+
+from shared.fake_llm import FakeChatModel
+from settings import settings
+
+# ---- LangFuse integration (optional) ----
+try:
+    from langfuse import Langfuse
+    from langfuse.langchain import CallbackHandler
+    LANGFUSE_AVAILABLE = True
+except ImportError:
+    LANGFUSE_AVAILABLE = False
+    Langfuse = None
+    CallbackHandler = None
+
+_model: Optional[BaseChatModel] = None
+_http_client: Optional[httpx.Client] = None
+_http_async_client: Optional[httpx.AsyncClient] = None
+_langfuse = None
+
+
+def langfuse_configured() -> bool:
+    return bool(LANGFUSE_AVAILABLE and settings.langfuse_secret_key and settings.langfuse_public_key)
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.llm_max_connections,
+        max_keepalive_connections=settings.llm_max_keepalive_connections,
+        keepalive_expiry=settings.llm_keepalive_expiry_seconds,
+    )
+
+
+def _http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.llm_timeout_seconds, connect=settings.llm_connect_timeout_seconds)
+
+
+def build_model(http_client: Optional[httpx.Client] = None,
+                http_async_client: Optional[httpx.AsyncClient] = None,
+                **overrides) -> BaseChatModel:
+    """Single place to configure the LC model. Uses OPENAI_API_KEY (and LLM_BASE_URL) via settings."""
+    if settings.llm_provider == "fake":
+        return FakeChatModel(latency_s=settings.llm_fake_latency_ms / 1000)
+    if settings.llm_provider != "openai":
+        raise ValueError(f"Unknown LLM_PROVIDER {settings.llm_provider!r} (expected 'openai' or 'fake')")
+    kwargs = dict(
+        model=settings.model,       # e.g., "gpt-4o-mini"
+        temperature=0.3,
+        # A local stub doesn't check the key, but the SDK insists on one
+        api_key=settings.openai_api_key or ("stub" if settings.llm_base_url else None),
+        base_url=settings.llm_base_url,
+        timeout=settings.llm_timeout_seconds,
+        # With the rate limiter on, retries happen there (Retry-After, AIMD), not in the SDK
+        max_retries=0 if settings.llm_rate_limit_enabled else settings.llm_max_retries,
+        stream_usage=True,  # so streamed calls report token usage too
+        http_client=http_client,
+        http_async_client=http_async_client,
+    )
+    kwargs.update(overrides)
+    return ChatOpenAI(**kwargs)
+
+
+def init_models():
+    """Create the shared model, HTTP pools and LangFuse client. Called on startup."""
+    global _model, _http_client, _http_async_client, _langfuse
+    if _model is not None:
+        return
+    _http_client = httpx.Client(limits=_http_limits(), timeout=_http_timeout())
+    _http_async_client = httpx.AsyncClient(limits=_http_limits(), timeout=_http_timeout())
+    _model = build_model(http_client=_http_client, http_async_client=_http_async_client)
+
+    if langfuse_configured():
+        # LangFuse keeps a process-wide client; CallbackHandler() picks it up
+        _langfuse = Langfuse(
+            public_key=settings.langfuse_public_key,
+            secret_key=settings.langfuse_secret_key,
+            host=settings.langfuse_host
+        )
+
+
+async def close_models():
+    """Release pooled connections and flush LangFuse. Called on shutdown."""
+    global _model, _http_client, _http_async_client, _langfuse
+    if _http_async_client is not None:
+        await _http_async_client.aclose()
+    if _http_client is not None:
+        _http_client.close()
+    if _langfuse is not None:
+        _langfuse.flush()
+    _model = _http_client = _http_async_client = _langfuse = None
+
+
+def model_label() -> str:
+    """
+    What answers model calls: the model name for the OpenAI API, otherwise
+    "provider:base_url:model". Cache keys, single-flight keys and stored batch
+    labels use it, so fake/stub output is never reused or recorded as the real model's.
+    """
+    if settings.llm_provider == "openai" and not settings.llm_base_url:
+        return settings.model
+    return f"{settings.llm_provider}:{settings.llm_base_url or ''}:{settings.model}"
+
+
+def get_model() -> BaseChatModel:
+    """The shared model instance (created lazily if startup hasn't run, e.g. in scripts)."""
+    if _model is None:
+        init_models()
+    return _model
+
+
+class TokenUsageTracker(BaseCallbackHandler):
+    """
+    Aggregates token usage across model calls, including prompt tokens the provider
+    served from its prompt cache (usage_metadata.input_token_details.cache_read).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.input_tokens = 0
+        self.cached_input_tokens = 0
+        self.output_tokens = 0
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for gen in generations:
+                usage = getattr(getattr(gen, "message", None), "usage_metadata", None)
+                if not usage:
+                    continue
+                details = usage.get("input_token_details") or {}
+                with self._lock:
+                    self.calls += 1
+                    self.input_tokens += usage.get("input_tokens", 0)
+                    self.cached_input_tokens += details.get("cache_read", 0) or 0
+                    self.output_tokens += usage.get("output_tokens", 0)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "input_tokens": self.input_tokens,
+            "cached_input_tokens": self.cached_input_tokens,
+            "output_tokens": self.output_tokens,
+            "cached_input_ratio": (self.cached_input_tokens / self.input_tokens) if self.input_tokens else 0.0,
+        }
+
+
+usage_tracker = TokenUsageTracker()
+
+
+def request_callbacks() -> list:
+    """Callbacks for one request: token-usage metrics always, LangFuse tracing when configured."""
+    handler = get_langfuse_handler()
+    return [usage_tracker, handler] if handler else [usage_tracker]
+
+
+def get_langfuse_handler():
+    """
+    Per-request LangFuse CallbackHandler, or None if LangFuse is not configured.
+    The handler is cheap; the underlying client is shared.
+    """
+    if not langfuse_configured():
+        return None
+    if _langfuse is None:
+        init_models()
+    return CallbackHandler()
@@ -0,0 +1,462 @@
+# ratelimit.py — Outbound rate limiting for LLM calls
+# Purpose: keep model calls under the provider's requests/min and tokens/min limits
+# (token buckets), adapt how many calls run at once to throttling and latency (AIMD),
+# and retry throttled / transient failures with jittered backoff that honors
+# Retry-After, so a burst of traffic queues briefly instead of turning upstream 429s
+# into 500s.
+#
+# RateLimitedModel wraps the shared chat model, so every chain call made through it
+# (invoke, batch items, streams) takes a slot. The provider SDK's own retries are
+# turned off while the limiter is on (shared/llm.py): retries happen here, where they also
+# shrink the concurrency limit.
+
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+import httpx
+from langchain_core.runnables import Runnable
+
+from settings import settings
+
+try:
+    from openai import APIConnectionError
+except ImportError:  # openai comes with langchain-openai; the fallback keeps other providers working
+    APIConnectionError = httpx.TransportError
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+THROTTLE_DECREASE = 0.5    # concurrency limit factor after a 429
+SLOW_DECREASE = 0.9        # ... after a call slower than the latency target
+RTT_SMOOTHING = 0.2        # EWMA weight of the newest call latency
+WAIT_SAMPLES = 1000        # recent queue waits kept for the percentiles in stats()
+
+
+class RateLimited(Exception):
+    """The model is throttled and waiting longer would exceed the queue timeout."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after  # seconds; a hint for the client's Retry-After
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    code = getattr(error, "status_code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds from the Retry-After (or retry-after-ms) response header, if the error carries one."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Throttling, provider overload/5xx, timeouts and dropped connections; not bad requests or bad output."""
+    code = status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    return isinstance(error, (APIConnectionError, httpx.TransportError))
+
+
+def estimate_tokens(prompt: Any) -> int:
+    """Rough prompt size (chars/4) plus the expected completion; settled with real usage afterwards."""
+    if hasattr(prompt, "to_messages"):
+        text = "".join(str(m.content) for m in prompt.to_messages())
+    else:
+        text = str(prompt)
+    return len(text) // 4 + settings.llm_output_tokens_estimate
+
+
+def _usage_tokens(output: Any) -> Optional[int]:
+    usage = getattr(output, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+
+class TokenBucket:
+    """`per_minute` units refilled continuously, up to one minute's worth. Callers hold the limiter lock."""
+
+    def __init__(self, per_minute: int):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take `amount` now (possibly into debt); returns how long to wait until it is covered."""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        self.level -= amount
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def refund(self, amount: float):
+        """Give back (or, if negative, take more than) an earlier reservation."""
+        self.level = min(self.capacity, self.level + amount)
+
+
+class _Waiter:
+    """A caller queued for a concurrency slot: a thread (Event) or a coroutine (Future on its loop)."""
+
+    __slots__ = ("event", "loop", "future", "granted")
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+        self.granted = False
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class RateLimiter:
+    """Token buckets + AIMD concurrency limit + retries, shared by sync (threadpool) and async callers."""
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0, max_concurrency: int = 32,
+                 min_concurrency: int = 1, latency_target_s: float = 0.0, retries: int = 4,
+                 retry_base_s: float = 0.5, retry_max_s: float = 30.0, queue_timeout_s: float = 30.0):
+        self._lock = threading.Lock()
+        self._rpm = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self._tpm = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = max(1, min(min_concurrency, max_concurrency))
+        self.limit = float(max_concurrency)  # AIMD: +1 per limit's worth of good calls, x0.5 on a 429
+        self.latency_target_s = latency_target_s
+        self.retries = retries
+        self.retry_base_s = retry_base_s
+        self.retry_max_s = retry_max_s
+        self.queue_timeout_s = queue_timeout_s
+        self._in_flight = 0
+        self._waiters: "deque[_Waiter]" = deque()
+        self._paused_until = 0.0   # Retry-After from the provider applies to every caller
+        self._last_decrease = 0.0
+        self._rtt = 1.0            # smoothed call latency: calls in flight see the same overload, decrease once per RTT
+        self._waits: "deque[float]" = deque(maxlen=WAIT_SAMPLES)
+        self._wrapped = None
+        self.queued = 0       # callers waiting right now (buckets, Retry-After pause or a slot)
+        self.calls = 0        # attempts that reached the model
+        self.throttled = 0    # 429s from the provider
+        self.retried = 0      # attempts repeated after a retryable error
+        self.rejected = 0     # RateLimited raised (queue timeout / throttled after all retries)
+        self.wait_total_s = 0.0
+
+    # ---------- Admission ----------
+    def _reserve(self, tokens: int) -> float:
+        """Take one request + `tokens` from the buckets (lock held); returns the wait before starting."""
+        now = time.monotonic()
+        wait = max(0.0, self._paused_until - now)
+        if self._rpm is not None:
+            wait = max(wait, self._rpm.reserve(1, now))
+        if self._tpm is not None:
+            wait = max(wait, self._tpm.reserve(tokens, now))
+        if wait > self.queue_timeout_s:
+            self._refund(1, tokens)
+            self.rejected += 1
+            raise RateLimited(f"Model rate limit: next slot in {wait:.1f}s", wait)
+        return wait
+
+    def _refund(self, requests: int, tokens: float):
+        if self._rpm is not None and requests:
+            self._rpm.refund(requests)
+        if self._tpm is not None and tokens:
+            self._tpm.refund(tokens)
+
+    def _enqueue(self, waiter: _Waiter) -> bool:
+        """Take a free slot (True) or queue behind earlier waiters (False). Lock held."""
+        if not self._waiters and self._in_flight < max(self.min_concurrency, int(self.limit)):
+            self._in_flight += 1
+            return True
+        self._waiters.append(waiter)
+        return False
+
+    def _grant(self):
+        """Hand freed slots to queued callers in arrival order. Lock held."""
+        while self._waiters and self._in_flight < max(self.min_concurrency, int(self.limit)):
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            self._in_flight += 1
+            waiter.wake()
+
+    def _leave(self, waiter: _Waiter, started: float, timed_out: bool):
+        """A caller gave up waiting (timeout / cancelled): drop it from the queue, or return the slot it was just granted."""
+        with self._lock:
+            if waiter.granted:
+                self._in_flight -= 1
+                self._grant()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            self.queued -= 1
+            if timed_out:
+                self.rejected += 1
+        if timed_out:
+            raise RateLimited(f"Model concurrency limit: no slot after {time.monotonic() - started:.1f}s",
+                              self.retry_base_s)
+
+    def _admitted(self, started: float):
+        with self._lock:
+            self.queued -= 1
+            self.calls += 1
+            waited = time.monotonic() - started
+            self._waits.append(waited)
+            self.wait_total_s += waited
+
+    def _remaining(self, started: float) -> float:
+        return max(0.0, self.queue_timeout_s - (time.monotonic() - started))
+
+    def acquire(self, tokens: int):
+        """Block until the buckets and a concurrency slot allow one call (threadpool callers)."""
+        started = time.monotonic()
+        with self._lock:
+            self.queued += 1
+            try:
+                wait = self._reserve(tokens)
+            except RateLimited:
+                self.queued -= 1
+                raise
+        if wait:
+            time.sleep(wait)
+        waiter = _Waiter()
+        with self._lock:
+            admitted = self._enqueue(waiter)
+        if not admitted and not waiter.event.wait(self._remaining(started)):
+            self._leave(waiter, started, timed_out=True)
+        self._admitted(started)
+
+    async def aacquire(self, tokens: int):
+        """Async version of acquire(): waits without blocking the event loop."""
+        started = time.monotonic()
+        with self._lock:
+            self.queued += 1
+            try:
+                wait = self._reserve(tokens)
+            except RateLimited:
+                self.queued -= 1
+                raise
+        waiter = _Waiter(asyncio.get_running_loop())
+        try:
+            if wait:
+                await asyncio.sleep(wait)
+            with self._lock:
+                admitted = self._enqueue(waiter)
+            if not admitted:
+                await asyncio.wait_for(waiter.future, self._remaining(started))
+        except asyncio.TimeoutError:
+            self._leave(waiter, started, timed_out=True)
+        except asyncio.CancelledError:
+            self._leave(waiter, started, timed_out=False)
+            raise
+        self._admitted(started)
+
+    # ---------- Outcome signals ----------
+    def _release(self):
+        """Free the caller's slot (lock held)."""
+        self._in_flight -= 1
+        self._grant()
+
+    def _succeeded(self, latency: float, tokens: int, used: Optional[int]):
+        with self._lock:
+            self._release()
+            if used is not None:
+                self._refund(0, tokens - used)  # settle the estimate with the real usage
+            self._rtt += RTT_SMOOTHING * (latency - self._rtt)
+            if self.latency_target_s and latency > self.latency_target_s:
+                self._decrease(SLOW_DECREASE)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            self._grant()
+
+    def _decrease(self, factor: float):
+        now = time.monotonic()
+        if now - self._last_decrease >= self._rtt:
+            self.limit = max(float(self.min_concurrency), self.limit * factor)
+            self._last_decrease = now
+
+    def _failed(self, error: Exception, attempt: int) -> float:
+        """Release the slot and return the delay before the next attempt; re-raise if not retrying."""
+        throttled = status_code(error) == 429
+        hinted = retry_after(error)
+        with self._lock:
+            self._release()
+            if throttled:
+                self.throttled += 1
+                self._decrease(THROTTLE_DECREASE)
+                if hinted:
+                    self._paused_until = max(self._paused_until, time.monotonic() + hinted)
+            if not is_retryable(error):
+                raise error
+            if attempt >= self.retries or (hinted or 0) > self.queue_timeout_s:
+                if not throttled:
+                    raise error
+                self.rejected += 1
+                raise RateLimited(f"Model rate limited by the provider: {error}",
+                                  hinted or self.retry_base_s) from error
+            self.retried += 1
+        if hinted is not None:
+            return hinted + random.uniform(0, self.retry_base_s)  # jitter so waiters don't return in lockstep
+        return random.uniform(0, min(self.retry_max_s, self.retry_base_s * 2 ** attempt))
+
+    def _failed_midstream(self):
+        with self._lock:
+            self._release()
+
+    # ---------- Calls ----------
+    def call(self, fn: Callable[[], Any], tokens: int) -> Any:
+        """fn() under the limits, retried on throttling / transient errors."""
+        for attempt in range(self.retries + 1):
+            self.acquire(tokens)
+            started = time.monotonic()
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._failed(e, attempt)
+                time.sleep(delay)
+                continue
+            self._succeeded(time.monotonic() - started, tokens, _usage_tokens(result))
+            return result
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]], tokens: int) -> Any:
+        """Async version of call()."""
+        for attempt in range(self.retries + 1):
+            await self.aacquire(tokens)
+            started = time.monotonic()
+            try:
+                result = await fn()
+            except asyncio.CancelledError:
+                self._failed_midstream()
+                raise
+            except Exception as e:
+                delay = self._failed(e, attempt)
+                await asyncio.sleep(delay)
+                continue
+            self._succeeded(time.monotonic() - started, tokens, _usage_tokens(result))
+            return result
+
+    async def astream(self, open_stream: Callable[[], AsyncIterator[Any]], tokens: int) -> AsyncIterator[Any]:
+        """
+        Stream under the limits. Errors before the first chunk are retried like call();
+        after that they propagate (the client already has part of the answer). The latency
+        signal is the time to the first chunk.
+        """
+        for attempt in range(self.retries + 1):
+            await self.aacquire(tokens)
+            started = time.monotonic()
+            first_chunk: Optional[float] = None
+            used = None
+            holding = True
+            try:
+                async for chunk in open_stream():
+                    if first_chunk is None:
+                        first_chunk = time.monotonic() - started
+                    used = _usage_tokens(chunk) or used
+                    yield chunk
+            except Exception as e:
+                holding = False
+                if first_chunk is not None:
+                    self._failed_midstream()
+                    raise
+                delay = self._failed(e, attempt)
+            else:
+                holding = False
+                self._succeeded(first_chunk if first_chunk is not None else time.monotonic() - started,
+                                tokens, used)
+                return
+            finally:
+                if holding:  # consumer stopped early (client disconnected) or was cancelled
+                    self._failed_midstream()
+            await asyncio.sleep(delay)
+
+    def wrap(self, model) -> "RateLimitedModel":
+        """The model behind this limiter (the same wrapper per model, so compiled chains stay cached)."""
+        wrapped = self._wrapped
+        if wrapped is None or wrapped.model is not model:
+            wrapped = self._wrapped = RateLimitedModel(model, self)
+        return wrapped
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+
+        def pct(p):
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))] * 1000, 1) if waits else 0.0
+
+        return {
+            "queue_depth": self.queued,
+            "in_flight": self._in_flight,
+            "concurrency_limit": round(self.limit, 2),
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "retried": self.retried,
+            "rejected": self.rejected,
+            "paused_for_s": round(max(0.0, self._paused_until - time.monotonic()), 2),
+            "wait_ms_mean": round(self.wait_total_s / self.calls * 1000, 1) if self.calls else 0.0,
+            "wait_ms_p50": pct(0.5),
+            "wait_ms_p95": pct(0.95),
+            "wait_ms_max": round(waits[-1] * 1000, 1) if waits else 0.0,
+        }
+
+
+class RateLimitedModel(Runnable):
+    """A chat model whose calls go through a RateLimiter; batch() items are limited one by one."""
+
+    def __init__(self, model, limiter: RateLimiter):
+        self.model = model
+        self.limiter = limiter
+
+    @property
+    def InputType(self):
+        return self.model.InputType
+
+    @property
+    def OutputType(self):
+        return self.model.OutputType
+
+    def invoke(self, input, config=None, **kwargs):
+        return self.limiter.call(lambda: self.model.invoke(input, config, **kwargs), estimate_tokens(input))
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        return await self.limiter.acall(lambda: self.model.ainvoke(input, config, **kwargs), estimate_tokens(input))
+
+    async def astream(self, input, config=None, **kwargs):
+        async for chunk in self.limiter.astream(lambda: self.model.astream(input, config, **kwargs),
+                                                estimate_tokens(input)):
+            yield chunk
+
+
+def build_rate_limiter() -> Optional[RateLimiter]:
+    if not settings.llm_rate_limit_enabled:
+        return None
+    return RateLimiter(
+        requests_per_minute=settings.llm_requests_per_minute,
+        tokens_per_minute=settings.llm_tokens_per_minute,
+        max_concurrency=settings.llm_max_concurrency,
+        min_concurrency=settings.llm_min_concurrency,
+        latency_target_s=settings.llm_latency_target_seconds,
+        retries=settings.llm_rate_limit_retries,
+        retry_base_s=settings.llm_retry_base_seconds,
+        retry_max_s=settings.llm_retry_max_seconds,
+        queue_timeout_s=settings.llm_queue_timeout_seconds,
+    )
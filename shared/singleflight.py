@@ -0,0 +1,140 @@
+# singleflight.py — Request coalescing for identical in-flight LLM calls
+# Purpose: when the same prompt arrives many times at once (a popular onboarding
+# profile, the same chat turn retried, "Who owns search?" from a whole team), make
+# one model call and hand its result to every waiter instead of paying for N
+# identical generations.
+#
+# Keys are prompt hashes (see flight_key). Only calls that overlap in time are
+# shared; nothing is kept once the call finishes (that's the cache's job).
+# Errors are shared too: every waiter of a failed call gets the error (sync waiters
+# each get their own copy, raised from their own thread).
+
+import asyncio
+import hashlib
+import json
+import threading
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from settings import settings
+
+
+def flight_key(*parts) -> str:
+    """Stable hash of the prompt parts (dicts, lists, strings) that decide the model output."""
+    material = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    """A sync call in flight: waiters block on `done`, then read result/error."""
+
+    __slots__ = ("done", "result", "error", "traceback")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.traceback = None  # the leader's traceback when fn() raised, before it propagates further
+
+
+def _waiter_error(call: _Call) -> BaseException:
+    """
+    A copy of the leader's exception for one waiter. Raising the same object in many
+    threads would have them all rewrite its __traceback__ (and __context__) at once.
+    """
+    error = call.error
+    try:
+        clone = type(error).__new__(type(error), *error.args)
+        clone.args = error.args
+        clone.__dict__.update(getattr(error, "__dict__", {}))
+    except Exception:
+        clone = RuntimeError(f"coalesced call failed: {error!r}")
+    clone.__cause__ = error.__cause__
+    clone.__suppress_context__ = error.__suppress_context__
+    return clone.with_traceback(call.traceback)
+
+
+class SingleFlight:
+    """One in-flight call per key, for both sync (threadpool) and async callers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        # event loop -> key -> task: a task only belongs to (and can be awaited on) its own loop
+        self._tasks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Task]]" = \
+            weakref.WeakKeyDictionary()
+        self.calls = 0       # calls actually made
+        self.coalesced = 0   # callers served by someone else's call
+        self.errors = 0      # calls that raised (each waiter saw the error)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run fn() unless a call with this key is already in flight; then wait for that one."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise _waiter_error(call)
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error, call.traceback = e, e.__traceback__
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Async version. The call runs as its own task, so a waiter that is cancelled
+        (client went away), including the one that started it, doesn't cancel it for the others.
+        """
+        with self._lock:
+            tasks = self._tasks.setdefault(asyncio.get_running_loop(), {})
+            task = tasks.get(key)
+            if task is None:
+                task = tasks[key] = asyncio.ensure_future(fn())
+                self.calls += 1
+                task.add_done_callback(lambda t: self._finished(tasks, key, t))
+            else:
+                self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finished(self, tasks: Dict[str, asyncio.Task], key: str, task: asyncio.Task):
+        with self._lock:
+            if tasks.get(key) is task:
+                del tasks[key]
+            if not task.cancelled() and task.exception() is not None:
+                self.errors += 1
+
+    def stats(self) -> dict:
+        requests = self.calls + self.coalesced
+        with self._lock:
+            in_flight = len(self._calls) + sum(len(tasks) for tasks in self._tasks.values())
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "in_flight": in_flight,
+            "coalesce_rate": round(self.coalesced / requests, 4) if requests else 0.0,
+        }
+
+
+def build_single_flight() -> Optional[SingleFlight]:
+    """Create the coalescing layer from settings. Returns None when it is disabled."""
+    if not settings.single_flight_enabled:
+        return None
+    return SingleFlight()
@@ -0,0 +1,170 @@
+# write_behind.py — Write-behind queue for non-critical inserts
+# Purpose: let a route return without waiting on rows nobody reads in the same
+# request (a2d's /recommendations log message, the ownership assistant's /query
+# audit rows). Rows go to a bounded in-process queue and a background thread
+# writes them in batched transactions. a2d's /chat exchanges are written in the
+# request: they are the history the next turn reads.
+#
+# Back-pressure: submit() never blocks. When the queue is full it returns False
+# (policy "inline": the caller writes the rows itself, as before) or drops the
+# rows and counts them (policy "drop"). close() flushes what is queued.
+
+import queue
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session
+
+from settings import settings
+
+OVERFLOW_POLICIES = ("inline", "drop")
+LOCK_RETRIES = 5  # SQLite: busy_timeout already waited; back off and try the batch again
+
+
+class WriteBehindQueue:
+    """Bounded queue of row groups, drained by one thread in batched transactions."""
+
+    def __init__(self, engine, max_queue: int = 10_000, batch_size: int = 200,
+                 flush_interval: float = 0.05, overflow: str = "inline"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}, got {overflow!r}")
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self._queue: "queue.Queue[Optional[Sequence]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.failed = 0
+        self.dropped = 0
+        self.inline = 0
+        self.max_depth = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def submit(self, *rows) -> bool:
+        """
+        Queue rows to be inserted together (same transaction). Returns False when the
+        caller should write them itself: queue not running, or full with policy "inline".
+        """
+        with self._lock:
+            if self._thread is None:
+                return False
+            try:
+                self._queue.put_nowait(rows)
+            except queue.Full:
+                if self.overflow == "drop":
+                    self.dropped += len(rows)
+                    return True
+                self.inline += len(rows)
+                return False
+            self.submitted += len(rows)
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """Stop accepting work, write everything still queued, join the worker."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(None)  # sentinel after the queued rows; blocks only if the queue is full
+        thread.join(timeout)
+
+    def _take_batch(self) -> Tuple[List[Sequence], bool]:
+        """Block for the first group, then gather more for up to flush_interval."""
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        groups, size = [first], len(first)
+        deadline = time.monotonic() + self.flush_interval
+        while size < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                group = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if group is None:
+                return groups, True
+            groups.append(group)
+            size += len(group)
+        return groups, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            groups, stop = self._take_batch()
+            if groups:
+                self._write(groups)
+
+    def _commit(self, rows: Sequence):
+        """Insert rows in one transaction, retrying while the database is locked."""
+        for attempt in range(LOCK_RETRIES):
+            try:
+                with Session(self.engine) as session:
+                    session.add_all(rows)
+                    session.commit()
+                return
+            except OperationalError as e:
+                if "locked" not in str(e) or attempt == LOCK_RETRIES - 1:
+                    raise
+                with self._lock:
+                    self.retries += 1
+                time.sleep(0.05 * 2 ** attempt)
+
+    def _write(self, groups: List[Sequence]):
+        rows = [row for group in groups for row in group]
+        try:
+            self._commit(rows)
+            with self._lock:
+                self.written += len(rows)
+                self.batches += 1
+            return
+        except Exception as e:
+            print(f"⚠️  write-behind batch of {len(rows)} rows failed ({e}); retrying per group")
+        # one bad group must not take the rest of the batch down with it
+        for group in groups:
+            try:
+                self._commit(group)
+                with self._lock:
+                    self.written += len(group)
+            except Exception:
+                with self._lock:
+                    self.failed += len(group)
+
+    def stats(self) -> dict:
+        return {
+            "running": self._thread is not None,
+            "overflow": self.overflow,
+            "queue_depth": self._queue.qsize(),
+            "max_depth": self.max_depth,
+            "submitted": self.submitted,
+            "written": self.written,
+            "batches": self.batches,
+            "retries": self.retries,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "inline": self.inline,
+        }
+
+
+def build_write_behind(engine) -> Optional[WriteBehindQueue]:
+    """Create the queue from settings. Returns None when write-behind is disabled."""
+    if not settings.write_behind_enabled:
+        return None
+    return WriteBehindQueue(
+        engine,
+        max_queue=settings.write_behind_max_queue,
+        batch_size=settings.write_behind_batch_size,
+        flush_interval=settings.write_behind_flush_interval_ms / 1000,
+        overflow=settings.write_behind_overflow,
+    )
@@ -0,0 +1,177 @@
+# storage.py — Compact storage for ChatMessage.content
+# Purpose: stop the messages table from carrying what is stored elsewhere or
+# compresses well. Opt-in with CHAT_STORAGE_COMPACT:
+#   - the assistant log message of /recommendations stores a reference to its
+#     Recommendation rows ("@@rec:{...}") instead of the full JSON blob;
+#   - any content of CHAT_COMPRESS_MIN_BYTES or more is zlib-compressed and
+#     base64-encoded behind a "@@z:" marker (the column stays text, so it works
+#     the same on SQLite and Postgres).
+#
+# Compressed content is decoded transparently by the column type when rows load.
+# Any other text starting with "@@" is stored escaped ("@@raw:"), and the same
+# decode step that strips the escape marks real references (_Reference), so user
+# or model text can never be read back as a reference. References are resolved
+# lazily, only for the messages a history read returns (resolve_messages). Rows
+# written before compact mode, or with it off, are plain text and read back unchanged.
+
+import base64
+import json
+import zlib
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Sequence
+
+from sqlalchemy.types import TypeDecorator
+from sqlmodel import AutoString, select
+
+from settings import settings
+
+COMPRESSED = "@@z:"
+REFERENCE = "@@rec:"
+ESCAPED = "@@raw:"  # plain text that happens to start with "@@"
+# One response references a few dozen rows; a reference asking for more is not ours
+MAX_REFERENCE_IDS = 1000
+
+
+class _Reference(str):
+    """
+    Reference content: built by recommendation_ref() on write, returned by
+    decode_content() on read. Only these are resolved; any other text starting
+    with "@@" is escaped on write and read back as plain text.
+    """
+
+
+# ---------- Compression (column type) ----------
+def encode_content(text: str) -> str:
+    if text is None or isinstance(text, _Reference):
+        return text
+    if settings.chat_storage_compact:
+        raw = text.encode("utf-8")
+        if len(raw) >= settings.chat_compress_min_bytes:
+            packed = COMPRESSED + base64.b64encode(zlib.compress(raw, 6)).decode("ascii")
+            if len(packed) < len(raw):
+                return packed
+    if text.startswith("@@"):
+        return ESCAPED + text
+    return text
+
+
+def decode_content(stored: str) -> str:
+    if stored is None or not stored.startswith("@@"):
+        return stored
+    if stored.startswith(COMPRESSED):
+        try:
+            return zlib.decompress(base64.b64decode(stored[len(COMPRESSED):])).decode("utf-8")
+        except (ValueError, zlib.error):
+            return stored  # not ours after all
+    if stored.startswith(ESCAPED):
+        return stored[len(ESCAPED):]
+    if stored.startswith(REFERENCE):
+        return _Reference(stored)  # resolved by resolve_messages()
+    return stored
+
+
+class CompactText(TypeDecorator):
+    """Text column that compresses large values on write (compact mode) and decodes markers on read."""
+
+    impl = AutoString
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return encode_content(value)
+
+    def process_result_value(self, value, dialect):
+        return decode_content(value)
+
+
+# ---------- Recommendation references ----------
+def _id_ranges(ids: Sequence[int]) -> str:
+    """[3, 4, 5, 9] -> "3-5,9"."""
+    parts, ids = [], sorted(ids)
+    start = prev = ids[0]
+    for i in ids[1:] + [None]:
+        if i is not None and i == prev + 1:
+            prev = i
+            continue
+        parts.append(str(start) if start == prev else f"{start}-{prev}")
+        if i is not None:
+            start = prev = i
+    return ",".join(parts)
+
+
+def _parse_ranges(spec: str) -> List[int]:
+    """"3-5,9" -> [3, 4, 5, 9]. ValueError when malformed or past MAX_REFERENCE_IDS ids."""
+    ids = []
+    for part in spec.split(","):
+        lo, _, hi = part.partition("-")
+        lo, hi = int(lo), int(hi or lo)
+        if hi < lo or len(ids) + hi - lo + 1 > MAX_REFERENCE_IDS:
+            raise ValueError(f"bad reference range {part!r}")
+        ids.extend(range(lo, hi + 1))
+    return ids
+
+
+def recommendation_ref(recs: Sequence, data: dict) -> str:
+    """
+    Log message content pointing at the (flushed) Recommendation rows of one response.
+    Only what the rows don't have is kept: the category emojis.
+    """
+    emoji = {c.get("category_name"): c.get("emoji") for c in data.get("categories", []) if c.get("emoji")}
+    ref = {"ids": _id_ranges([r.id for r in recs]) if recs else ""}
+    if emoji:
+        ref["emoji"] = emoji
+    return _Reference(REFERENCE + json.dumps(ref, ensure_ascii=False, separators=(",", ":")))
+
+
+def _rebuild(ref: dict, ids: List[int], rows: Dict[int, object]) -> str:
+    """The recommendations JSON as the model returned it (per-category format), from the rows."""
+    categories: Dict[str, dict] = {}
+    emoji = ref.get("emoji") or {}
+    for rec_id in ids:
+        rec = rows.get(rec_id)
+        if rec is None:
+            continue
+        category = categories.setdefault(rec.category, {
+            "category_name": rec.category, "emoji": emoji.get(rec.category), "items": []})
+        category["items"].append({
+            "item": rec.item,
+            "rationale": rec.rationale,
+            "estimated_gain_minutes": rec.estimated_gain_minutes,
+            "difficulty": rec.difficulty.value if hasattr(rec.difficulty, "value") else rec.difficulty,
+        })
+    return json.dumps({"categories": list(categories.values())}, ensure_ascii=False)
+
+
+class StoredMessage(NamedTuple):
+    """Read-only view of a ChatMessage with its content reconstructed (never written back)."""
+    id: int
+    sender: str
+    content: str
+    created_at: datetime
+
+
+async def resolve_messages(session, messages: Sequence) -> List[StoredMessage]:
+    """Resolve the recommendation references among messages (one thread's) with one query."""
+    from models import Recommendation  # models imports this module for CompactText
+
+    refs: Dict[int, tuple] = {}  # message index -> (reference, ids)
+    for i, m in enumerate(messages):
+        if m.sender == "assistant" and isinstance(m.content, _Reference):
+            try:
+                ref = json.loads(m.content[len(REFERENCE):])
+                refs[i] = (ref, _parse_ranges(ref["ids"]) if ref.get("ids") else [])
+            except (ValueError, TypeError, AttributeError):
+                continue  # not a reference we wrote: left as stored
+    rows: Dict[int, object] = {}
+    wanted = sorted({rec_id for _, ids in refs.values() for rec_id in ids})
+    if wanted:
+        thread_ids = {messages[i].thread_id for i in refs}
+        # Plain column rows, not ORM entities: nothing here is modified, and it is ~3x cheaper
+        result = await session.exec(select(
+            Recommendation.id, Recommendation.category, Recommendation.item, Recommendation.rationale,
+            Recommendation.estimated_gain_minutes, Recommendation.difficulty,
+        ).where(Recommendation.id.in_(wanted), Recommendation.thread_id.in_(thread_ids)))
+        rows = {rec.id: rec for rec in result.all()}
+    return [
+        StoredMessage(m.id, m.sender, _rebuild(*refs[i], rows) if i in refs else str(m.content), m.created_at)
+        for i, m in enumerate(messages)
+    ]
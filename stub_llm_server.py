@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible stub LLM server for offline load and performance testing.
+
+Serves POST /v1/chat/completions (plain and streaming) with fake_llm's canned,
+deterministic answers: recommendations JSON, ownership matches JSON or chat text,
+depending on the prompt. Latency, error rates and the streaming token rate are
+configurable, so rate limiting, admission control, retries and streaming paths can
+be exercised without a provider or network. One stub serves both apps: point either
+at it with LLM_BASE_URL=http://127.0.0.1:8010/v1 (no OPENAI_API_KEY needed).
+
+Latency is the time to the first token; the rest of the answer then takes
+completion_tokens / --tokens-per-second, streamed or not. Distributions:
+    fixed:0.8            always 0.8 s
+    uniform:0.2,1.5      uniform between 0.2 s and 1.5 s
+    normal:0.8,0.2       mean 0.8 s, stddev 0.2 s (clamped at 0)
+    lognormal:0.8,0.5    median 0.8 s, sigma 0.5 (long tail, like real providers)
+
+GET /stats reports calls, errors, tokens and latency percentiles so far.
+
+Usage:
+    python stub_llm_server.py
+    python stub_llm_server.py --port 8010 --latency lognormal:0.8,0.5 --tokens-per-second 80 \\
+        --error-rate 0.01 --throttle-rate 0.05 --retry-after 2 --seed 42
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from typing import Callable
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from shared.fake_llm import canned_reply, count_tokens, split_tokens
+
+DISTRIBUTIONS = {
+    "fixed": (1, lambda rng, s: s),
+    "uniform": (2, lambda rng, low, high: rng.uniform(low, high)),
+    "normal": (2, lambda rng, mean, sd: max(0.0, rng.gauss(mean, sd))),
+    "lognormal": (2, lambda rng, median, sigma: rng.lognormvariate(math.log(median), sigma)),
+}
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """'name:a[,b]' -> sampler(rng) in seconds."""
+    name, _, params = spec.partition(":")
+    if name not in DISTRIBUTIONS:
+        raise argparse.ArgumentTypeError(f"unknown distribution {name!r} (one of {', '.join(DISTRIBUTIONS)})")
+    arity, sample = DISTRIBUTIONS[name]
+    try:
+        values = [float(v) for v in params.split(",")] if params else []
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"bad latency parameters {params!r}")
+    if len(values) != arity or (name == "lognormal" and values[0] <= 0):
+        raise argparse.ArgumentTypeError(f"{name} takes {arity} positive parameter(s), e.g. {name}:0.8"
+                                         + (",0.2" if arity == 2 else ""))
+    return lambda rng: sample(rng, *values)
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def create_app(latency: str = "fixed:0.5", tokens_per_second: float = 100.0, error_rate: float = 0.0,
+               throttle_rate: float = 0.0, retry_after: float = 1.0, seed: int = 0) -> FastAPI:
+    sample_latency = parse_latency(latency)
+    rng = random.Random(seed)  # one stream of draws: same seed + same arrival order, same run
+    counters = {"calls": 0, "streams": 0, "in_flight": 0, "errors": 0, "throttled": 0,
+                "prompt_tokens": 0, "completion_tokens": 0}
+    latencies = []  # time to first token, answered calls
+
+    app = FastAPI(title="Stub LLM")
+
+    def error(status: int, message: str, kind: str, headers: dict = None):
+        return JSONResponse({"error": {"message": message, "type": kind, "code": kind}},
+                            status_code=status, headers=headers)
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "stub"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages") or []
+        model = body.get("model", "stub")
+        counters["calls"] += 1
+
+        draw = rng.random()
+        if draw < throttle_rate:
+            counters["throttled"] += 1
+            return error(429, "Rate limit reached (stub)", "rate_limit_exceeded",
+                         {"Retry-After": str(retry_after), "retry-after-ms": str(int(retry_after * 1000))})
+        if draw < throttle_rate + error_rate:
+            counters["errors"] += 1
+            return error(500, "Internal error (stub)", "server_error")
+
+        text = canned_reply(messages)
+        usage = {"prompt_tokens": sum(count_tokens(json.dumps(m.get("content", ""))) for m in messages),
+                 "completion_tokens": count_tokens(text)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        first_token_s = sample_latency(rng)
+        per_token_s = 1 / tokens_per_second if tokens_per_second > 0 else 0.0
+        latencies.append(first_token_s)
+        counters["prompt_tokens"] += usage["prompt_tokens"]
+        counters["completion_tokens"] += usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            counters["in_flight"] += 1
+            try:
+                await asyncio.sleep(first_token_s + usage["completion_tokens"] * per_token_s)
+            finally:
+                counters["in_flight"] -= 1
+            return {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        counters["streams"] += 1
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+        def frame(delta: dict, finish_reason=None, chunk_usage=None) -> str:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+                     "usage": chunk_usage}
+            return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+        async def events():
+            counters["in_flight"] += 1
+            try:
+                await asyncio.sleep(first_token_s)
+                yield frame({"role": "assistant", "content": ""})
+                for piece in split_tokens(text):
+                    yield frame({"content": piece})
+                    if per_token_s:
+                        await asyncio.sleep(per_token_s)
+                yield frame({}, finish_reason="stop")
+                if include_usage:
+                    yield frame(None, chunk_usage=usage)
+                yield "data: [DONE]\n\n"
+            finally:
+                counters["in_flight"] -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return {
+            **counters,
+            "first_token_ms_p50": round(pct(latencies, 0.5) * 1000, 1),
+            "first_token_ms_p95": round(pct(latencies, 0.95) * 1000, 1),
+            "first_token_ms_p99": round(pct(latencies, 0.99) * 1000, 1),
+            "config": {"latency": latency, "tokens_per_second": tokens_per_second, "error_rate": error_rate,
+                       "throttle_rate": throttle_rate, "retry_after": retry_after, "seed": seed},
+        }
+
+    return app
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip(),
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--latency", default="fixed:0.5",
+                        help="time to first token: fixed:S | uniform:LOW,HIGH | normal:MEAN,SD | lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0,
+                        help="completion token rate after the first token (0 = instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0,
+                        help="fraction of calls answered with 429 + Retry-After")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on 429s")
+    parser.add_argument("--seed", type=int, default=0, help="seed for latency and error draws")
+    args = parser.parse_args()
+    try:
+        parse_latency(args.latency)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    import uvicorn
+    app = create_app(latency=args.latency, tokens_per_second=args.tokens_per_second, error_rate=args.error_rate,
+                     throttle_rate=args.throttle_rate, retry_after=args.retry_after, seed=args.seed)
+    print(f"Stub LLM on http://{args.host}:{args.port}/v1 — set LLM_BASE_URL to that")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Tests for admission control (shared/admission.py), through its ASGI middleware in
+front of a stub app whose limited route blocks until released: the bounded queue,
+503 + Retry-After when the queue is full or a deadline can't be met, the
+per-tenant 429, and the queue-time histogram.
+
+Usage:
+    python -m pytest -q test_admission.py
+"""
+
+import asyncio
+
+import httpx
+
+from shared.admission import QUEUE_MS_BUCKETS, AdmissionControl, AdmissionMiddleware
+
+ROUTE = "/recommendations"
+
+
+class StubApp:
+    """Answers 200; POST ROUTE holds its slot until `gate` is set."""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+
+    async def __call__(self, scope, receive, send):
+        if scope["path"] == ROUTE and scope["method"] == "POST":
+            await self.gate.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+
+def run(control: AdmissionControl, scenario):
+    """Run scenario(client, stub) against the middleware-wrapped stub app."""
+    async def go():
+        stub = StubApp()
+        transport = httpx.ASGITransport(app=AdmissionMiddleware(stub, control))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await scenario(client, stub)
+
+    return asyncio.run(go())
+
+
+async def settle():
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+def control(**kwargs) -> AdmissionControl:
+    options = dict(route_limits={ROUTE: 1}, max_queue=1, queue_timeout_s=5.0)
+    options.update(kwargs)
+    return AdmissionControl(**options)
+
+
+# ---------- Queue limits ----------
+def test_full_queue_sheds_with_retry_after():
+    ac = control()
+    ac.routes[ROUTE].service_s = 2.5
+
+    async def scenario(client, stub):
+        first = asyncio.create_task(client.post(ROUTE))
+        await settle()
+        second = asyncio.create_task(client.post(ROUTE))
+        await settle()
+        assert ac.stats()["routes"][ROUTE]["queued"] == 1
+        third = await client.post(ROUTE)
+        stub.gate.set()
+        return await first, await second, third
+
+    first, second, third = run(ac, scenario)
+    assert (first.status_code, second.status_code, third.status_code) == (200, 200, 503)
+    assert third.headers["Retry-After"] == "5"  # two ahead of it at ~2.5 s each
+    stats = ac.stats()["routes"][ROUTE]
+    assert (stats["admitted"], stats["shed"], stats["in_flight"], stats["queued"]) == (2, 1, 0, 0)
+
+
+def test_request_that_cannot_start_before_its_deadline_is_shed_at_once():
+    ac = control(max_queue=8)
+
+    async def scenario(client, stub):
+        first = asyncio.create_task(client.post(ROUTE))
+        await settle()
+        rejected = await client.post(ROUTE, headers={"X-Request-Timeout-Ms": "100"})
+        stub.gate.set()
+        await first
+        return rejected
+
+    rejected = run(ac, scenario)
+    assert rejected.status_code == 503 and int(rejected.headers["Retry-After"]) >= 1
+    assert ac.stats()["routes"][ROUTE]["shed"] == 1
+
+
+def test_queued_request_shed_when_its_wait_times_out():
+    ac = control(queue_timeout_s=0.05)
+    ac.routes[ROUTE].service_s = 0.01  # the estimate lets it queue; the slot never frees in time
+
+    async def scenario(client, stub):
+        first = asyncio.create_task(client.post(ROUTE))
+        await settle()
+        timed_out = await client.post(ROUTE)
+        stub.gate.set()
+        await first
+        return timed_out
+
+    timed_out = run(ac, scenario)
+    assert timed_out.status_code == 503 and timed_out.headers["Retry-After"] == "1"
+    stats = ac.stats()["routes"][ROUTE]
+    assert (stats["shed"], stats["queued"], stats["in_flight"]) == (1, 0, 0)
+
+
+def test_unlimited_routes_and_reads_never_queue():
+    ac = control()
+
+    async def scenario(client, stub):
+        busy = asyncio.create_task(client.post(ROUTE))
+        await settle()
+        others = [await client.get(ROUTE), await client.post("/onboard"), await client.get("/health")]
+        stub.gate.set()
+        await busy
+        return others
+
+    assert [r.status_code for r in run(ac, scenario)] == [200, 200, 200]
+    assert ac.stats()["routes"][ROUTE]["admitted"] == 1
+
+
+# ---------- Tenants ----------
+def test_tenant_over_its_cap_gets_429():
+    ac = control(route_limits={ROUTE: 4}, tenant_limit=1)
+
+    async def scenario(client, stub):
+        first = asyncio.create_task(client.post(ROUTE, headers={"X-API-Key": "a"}))
+        await settle()
+        same = await client.post(ROUTE, headers={"X-API-Key": "a"})
+        other = asyncio.create_task(client.post(ROUTE, headers={"X-API-Key": "b"}))
+        await settle()
+        stub.gate.set()
+        return same, await first, await other
+
+    same, first, other = run(ac, scenario)
+    assert (same.status_code, first.status_code, other.status_code) == (429, 200, 200)
+    assert "Retry-After" in same.headers
+    assert ac.stats()["tenants_in_flight"] == 0 and ac.stats()["routes"][ROUTE]["throttled"] == 1
+
+
+# ---------- Queue-time histogram ----------
+def test_queue_time_histogram():
+    ac = control()
+
+    async def scenario(client, stub):
+        first = asyncio.create_task(client.post(ROUTE))
+        await settle()
+        queued = asyncio.create_task(client.post(ROUTE))
+        await asyncio.sleep(0.1)
+        stub.gate.set()
+        await first, await queued
+
+    run(ac, scenario)
+    histogram = ac.stats()["routes"][ROUTE]["queue_ms"]
+    buckets = histogram["buckets"]
+    assert list(buckets) == [str(b) for b in QUEUE_MS_BUCKETS] + ["+Inf"]
+    assert buckets["1"] == 1            # the first request never waited
+    assert buckets["50"] == 1 and buckets["250"] == 2  # the second waited ~100 ms
+    assert histogram["count"] == buckets["+Inf"] == 2
+    assert 50 < histogram["sum"] < 250
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Tests for the recommendation response cache (cache.py): LRU eviction and TTL
+expiry in memory, expiry in the SQLite tier, promotion of disk hits into memory,
+and the bypass counter under concurrent requests.
+
+Usage:
+    python -m pytest -q test_cache.py
+"""
+
+import threading
+
+import pytest
+
+import cache
+from cache import CacheBackend, LRUCache, RecommendationCache, SQLiteCache
+
+RECS = {"categories": [{"category_name": "Meetings", "emoji": "📅", "items": []}]}
+
+
+class Clock:
+    """Stands in for time.monotonic / time.time in cache.py."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    monkeypatch.setattr(cache.time, "time", clock)
+    return clock
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        CacheBackend()
+
+
+# ---------- Memory tier ----------
+def test_lru_evicts_least_recently_used():
+    lru = LRUCache(max_entries=2)
+    lru.set("a", {"v": "a"})
+    lru.set("b", {"v": "b"})
+    assert lru.get("a") == {"v": "a"}  # "b" is now the oldest
+    lru.set("c", {"v": "c"})
+    assert lru.get("b") is None
+    assert lru.get("a") == {"v": "a"} and lru.get("c") == {"v": "c"}
+    stats = lru.stats()
+    assert (stats["size"], stats["evictions"], stats["hits"], stats["misses"]) == (2, 1, 3, 1)
+
+
+def test_lru_entries_expire_after_ttl(clock):
+    lru = LRUCache(ttl_seconds=60)
+    lru.set("a", RECS)
+    clock.now += 59
+    assert lru.get("a") == RECS
+    clock.now += 2
+    assert lru.get("a") is None
+    stats = lru.stats()
+    assert (stats["size"], stats["expirations"], stats["misses"]) == (0, 1, 1)
+
+
+def test_lru_set_refreshes_ttl(clock):
+    lru = LRUCache(ttl_seconds=60)
+    lru.set("a", RECS)
+    clock.now += 50
+    lru.set("a", RECS)
+    clock.now += 50
+    assert lru.get("a") == RECS
+
+
+# ---------- Disk tier ----------
+def test_sqlite_entries_expire_after_ttl(tmp_path, clock):
+    disk = SQLiteCache(str(tmp_path / "rec_cache.db"), ttl_seconds=60)
+    disk.set("a", RECS)
+    clock.now += 61
+    assert disk.get("a") is None
+    assert (disk.stats()["size"], disk.stats()["expirations"]) == (0, 1)
+
+
+def test_sqlite_entries_survive_reopen(tmp_path):
+    path = str(tmp_path / "rec_cache.db")
+    SQLiteCache(path).set("a", RECS)
+    assert SQLiteCache(path).get("a") == RECS
+
+
+def test_disk_hit_promoted_into_memory(tmp_path):
+    path = str(tmp_path / "rec_cache.db")
+    SQLiteCache(path).set("a", RECS)  # e.g. written before a restart
+    recs = RecommendationCache(LRUCache(), SQLiteCache(path))
+    assert recs.get("a") == RECS
+    assert recs.memory.stats()["size"] == 1
+    assert recs.get("a") == RECS
+    assert (recs.memory.stats()["hits"], recs.disk.stats()["hits"]) == (1, 1)
+
+
+def test_set_writes_both_tiers(tmp_path):
+    recs = RecommendationCache(LRUCache(), SQLiteCache(str(tmp_path / "rec_cache.db")))
+    recs.set("a", RECS)
+    assert recs.memory.get("a") == RECS and recs.disk.get("a") == RECS
+
+
+def test_memory_miss_without_disk_tier():
+    assert RecommendationCache(LRUCache()).get("a") is None
+
+
+# ---------- Bypass counter ----------
+def test_bypasses_counted_across_threads():
+    recs = RecommendationCache(LRUCache())
+
+    def bypass():
+        for _ in range(2000):
+            recs.record_bypass()
+
+    threads = [threading.Thread(target=bypass) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert recs.stats()["bypasses"] == 16_000
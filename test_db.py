@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Tests for the database URLs (db.py): a sync DATABASE_URL is mapped onto its async
+driver with its options kept, and a bare in-memory SQLite URL becomes one shared
+memory database that the sync and async engines both see.
+
+Usage:
+    python -m pytest -q test_db.py
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import text
+
+from db import SHARED_MEMORY_URL, _async_url, _shared_memory_url, build_async_engine, build_engine
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("sqlite:///anti_todo.db", "sqlite+aiosqlite:///anti_todo.db"),
+    ("sqlite+pysqlite:///anti_todo.db", "sqlite+aiosqlite:///anti_todo.db"),
+    ("sqlite+aiosqlite:///anti_todo.db", "sqlite+aiosqlite:///anti_todo.db"),
+    ("postgresql://a2d:secret@db:5432/a2d", "postgresql+asyncpg://a2d:secret@db:5432/a2d"),
+    ("postgres://a2d@db/a2d?sslmode=require", "postgresql+asyncpg://a2d@db/a2d?sslmode=require"),
+    ("postgresql+psycopg2://a2d@db/a2d", "postgresql+asyncpg://a2d@db/a2d"),
+    ("mysql://a2d@db/a2d", "mysql://a2d@db/a2d"),
+])
+def test_async_url(url, expected):
+    assert _async_url(url) == expected
+
+
+@pytest.mark.parametrize("url", ["sqlite://", "sqlite:///:memory:"])
+def test_bare_memory_url_is_shared(url):
+    assert _shared_memory_url(url) == SHARED_MEMORY_URL
+
+
+def test_file_url_unchanged():
+    assert _shared_memory_url("sqlite:///anti_todo.db") == "sqlite:///anti_todo.db"
+
+
+def test_both_engines_see_the_same_memory_database():
+    url = _shared_memory_url("sqlite://")
+    engine = build_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE shared_probe (n INTEGER)"))
+        conn.execute(text("INSERT INTO shared_probe VALUES (42)"))
+
+    async def read():
+        async_engine = build_async_engine(url)
+        async with async_engine.connect() as conn:
+            value = (await conn.execute(text("SELECT n FROM shared_probe"))).scalar_one()
+        await async_engine.dispose()
+        return value
+
+    try:
+        assert asyncio.run(read()) == 42
+    finally:
+        engine.dispose()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Tests for the token-budgeted /chat history (history.py): digests, the rolling
+summary, which turns build_history keeps or folds, and the (created_at, id) marker
+that _load_chat_history reads from, including messages that share a timestamp.
+Token counts use chars/4 here, whether or not tiktoken's encoding is available.
+
+Usage:
+    python -m pytest -q test_history.py
+"""
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import history
+import main
+from db import init_db, new_async_session
+from history import SUMMARY_HEADER, build_history, count_tokens, digest, extend_summary, fold_messages
+from models import ChatMessage, SessionThread
+from settings import settings
+
+RECS = {"categories": [{"category_name": "Meetings", "emoji": "📅", "items": [
+    {"item": "Drop the weekly sync", "rationale": "Nobody reads the notes.",
+     "estimated_gain_minutes": 60, "difficulty": "low"}]}]}
+
+T0 = datetime(2026, 1, 1, 9, 0, 0)
+
+
+@pytest.fixture(autouse=True)
+def chars_per_token(monkeypatch):
+    monkeypatch.setattr(history, "_tokenizer", None)
+    monkeypatch.setattr(history, "_tokenizer_started", True)
+
+
+def msg(i: int, content: str, sender: str = "user", created_at: datetime = None):
+    return SimpleNamespace(id=i, sender=sender, content=content,
+                           created_at=created_at or T0 + timedelta(seconds=i))
+
+
+# ---------- Digests and the rolling summary ----------
+def test_recommendations_json_digested_to_titles():
+    assert digest(json.dumps(RECS), 100) == "[Recommendations given] Meetings: Drop the weekly sync"
+
+
+def test_long_text_truncated():
+    out = digest("word " * 100, 10)
+    assert out.endswith(" …") and count_tokens(out) <= 11
+
+
+def test_extend_summary_appends_one_line_per_message():
+    out = extend_summary("User: hi", [("assistant", "hello\n  there"), ("user", "thanks")], 400)
+    assert out.splitlines() == ["User: hi", "Assistant: hello there", "User: thanks"]
+
+
+def test_extend_summary_drops_oldest_lines_past_max_tokens():
+    folded = [("user", f"question number {i} " + "x" * 40) for i in range(10)]
+    out = extend_summary(None, folded, 40)
+    assert count_tokens(out) <= 40
+    assert "number 9" in out and "number 0" not in out
+
+
+def test_fold_messages_digests_and_labels_roles():
+    out = fold_messages(None, [msg(1, "how do I start?"), msg(2, json.dumps(RECS), "assistant")], 400)
+    assert out.splitlines() == ["User: how do I start?", "Assistant: [Recommendations given] Meetings: Drop the weekly sync"]
+
+
+# ---------- build_history ----------
+def test_everything_fits_nothing_folded():
+    window = build_history([msg(1, "hi"), msg(2, "hello", "assistant")], None, None, 2000, 400, 400)
+    assert window.turns == [("user", "hi"), ("assistant", "hello")]
+    assert not window.summary_changed and window.summary is None and window.summary_until is None
+
+
+def test_oldest_turns_folded_into_summary():
+    messages = [msg(i, f"turn {i} " + "y" * 200) for i in range(1, 11)]
+    window = build_history(messages, None, None, 300, 400, 100)
+    assert window.summary_changed and window.tokens <= 300
+    kept = len(window.turns) - 1
+    assert window.turns[0] == ("system", SUMMARY_HEADER + window.summary)
+    assert [c for _, c in window.turns[1:]] == [m.content for m in messages[-kept:]]
+    last_folded = messages[-kept - 1]
+    assert window.summary_until == (last_folded.created_at, last_folded.id)
+    assert f"turn {last_folded.id}" in window.summary
+
+
+def test_newest_turn_kept_even_over_budget():
+    window = build_history([msg(1, "old"), msg(2, "z" * 4000)], None, None, 100, 2000, 50)
+    assert window.turns[-1] == ("user", "z" * 4000)
+    assert "User: old" in window.summary
+
+
+def test_existing_summary_sent_first_and_unchanged():
+    window = build_history([msg(5, "next question")], "User: earlier", (T0, 4), 2000, 400, 400)
+    assert window.turns == [("system", SUMMARY_HEADER + "User: earlier"), ("user", "next question")]
+    assert not window.summary_changed and window.summary_until == (T0, 4)
+
+
+# ---------- _load_chat_history: the (created_at, id) marker ----------
+def _load(thread_id: int, *new_messages: str):
+    """Add messages (all stamped T0) to the thread, then load its history and persist the marker."""
+    async def go():
+        async with new_async_session() as session:
+            for content in new_messages:
+                session.add(ChatMessage(thread_id=thread_id, sender="user", content=content, created_at=T0))
+            await session.commit()
+        async with new_async_session() as session:
+            thread = await session.get(SessionThread, thread_id)
+            turns = await main._load_chat_history(session, thread)
+            session.add(thread)
+            await session.commit()
+            return turns
+
+    return asyncio.run(go())
+
+
+def _new_thread() -> int:
+    async def go():
+        async with new_async_session() as session:
+            thread = SessionThread(role_raw="pm", industry_raw="SaaS", pains_raw="meetings")
+            session.add(thread)
+            await session.commit()
+            return thread.id
+
+    init_db()
+    return asyncio.run(go())
+
+
+def test_messages_sharing_a_timestamp_are_neither_lost_nor_repeated(monkeypatch):
+    monkeypatch.setattr(settings, "chat_history_max_messages", 4)
+    thread_id = _new_thread()
+    seen = []
+    for batch in (range(10), range(10, 12)):
+        turns = _load(thread_id, *(f"m{i:02d}" for i in batch))
+        summary = turns[0][1] if turns[0][0] == "system" else ""
+        seen.append(([line.removeprefix("User: ") for line in summary.splitlines()[1:]],
+                     [content for _, content in turns[1:]]))
+
+    (summary1, window1), (summary2, window2) = seen
+    assert summary1 == [f"m{i:02d}" for i in range(6)] and window1 == [f"m{i:02d}" for i in range(6, 10)]
+    assert summary2 == [f"m{i:02d}" for i in range(8)] and window2 == [f"m{i:02d}" for i in range(8, 12)]
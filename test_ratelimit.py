@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Tests for the outbound rate limiter (shared/ratelimit.py) against a fake chat model that
+answers 429s like the provider does: retries honor Retry-After, the AIMD limit
+shrinks on throttling and grows back, buckets and the queue timeout turn into
+RateLimited, and a throttled /recommendations answers 503 + Retry-After.
+
+The ownership assistant imports the same module, so these cover both apps.
+
+Usage:
+    python -m pytest -q test_ratelimit.py
+"""
+
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from shared.ratelimit import RateLimited, RateLimiter, TokenBucket, retry_after
+
+
+def throttle_error(headers: dict = None, status: int = 429) -> openai.APIStatusError:
+    request = httpx.Request("POST", "http://stub/v1/chat/completions")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    error = openai.RateLimitError if status == 429 else openai.APIStatusError
+    return error("Rate limit reached (test)", response=response, body=None)
+
+
+class ThrottlingModel(FakeListChatModel):
+    """Fake chat model: raises the queued errors first, then answers; optionally slow."""
+
+    errors: list = []
+    latency: float = 0.0
+    calls: int = 0
+
+    def _call(self, *args, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        time.sleep(self.latency)
+        return super()._call(*args, **kwargs)
+
+    async def _agenerate(self, *args, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        await asyncio.sleep(self.latency)
+        return await super()._agenerate(*args, **kwargs)
+
+    async def _astream(self, *args, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        async for chunk in super()._astream(*args, **kwargs):
+            yield chunk
+
+
+def limiter(**overrides) -> RateLimiter:
+    options = dict(max_concurrency=8, retries=3, retry_base_s=0.01, retry_max_s=0.05, queue_timeout_s=2.0)
+    options.update(overrides)
+    return RateLimiter(**options)
+
+
+# ---------- Retry-After ----------
+def test_retry_after_header_forms():
+    assert retry_after(throttle_error({"retry-after": "2"})) == 2.0
+    assert retry_after(throttle_error({"retry-after-ms": "250", "retry-after": "9"})) == 0.25
+    assert retry_after(throttle_error({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0  # in the past
+    assert retry_after(throttle_error()) is None
+
+
+def test_retries_wait_for_retry_after():
+    model = ThrottlingModel(responses=["ok"], errors=[throttle_error({"retry-after": "0.3"})])
+    rl = limiter()
+    started = time.monotonic()
+    assert rl.wrap(model).invoke("hi").content == "ok"
+    assert time.monotonic() - started >= 0.3
+    assert model.calls == 2
+    stats = rl.stats()
+    assert (stats["throttled"], stats["retried"], stats["rejected"]) == (1, 1, 0)
+
+
+def test_retry_after_pauses_every_caller():
+    """A Retry-After seen by one call holds back calls that start during the pause."""
+    rl = limiter()
+
+    async def run():
+        throttled = ThrottlingModel(responses=["ok"], errors=[throttle_error({"retry-after": "0.3"})])
+        healthy = ThrottlingModel(responses=["ok"])
+        first = asyncio.ensure_future(rl.wrap(throttled).ainvoke("a"))
+        await asyncio.sleep(0.05)  # the 429 has paused the limiter by now
+        started = time.monotonic()
+        await rl.wrap(healthy).ainvoke("b")
+        await first
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.2
+
+
+def test_non_retryable_errors_propagate_at_once():
+    model = ThrottlingModel(responses=["ok"], errors=[throttle_error(status=400)])
+    rl = limiter()
+    with pytest.raises(openai.APIStatusError):
+        rl.wrap(model).invoke("hi")
+    assert model.calls == 1 and rl.stats()["retried"] == 0
+
+
+def test_persistent_throttling_raises_rate_limited():
+    model = ThrottlingModel(responses=["ok"], errors=[throttle_error() for _ in range(10)])
+    rl = limiter(retries=2)
+    with pytest.raises(RateLimited):
+        rl.wrap(model).invoke("hi")
+    assert model.calls == 3 and rl.stats()["rejected"] == 1
+
+
+def test_retry_after_beyond_queue_timeout_fails_fast():
+    model = ThrottlingModel(responses=["ok"], errors=[throttle_error({"retry-after": "30"})])
+    rl = limiter(queue_timeout_s=1.0)
+    started = time.monotonic()
+    with pytest.raises(RateLimited) as raised:
+        rl.wrap(model).invoke("hi")
+    assert raised.value.retry_after == 30.0
+    assert time.monotonic() - started < 0.5
+
+
+def test_stream_retried_before_first_chunk():
+    model = ThrottlingModel(responses=["streamed"], errors=[throttle_error({"retry-after-ms": "50"})])
+    rl = limiter()
+
+    async def run():
+        return "".join([chunk.content async for chunk in rl.wrap(model).astream("hi")])
+
+    assert asyncio.run(run()) == "streamed"
+    assert model.calls == 2 and rl.stats()["in_flight"] == 0
+
+
+# ---------- AIMD concurrency ----------
+def test_throttling_shrinks_limit_and_successes_grow_it_back():
+    model = ThrottlingModel(responses=["ok"], errors=[throttle_error()])
+    rl = limiter(max_concurrency=8)
+    rl.wrap(model).invoke("hi")
+    # halved by the 429, then +1/limit for the retry that succeeded
+    assert 4.0 <= rl.limit < 4.5
+    for _ in range(40):
+        rl.wrap(model).invoke("hi")
+    assert rl.limit == 8.0
+
+
+def test_slow_calls_shrink_limit():
+    model = ThrottlingModel(responses=["ok"], latency=0.1)
+    rl = limiter(max_concurrency=8, latency_target_s=0.05)
+    rl.wrap(model).invoke("hi")
+    assert rl.limit == pytest.approx(8 * 0.9)
+
+
+def test_limit_caps_calls_in_flight():
+    model = ThrottlingModel(responses=["ok"], latency=0.1)
+    rl = limiter(max_concurrency=2)
+    peak = 0
+
+    async def run():
+        nonlocal peak
+
+        async def watch():
+            nonlocal peak
+            while True:
+                peak = max(peak, rl.stats()["in_flight"])
+                await asyncio.sleep(0.005)
+
+        watcher = asyncio.ensure_future(watch())
+        await asyncio.gather(*(rl.wrap(model).ainvoke(str(i)) for i in range(8)))
+        watcher.cancel()
+
+    asyncio.run(run())
+    assert peak == 2 and rl.stats()["calls"] == 8
+
+
+# ---------- Buckets and queue timeout ----------
+def test_token_bucket_debt_and_refund():
+    bucket = TokenBucket(60)  # 1 per second, burst of 60
+    now = bucket.updated
+    assert bucket.reserve(60, now) == 0.0
+    assert bucket.reserve(2, now) == pytest.approx(2.0)
+    bucket.refund(2)
+    assert bucket.reserve(1, now) == pytest.approx(1.0)
+
+
+def test_bucket_wait_beyond_queue_timeout_is_rejected():
+    rl = limiter(requests_per_minute=60, queue_timeout_s=0.5)
+    model = ThrottlingModel(responses=["ok"])
+    for _ in range(60):  # the burst allowance
+        rl.wrap(model).invoke("hi")
+    with pytest.raises(RateLimited) as raised:
+        rl.wrap(model).invoke("hi")
+    assert raised.value.retry_after == pytest.approx(1.0, abs=0.1)
+    assert rl.stats()["queue_depth"] == 0
+
+
+def test_queue_timeout_raises_rate_limited():
+    model = ThrottlingModel(responses=["ok"], latency=0.5)
+    rl = limiter(max_concurrency=1, queue_timeout_s=0.1)
+
+    async def run():
+        return await asyncio.gather(*(rl.wrap(model).ainvoke(str(i)) for i in range(2)), return_exceptions=True)
+
+    first, second = asyncio.run(run())
+    assert first.content == "ok"
+    assert isinstance(second, RateLimited)
+    stats = rl.stats()
+    assert (stats["rejected"], stats["in_flight"], stats["queue_depth"]) == (1, 0, 0)
+
+
+def test_throttled_recommendations_answer_503():
+    import main
+    from db import init_db
+
+    init_db()
+    model = ThrottlingModel(responses=["{}"], errors=[throttle_error({"retry-after": "7"}) for _ in range(5)])
+    saved = main.get_model, main.rate_limiter
+    main.get_model = lambda: model
+    main.rate_limiter = limiter(queue_timeout_s=1.0)
+    try:
+        async def run():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                onboard = await client.post("/onboard", json={"role": "pm", "industry": "SaaS", "pains": "meetings"})
+                return await client.post("/recommendations", json={"thread_id": onboard.json()["thread_id"]})
+
+        response = asyncio.run(run())
+    finally:
+        main.get_model, main.rate_limiter = saved
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "7"
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Route tests for /recommendations and /recommendations/stream against a fake chat
+model with scripted replies: what reaches the recommendation cache, and what the
+routes answer.
+
+Usage:
+    python -m pytest -q test_recommendations.py
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import main
+from cache import LRUCache, RecommendationCache
+from db import init_db
+
+RECS = {"categories": [{"category_name": "Meetings", "emoji": "📅", "items": [
+    {"item": "Drop the weekly sync", "rationale": "Nobody reads the notes.",
+     "estimated_gain_minutes": 60, "difficulty": "low"}]}]}
+
+
+class CountingModel(FakeListChatModel):
+    """Fake chat model that counts its calls (streamed or not)."""
+
+    calls: int = 0
+
+    async def _agenerate(self, *args, **kwargs):
+        self.calls += 1
+        return await super()._agenerate(*args, **kwargs)
+
+    async def _astream(self, *args, **kwargs):
+        self.calls += 1
+        async for chunk in super()._astream(*args, **kwargs):
+            yield chunk
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """main with a fresh in-memory recommendation cache and a scripted model: app(reply) -> model."""
+    init_db()
+    monkeypatch.setattr(main, "rec_cache", RecommendationCache(LRUCache()))
+    monkeypatch.setattr(main, "semantic_cache", None)
+    monkeypatch.setattr(main, "single_flight", None)
+
+    def script(*replies: str) -> CountingModel:
+        model = CountingModel(responses=list(replies))
+        monkeypatch.setattr(main, "get_model", lambda: model)
+        return model
+
+    return script
+
+
+def call(*steps):
+    """Run (method, path, body) steps against the app in order; returns the responses."""
+    async def go():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = []
+            for method, path, body in steps:
+                if callable(body):
+                    body = body(responses)
+                responses.append(await client.request(method, path, json=body))
+            return responses
+
+    return asyncio.run(go())
+
+
+def onboard(pains: str = "meetings"):
+    return ("POST", "/onboard", {"role": "pm", "industry": "SaaS", "pains": pains})
+
+
+def thread_of(index: int, **extra):
+    return lambda responses: {"thread_id": responses[index].json()["thread_id"], **extra}
+
+
+def sse_events(body: str) -> list:
+    events = []
+    for frame in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in frame.splitlines() if ": " in line)
+        events.append((fields.get("event"), json.loads(fields.get("data", "null"))))
+    return events
+
+
+# ---------- /recommendations/stream ----------
+def test_stream_caches_a_complete_result(app):
+    model = app(json.dumps(RECS))
+    _, stream = call(onboard("stream ok"), ("POST", "/recommendations/stream", thread_of(0)))
+    assert [event for event, _ in sse_events(stream.text)] == ["category", "done"]
+    assert main.rec_cache.memory.stats()["size"] == 1 and model.calls == 1
+
+
+def test_stream_does_not_cache_an_empty_result(app):
+    """A stream that ends on a non-object parses to {}: it must not be served for the whole TTL."""
+    model = app("[1, 2]", json.dumps(RECS))
+    steps = [onboard("stream empty"), ("POST", "/recommendations/stream", thread_of(0)),
+             ("POST", "/recommendations", thread_of(0))]
+    _, stream, again = call(*steps)
+    assert stream.status_code == 200
+    assert main.rec_cache.memory.stats()["size"] == 1  # only the second, complete result
+    assert model.calls == 2 and len(again.json()["items"]) == 1
+
+
+# ---------- /recommendations/batch ----------
+def batch(thread_ids_of, **extra):
+    def body(responses):
+        return {"thread_ids": thread_ids_of(responses), **extra}
+    return ("POST", "/recommendations/batch", body)
+
+
+def test_batch_dedupes_profiles_and_reports_per_thread(app):
+    model = app(json.dumps(RECS))
+    ids = lambda r: [r[0].json()["thread_id"], r[1].json()["thread_id"], 999_999]
+    *_, out = call(onboard("batch dedupe"), onboard("batch dedupe"), batch(ids))
+    assert out.status_code == 200
+    body = out.json()
+    assert (body["threads"], body["succeeded"], body["failed"], body["profiles"], body["model_calls"]) == (3, 2, 1, 1, 1)
+    results = list(body["results"].values())
+    assert [r["ok"] for r in results] == [True, True, False]
+    assert results[0]["items"] == 1 and results[0]["batch_id"] != results[1]["batch_id"]
+    assert results[2]["error"] == "Thread not found"
+    assert model.calls == 1
+
+
+def test_batch_serves_cached_profiles(app):
+    model = app(json.dumps(RECS))
+    ids = lambda r: [r[2].json()["thread_id"]]
+    steps = [onboard("batch cached"), ("POST", "/recommendations", thread_of(0)), onboard("batch cached"), batch(ids)]
+    *_, out = call(*steps)
+    result, = out.json()["results"].values()
+    assert result["ok"] and result["cached"] and model.calls == 1
+
+
+def test_batch_survives_an_empty_earlier_result(app, monkeypatch):
+    """An empty model result seen in one wave used to KeyError the next wave into a 500."""
+    monkeypatch.setattr(main.settings, "recs_batch_wave_size", 1)
+    app("{}")
+    ids = lambda r: [r[0].json()["thread_id"], r[1].json()["thread_id"]]
+    *_, out = call(onboard("batch empty"), onboard("batch empty"), batch(ids))
+    assert out.status_code == 200
+    assert [(r["ok"], r["items"]) for r in out.json()["results"].values()] == [(True, 0), (True, 0)]
+    assert main.rec_cache.memory.stats()["size"] == 0
+
+
+def test_empty_cached_entry_is_a_miss(app):
+    """Entries stored before empty results were refused (e.g. in the disk tier) are regenerated."""
+    model = app(json.dumps(RECS))
+
+    def poison(responses):
+        thread = main.SessionThread(role_raw="pm", industry_raw="SaaS", pains_raw="cached empty",
+                                    role_normalized=responses[0].json()["role_normalized"])
+        main.rec_cache.memory.set(main.make_cache_key(main._thread_prompt_blob(thread), main.model_label()), {})
+        return thread_of(0)(responses)
+
+    _, out = call(onboard("cached empty"), ("POST", "/recommendations", poison))
+    assert len(out.json()["items"]) == 1 and model.calls == 1
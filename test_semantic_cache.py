@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Tests for the near-duplicate recommendation cache (semantic_cache.py): the
+default threshold keeps a profile with an extra pain point from reusing another
+profile's recommendations, rephrasings covered by the encoder's phrase list still
+hit, and entries are partitioned by model and prompt digest the same way the exact
+cache keys are, with stale partitions dropped past max_entries.
+
+Usage:
+    python -m pytest -q test_semantic_cache.py
+"""
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from cache import make_cache_key, prompt_digest
+from semantic_cache import SemanticCache
+
+RECS = {"categories": [{"category_name": "Meetings", "emoji": "📅", "items": []}]}
+
+
+def profile(pains: str, role: str = "Product Manager", industry: str = "SaaS") -> dict:
+    return {"role_normalized": role, "industry_input": industry, "pains_input": pains}
+
+
+def blob(pains: str, system: str = "system prompt") -> dict:
+    return {"system": system, "instructions": "instructions", "few_shot": [], "context": profile(pains)}
+
+
+# ---------- Threshold ----------
+def test_rephrased_profile_hits():
+    cache = SemanticCache()
+    cache.set(profile("too many meetings"), "model", RECS)
+    assert cache.get(profile("Too many meetings!"), "model") == RECS
+    assert cache.get(profile("tons of syncs"), "model") == RECS
+
+
+def test_overload_paraphrase_hits():
+    """"product manager / saas / meetings overload" vs "Product Manager / SaaS / too many meetings"."""
+    cache = SemanticCache()
+    cache.set(profile("too many meetings", industry="SaaS"), "model", RECS)
+    assert cache.get(profile("meetings overload", industry="saas"), "model") == RECS
+    assert cache.last_hit_score == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize("pains", ["meetings", "email overload", "too many status meetings"])
+def test_near_collision_misses(pains):
+    """Dropping the qualifier or swapping the pain point changes the recommendations: no reuse."""
+    cache = SemanticCache()
+    cache.set(profile("too many meetings"), "model", RECS)
+    assert cache.get(profile(pains), "model") is None
+
+
+def test_added_pain_point_misses():
+    cache = SemanticCache()
+    cache.set(profile("too many meetings"), "model", RECS)
+    assert cache.get(profile("too many meetings and on-call"), "model") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (0, 1)
+
+
+def test_added_pain_point_scores_below_default_threshold():
+    cache = SemanticCache()
+    a = cache.encoder.encode(profile("too many meetings"))
+    b = cache.encoder.encode(profile("too many meetings and on-call"))
+    assert float(a @ b) < cache.threshold
+
+
+# ---------- Partitions ----------
+def test_entries_partitioned_by_model():
+    cache = SemanticCache()
+    cache.set(profile("too many meetings"), "gpt-4o-mini", RECS)
+    assert cache.get(profile("too many meetings"), "fake::gpt-4o-mini") is None
+
+
+def test_entries_partitioned_by_prompt_digest():
+    old, new = blob("too many meetings"), blob("too many meetings", system="revised system prompt")
+    assert prompt_digest(old) != prompt_digest(new)
+    cache = SemanticCache()
+    cache.set(old["context"], "model", RECS, prompt_digest(old))
+    assert cache.get(new["context"], "model", prompt_digest(new)) is None
+    assert cache.get(old["context"], "model", prompt_digest(old)) == RECS
+
+
+def test_exact_key_uses_the_same_prompt_digest():
+    old, new = blob("too many meetings"), blob("too many meetings", system="revised system prompt")
+    assert make_cache_key(old, "model") != make_cache_key(new, "model")
+    assert make_cache_key(old, "model") == make_cache_key(blob("too many meetings"), "model")
+
+
+def test_stale_partitions_evicted_past_max_entries():
+    cache = SemanticCache(max_entries=4)
+    for i in range(3):
+        cache.set(profile(f"old pain {i}"), "model", RECS, "old-prompt")
+    cache.get(profile("old pain 0"), "model", "old-prompt")
+    for i in range(2):
+        cache.set(profile(f"new pain {i}"), "model", RECS, "new-prompt")
+    stats = cache.stats()
+    assert (stats["size"], stats["partitions"], stats["partitions_evicted"]) == (2, 1, 1)
+    assert cache.get(profile("new pain 0"), "model", "new-prompt") == RECS
+
+
+def test_recently_read_partition_kept():
+    cache = SemanticCache(max_entries=3)
+    cache.set(profile("a pain"), "model-a", RECS)
+    cache.set(profile("b pain"), "model-b", RECS)
+    cache.get(profile("a pain"), "model-a")
+    cache.set(profile("c pain"), "model-c", RECS)
+    cache.set(profile("c other"), "model-c", RECS)
+    assert cache.get(profile("a pain"), "model-a") == RECS
+    assert cache.get(profile("b pain"), "model-b") is None
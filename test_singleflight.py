@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Tests for request coalescing (shared/singleflight.py): concurrent identical calls
+share one execution in threads and on an event loop, a cancelled waiter doesn't
+cancel the call, each event loop gets its own calls, and every sync waiter of a
+failed call raises its own copy of the error.
+
+Usage:
+    python -m pytest -q test_singleflight.py
+"""
+
+import asyncio
+import threading
+
+from shared.ratelimit import RateLimited
+from shared.singleflight import SingleFlight, flight_key
+
+
+def test_flight_key_is_order_independent_for_dicts():
+    assert flight_key("q", {"a": 1, "b": 2}) == flight_key("q", {"b": 2, "a": 1})
+    assert flight_key("q", {"a": 1}) != flight_key("q", {"a": 2})
+
+
+# ---------- Sync callers (threadpool routes) ----------
+def run_threads(sf: SingleFlight, fn, n: int = 8) -> list:
+    """Call sf.do("k", fn) from n threads at once; returns each thread's result or exception."""
+    release, entered = threading.Event(), threading.Event()
+    outcomes = [None] * n
+
+    def gated():
+        entered.set()
+        release.wait(5)
+        return fn()
+
+    def worker(i):
+        try:
+            outcomes[i] = sf.do("k", gated)
+        except BaseException as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    threads[0].start()
+    entered.wait(5)
+    for t in threads[1:]:
+        t.start()
+    while sf.stats()["coalesced"] < n - 1:
+        threading.Event().wait(0.001)
+    release.set()
+    for t in threads:
+        t.join(5)
+    return outcomes
+
+
+def test_sync_calls_coalesced():
+    sf = SingleFlight()
+    assert run_threads(sf, lambda: {"answer": 42}) == [{"answer": 42}] * 8
+    stats = sf.stats()
+    assert (stats["calls"], stats["coalesced"], stats["in_flight"]) == (1, 7, 0)
+
+
+def test_sync_waiters_each_raise_their_own_copy_of_the_error():
+    sf = SingleFlight()
+
+    def fail():
+        raise RateLimited("model throttled", retry_after=3.0)
+
+    errors = run_threads(sf, fail)
+    assert all(isinstance(e, RateLimited) for e in errors)
+    assert len({id(e) for e in errors}) == len(errors)
+    assert {(e.args, e.retry_after) for e in errors} == {(("model throttled",), 3.0)}
+    # each copy starts from the leader's traceback, so the failing frame is still visible
+    for error in errors:
+        tb = error.__traceback__
+        while tb.tb_next is not None:
+            tb = tb.tb_next
+        assert tb.tb_frame.f_code.co_name == "fail"
+    assert sf.stats()["errors"] == 1
+
+
+def test_sync_call_after_failure_runs_again():
+    sf = SingleFlight()
+    try:
+        sf.do("k", lambda: 1 / 0)
+    except ZeroDivisionError:
+        pass
+    assert sf.do("k", lambda: "ok") == "ok"
+    assert sf.stats()["calls"] == 2
+
+
+# ---------- Async callers ----------
+def test_async_calls_coalesced():
+    sf = SingleFlight()
+    runs = 0
+
+    async def fn():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.01)
+        return "recs"
+
+    async def go():
+        return await asyncio.gather(*(sf.ado("k", fn) for _ in range(5)))
+
+    assert asyncio.run(go()) == ["recs"] * 5
+    assert runs == 1 and (sf.stats()["coalesced"], sf.stats()["in_flight"]) == (4, 0)
+
+
+def test_cancelled_leader_does_not_cancel_the_call():
+    sf = SingleFlight()
+
+    async def fn():
+        await asyncio.sleep(0.02)
+        return "recs"
+
+    async def go():
+        leader = asyncio.create_task(sf.ado("k", fn))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(sf.ado("k", fn))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower, leader.cancelled()
+
+    assert asyncio.run(go()) == ("recs", True)
+
+
+def test_each_event_loop_gets_its_own_call():
+    """Two loops (e.g. two threads running asyncio.run) never await each other's task."""
+    sf = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    results = {}
+
+    async def slow():
+        started.set()
+        await asyncio.get_running_loop().run_in_executor(None, release.wait, 5)
+        return "first loop"
+
+    async def fast():
+        return "second loop"
+
+    def first():
+        results["first"] = asyncio.run(sf.ado("k", slow))
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    started.wait(5)
+    try:
+        results["second"] = asyncio.run(sf.ado("k", fast))
+    finally:
+        release.set()
+        thread.join(5)
+    assert results == {"first": "first loop", "second": "second loop"}
+    assert (sf.stats()["calls"], sf.stats()["coalesced"], sf.stats()["in_flight"]) == (2, 0, 0)
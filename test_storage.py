@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Tests for compact chat storage (storage.py): compression and "@@" escaping round-trip
+through the ChatMessage column, recommendation references are rebuilt from their
+rows, and text that merely looks like a marker (user input, a model reply) is read
+back verbatim instead of being resolved.
+
+Usage:
+    python -m pytest -q test_storage.py
+"""
+
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import select
+
+import storage
+from db import init_db, new_async_session
+from models import ChatMessage, DifficultyLevel, Recommendation, SessionThread
+from settings import settings
+from storage import MAX_REFERENCE_IDS, decode_content, encode_content, recommendation_ref, resolve_messages
+
+DATA = {"categories": [
+    {"category_name": "Meetings", "emoji": "📅", "items": [
+        {"item": "Drop the weekly sync", "rationale": "Nobody reads the notes.",
+         "estimated_gain_minutes": 60, "difficulty": "low"},
+        {"item": "Batch status updates", "rationale": "One async post instead of five.",
+         "estimated_gain_minutes": 45, "difficulty": "medium"},
+    ]},
+    {"category_name": "Reporting", "emoji": "📊", "items": [
+        {"item": "Automate the Friday report", "rationale": "Three tools, copied by hand.",
+         "estimated_gain_minutes": 90, "difficulty": "high"},
+    ]},
+]}
+
+
+@pytest.fixture
+def compact(monkeypatch):
+    monkeypatch.setattr(settings, "chat_storage_compact", True)
+    monkeypatch.setattr(settings, "chat_compress_min_bytes", 64)
+
+
+def run(coro):
+    init_db()
+    return asyncio.run(coro)
+
+
+async def _thread(session) -> SessionThread:
+    thread = SessionThread(role_raw="pm", industry_raw="SaaS", pains_raw="meetings")
+    session.add(thread)
+    await session.flush()
+    return thread
+
+
+async def _store(thread_id: int, *messages) -> list:
+    """Write (sender, content) messages, then read them back through the column type and resolve them."""
+    async with new_async_session() as session:
+        for sender, content in messages:
+            session.add(ChatMessage(thread_id=thread_id, sender=sender, content=content))
+        await session.commit()
+    async with new_async_session() as session:
+        rows = (await session.exec(select(ChatMessage).where(ChatMessage.thread_id == thread_id)
+                                   .order_by(ChatMessage.id))).all()
+        return [m.content for m in await resolve_messages(session, rows)]
+
+
+# ---------- Column encoding ----------
+@pytest.mark.parametrize("value", ["plain text", "@@rec:{\"ids\":\"1-3\"}", "@@z:eJwrSS0u0U3OSS0uyS9KAQAeYgQH",
+                                   "@@raw:already escaped", "@@", ""])
+def test_encode_decode_round_trip(value):
+    stored = encode_content(value)
+    assert decode_content(stored) == value
+    assert not isinstance(decode_content(stored), storage._Reference)
+
+
+def test_marker_text_is_escaped():
+    assert encode_content("@@rec:{}") == "@@raw:@@rec:{}"
+    assert encode_content("hello @@rec:") == "hello @@rec:"
+
+
+def test_large_content_compressed_in_compact_mode(compact):
+    value = "Start with one squad, measure the hours saved, then expand. " * 20
+    stored = encode_content(value)
+    assert stored.startswith(storage.COMPRESSED) and len(stored) < len(value)
+    assert decode_content(stored) == value
+
+
+def test_references_are_not_compressed_or_escaped(compact):
+    ref = storage._Reference(storage.REFERENCE + json.dumps({"ids": "1-400"}) + " " * 200)
+    assert encode_content(ref) == ref
+    assert isinstance(decode_content(ref), storage._Reference)
+
+
+# ---------- Id ranges ----------
+def test_id_ranges_round_trip():
+    ids = [3, 4, 5, 9, 11, 12]
+    assert storage._id_ranges(ids) == "3-5,9,11-12"
+    assert storage._parse_ranges("3-5,9,11-12") == ids
+
+
+@pytest.mark.parametrize("spec", ["1-99999999", f"1-{MAX_REFERENCE_IDS},5000", "9-3", "a-b"])
+def test_bad_ranges_rejected(spec):
+    with pytest.raises(ValueError):
+        storage._parse_ranges(spec)
+
+
+# ---------- References (database round-trip) ----------
+def test_reference_rebuilds_recommendations(compact):
+    async def go():
+        async with new_async_session() as session:
+            thread = await _thread(session)
+            recs = [Recommendation(thread_id=thread.id, category=c["category_name"], item=i["item"],
+                                   rationale=i["rationale"], estimated_gain_minutes=i["estimated_gain_minutes"],
+                                   difficulty=DifficultyLevel(i["difficulty"]))
+                    for c in DATA["categories"] for i in c["items"]]
+            session.add_all(recs)
+            await session.flush()
+            ref = recommendation_ref(recs, DATA)
+            await session.commit()
+        return ref, await _store(thread.id, ("assistant", ref))
+
+    ref, (content,) = run(go())
+    assert ref.startswith(storage.REFERENCE) and len(ref) < len(json.dumps(DATA))
+    assert json.loads(content) == DATA
+
+
+@pytest.mark.parametrize("sender", ["user", "assistant"])
+def test_marker_lookalike_text_reads_back_verbatim(compact, sender):
+    """A user message, or a model reply a user steered, that looks like a reference stays text."""
+    async def go():
+        async with new_async_session() as session:
+            thread = await _thread(session)
+            session.add(Recommendation(thread_id=thread.id, category="Meetings", item="x", rationale="y",
+                                       estimated_gain_minutes=5, difficulty=DifficultyLevel.LOW))
+            await session.commit()
+        return await _store(thread.id, (sender, lookalike), (sender, huge), (sender, "@@raw:@@z:abc"))
+
+    lookalike, huge = '@@rec:{"ids":"1-3"}', '@@rec:{"ids":"1-99999999"}'
+    assert run(go()) == [lookalike, huge, "@@raw:@@z:abc"]
+
+
+def test_oversized_stored_reference_is_not_resolved():
+    """A reference row outside our writers' control can't make resolve_messages query millions of ids."""
+    async def go():
+        async with new_async_session() as session:
+            thread = await _thread(session)
+            await session.commit()
+        async with new_async_session() as session:
+            await session.exec(text(
+                "INSERT INTO chatmessage (thread_id, created_at, sender, content) "
+                "VALUES (:thread_id, CURRENT_TIMESTAMP, 'ASSISTANT', :content)"
+            ), params={"thread_id": thread.id, "content": '@@rec:{"ids":"1-99999999"}'})
+            await session.commit()
+        async with new_async_session() as session:
+            rows = (await session.exec(select(ChatMessage).where(ChatMessage.thread_id == thread.id))).all()
+            return [m.content for m in await resolve_messages(session, rows)]
+
+    assert run(go()) == ['@@rec:{"ids":"1-99999999"}']
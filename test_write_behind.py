@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Tests for the write-behind queue (shared/write_behind.py) against a throwaway
+SQLite file: close() flushes what is queued, a full queue hands rows back to the
+caller ("inline") or drops them ("drop"), a locked database is retried, and one
+bad group in a batch doesn't take the others down with it.
+
+Usage:
+    python -m pytest -q test_write_behind.py
+"""
+
+import threading
+
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, SQLModel, create_engine, func, select
+
+import shared.write_behind as write_behind
+from models import SessionThread
+from shared.write_behind import WriteBehindQueue
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'write_behind.db'}")
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def row(i: int, role="pm") -> SessionThread:
+    return SessionThread(role_raw=role, industry_raw="SaaS", pains_raw=f"pain {i}")
+
+
+def stored(engine) -> int:
+    with Session(engine) as session:
+        return session.exec(select(func.count()).select_from(SessionThread)).one()
+
+
+def blocked_commits(monkeypatch, wb: WriteBehindQueue):
+    """Make the worker block inside its first commit; returns (entered, release) events."""
+    entered, release = threading.Event(), threading.Event()
+    real_commit = wb._commit
+
+    def commit(rows):
+        entered.set()
+        release.wait(5)
+        real_commit(rows)
+
+    monkeypatch.setattr(wb, "_commit", commit)
+    return entered, release
+
+
+# ---------- Shutdown ----------
+def test_close_flushes_queued_rows(engine):
+    wb = WriteBehindQueue(engine, batch_size=1000, flush_interval=30.0)
+    wb.start()
+    for i in range(50):
+        assert wb.submit(row(i))
+    assert wb.submit(row(50), row(51))
+    wb.close()
+    assert stored(engine) == 52
+    stats = wb.stats()
+    assert (stats["running"], stats["submitted"], stats["written"], stats["failed"]) == (False, 52, 52, 0)
+
+
+def test_submit_refused_when_not_running(engine):
+    wb = WriteBehindQueue(engine)
+    assert not wb.submit(row(0))
+    wb.start()
+    wb.close()
+    assert not wb.submit(row(1))
+    assert stored(engine) == 0
+
+
+# ---------- Full queue ----------
+@pytest.mark.parametrize("overflow, accepted, counter", [("inline", False, "inline"), ("drop", True, "dropped")])
+def test_full_queue(engine, monkeypatch, overflow, accepted, counter):
+    wb = WriteBehindQueue(engine, max_queue=2, batch_size=1, flush_interval=0, overflow=overflow)
+    entered, release = blocked_commits(monkeypatch, wb)
+    wb.start()
+    assert wb.submit(row(0))
+    assert entered.wait(5)  # the worker holds row 0; the queue itself is empty
+    assert wb.submit(row(1)) and wb.submit(row(2))
+    assert wb.submit(row(3), row(4)) is accepted
+    assert wb.stats()[counter] == 2
+    release.set()
+    wb.close()
+    assert stored(engine) == 3 and wb.stats()["max_depth"] == 2
+
+
+def test_unknown_overflow_policy_rejected(engine):
+    with pytest.raises(ValueError):
+        WriteBehindQueue(engine, overflow="block")
+
+
+# ---------- Failed commits ----------
+def test_locked_database_retried(engine, monkeypatch):
+    failures = [OperationalError("INSERT", {}, Exception("database is locked"))]
+    real_session = write_behind.Session
+
+    class FlakySession(real_session):
+        def commit(self):
+            if failures:
+                raise failures.pop()
+            super().commit()
+
+    monkeypatch.setattr(write_behind, "Session", FlakySession)
+    monkeypatch.setattr(write_behind.time, "sleep", lambda s: None)
+    wb = WriteBehindQueue(engine)
+    wb.start()
+    wb.submit(row(0), row(1))
+    wb.close()
+    assert stored(engine) == 2
+    assert (wb.stats()["retries"], wb.stats()["written"], wb.stats()["failed"]) == (1, 2, 0)
+
+
+def test_bad_group_fails_alone(engine):
+    wb = WriteBehindQueue(engine, batch_size=1000, flush_interval=30.0)
+    wb.start()
+    wb.submit(row(0))
+    wb.submit(row(1), row(2, role=None))  # NOT NULL violation: the whole group is rejected
+    wb.submit(row(3))
+    wb.close()
+    assert stored(engine) == 2
+    stats = wb.stats()
+    assert (stats["written"], stats["failed"], stats["retries"]) == (2, 2, 0)